@@ -0,0 +1,289 @@
+"""Headless benchmarks for napari-basicpy.
+
+Each case drives the widget the way a user would (fit, autotune, layer transform, folder-sequence
+transform, save) on synthetic data, in its own interpreter so that peak RSS belongs to that case alone.
+Wall time, throughput and peak RSS are compared against ``baselines.json``; the run fails when a case
+is slower or larger than its baseline by more than the tolerance.
+
+Usage::
+
+    python benchmarks/run.py                          # quick suite, compared with baselines.json
+    python benchmarks/run.py --suite full             # larger frames and stacks
+    python benchmarks/run.py --case fit --frames 64 --size 1024 --dtype uint16
+    python benchmarks/run.py --update-baselines       # record this machine's numbers
+
+Baselines are machine specific; record them on the machine that runs the comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+BASELINES = HERE / "baselines.json"
+
+CASES = ["fit", "autotune", "transform", "sequence", "save"]
+DTYPES = ["uint8", "uint16", "float32"]
+
+SUITES = {
+    "quick": [(case, 16, 256, "uint16") for case in CASES]
+    + [("transform", 16, 256, "float32"), ("sequence", 16, 256, "uint8"), ("save", 16, 256, "uint8")],
+    "full": [
+        (case, frames, size, dtype)
+        for case, frames, size, dtype in itertools.product(CASES, (32, 128), (512, 2048), ("uint16", "float32"))
+        # autotune runs many fits; keep it to the smaller problems
+        if not (case == "autotune" and frames * size * size > 32 * 512 * 512)
+    ],
+}
+
+
+def case_id(case, frames, size, dtype) -> str:
+    return f"{case}-{frames}x{size}x{size}-{dtype}"
+
+
+# ---------------------------------------------------------------------------------------------------------
+# worker side: runs inside a fresh interpreter, prints one JSON line
+# ---------------------------------------------------------------------------------------------------------
+
+
+def _peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024**2 if sys.platform == "darwin" else 1024)
+
+
+def _synthetic_stack(frames, size, dtype, seed=0):
+    from napari_basicpy._synthetic import make_synthetic
+
+    data = make_synthetic(n_frames=frames, shape=(size, size), dtype=dtype, seed=seed)
+    return data.images, data.flatfield
+
+
+def _wait(app, predicate, timeout=3600.0):
+    t0 = time.perf_counter()
+    while not predicate():
+        app.processEvents()
+        time.sleep(0.005)
+        if time.perf_counter() - t0 > timeout:
+            raise TimeoutError("benchmark case did not finish")
+
+
+def _run_case(case, frames, size, dtype, workdir):
+    """Set up the widget and inputs (untimed), then time the action itself."""
+    from unittest import mock
+
+    import napari
+    import numpy as np
+    import tifffile
+    from qtpy.QtWidgets import QApplication, QDialog, QMessageBox
+
+    from napari_basicpy import _widget
+    from napari_basicpy.utils import SCALING_MODES
+
+    viewer = napari.Viewer(show=False)
+    widget = _widget.BasicWidget(viewer)
+    app = QApplication.instance()
+    stack, flatfield = _synthetic_stack(frames, size, dtype)
+    nbytes = stack.nbytes
+    patches = [mock.patch.object(QMessageBox, name, return_value=None) for name in ("information", "warning")]
+    for p in patches:
+        p.start()
+
+    if case in ("fit", "autotune"):
+        viewer.add_image(stack, name="images")
+        widget.reset_choices()
+        widget.fit_image_select.value = viewer.layers["images"]
+        btn = widget.run_fit_btn if case == "fit" else widget.autotune_btn
+        t0 = time.perf_counter()
+        (widget._run_fit if case == "fit" else widget._run_autotune)()
+        _wait(app, lambda: btn.isEnabled() and (case != "fit" or "flatfield" in viewer.layers))
+    elif case == "transform":
+        viewer.add_image(stack, name="images")
+        viewer.add_image(flatfield, name="flatfield")
+        widget.reset_choices()
+        widget.transform_image_select.value = viewer.layers["images"]
+        widget.flatfield_select.value = viewer.layers["flatfield"]
+        t0 = time.perf_counter()
+        widget._run_transform()
+        _wait(app, lambda: widget.run_transform_btn.isEnabled() and "corrected" in viewer.layers)
+    elif case == "sequence":
+        src, out = Path(workdir, "src"), Path(workdir, "out")
+        src.mkdir()
+        for i, frame in enumerate(stack):
+            tifffile.imwrite(src / f"frame{i:05d}.tif", frame)
+        viewer.add_image(flatfield, name="flatfield")
+        widget.reset_choices()
+        widget.flatfield_select.value = viewer.layers["flatfield"]
+        widget.transform_sequence_folder = str(src)
+        widget.transform_sequence_out_folder = str(out)
+        # integer inputs are written back as the same dtype, which takes the two-pass rescale
+        widget.transform_sequence_dtype = dtype
+        widget.transform_sequence_mode = SCALING_MODES[1]
+        t0 = time.perf_counter()
+        widget._run_transform()
+        _wait(app, lambda: widget.run_transform_btn.isEnabled())
+        if len(list(out.glob("*.tif"))) != frames:
+            raise RuntimeError("sequence transform did not write every frame")
+    elif case == "save":
+        widget.corrected = stack.astype(np.float32)
+        # the save dialog preselects the last choice; accept it and answer the file dialog
+        widget._last_save_dtype = dtype
+        widget._last_save_mode = SCALING_MODES[1]
+        target = Path(workdir, "corrected.tif")
+        with mock.patch.object(_widget.SaveOptionsDialog, "exec_", return_value=QDialog.Accepted), mock.patch.object(
+            _widget, "save_dialog", return_value=str(target)
+        ):
+            t0 = time.perf_counter()
+            widget._save_transform()
+        if not target.exists():
+            raise RuntimeError("nothing was saved")
+    else:
+        raise ValueError(f"unknown case {case!r}")
+
+    wall = time.perf_counter() - t0
+    for p in patches:
+        p.stop()
+    result = {
+        "wall_s": wall,
+        "frames_per_s": frames / wall,
+        "mb_per_s": nbytes / 2**20 / wall,
+        "input_mb": nbytes / 2**20,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if case == "fit":
+        # accuracy against the known shading; reported, not compared
+        fitted = np.asarray(viewer.layers["flatfield"].data, dtype=np.float64)
+        result["flatfield_mean_abs_error"] = float(np.abs(fitted / fitted.mean() - flatfield).mean())
+    return result
+
+
+def _worker(case, frames, size, dtype):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    with tempfile.TemporaryDirectory(prefix="basicpy_bench_") as workdir:
+        result = _run_case(case, int(frames), int(size), dtype, workdir)
+    print("BENCH " + json.dumps(result))
+
+
+# ---------------------------------------------------------------------------------------------------------
+# driver side
+# ---------------------------------------------------------------------------------------------------------
+
+
+def run_one(case, frames, size, dtype, timeout) -> dict:
+    cmd = [sys.executable, __file__, "--worker", case, str(frames), str(size), dtype]
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen"))
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env, timeout=timeout)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("BENCH "):
+            return json.loads(line[len("BENCH ") :])
+    raise RuntimeError(f"{case_id(case, frames, size, dtype)} failed:\n{proc.stderr[-4000:]}")
+
+
+def _machine() -> dict:
+    return {
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baselines, time_tol, rss_tol, min_time_delta=0.25):
+    """Rows for the report and the ids of cases that regressed.
+
+    A case regresses when its wall time exceeds ``time_tol`` times the baseline (and the baseline by more
+    than `min_time_delta` seconds, so that millisecond cases do not flag on noise) or its peak RSS
+    exceeds ``rss_tol`` times the baseline.
+    """
+    rows, regressions = [], []
+    for cid, res in results.items():
+        base = baselines.get(cid)
+        time_ratio = res["wall_s"] / base["wall_s"] if base else None
+        rss_ratio = res["peak_rss_mb"] / base["peak_rss_mb"] if base else None
+        status = "new"
+        if base:
+            status = "ok"
+            slower = time_ratio > time_tol and res["wall_s"] - base["wall_s"] > min_time_delta
+            if slower or rss_ratio > rss_tol:
+                status = "REGRESSION"
+                regressions.append(cid)
+        rows.append((cid, res, time_ratio, rss_ratio, status))
+    return rows, regressions
+
+
+def _fmt_ratio(r):
+    return "-" if r is None else f"{r:.2f}x"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", choices=sorted(SUITES), default="quick")
+    parser.add_argument("--case", choices=CASES, action="append", help="run only these cases (repeatable)")
+    parser.add_argument("--frames", type=int, help="override frame count")
+    parser.add_argument("--size", type=int, help="override frame size (square frames)")
+    parser.add_argument("--dtype", choices=DTYPES, help="override dtype")
+    parser.add_argument("--time-tolerance", type=float, default=1.3, help="allowed wall-time ratio vs baseline")
+    parser.add_argument("--min-time-delta", type=float, default=0.25, help="ignore slowdowns below this (s)")
+    parser.add_argument("--rss-tolerance", type=float, default=1.2, help="allowed peak-RSS ratio vs baseline")
+    parser.add_argument("--baselines", type=Path, default=BASELINES)
+    parser.add_argument("--update-baselines", action="store_true", help="store these results as the baselines")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON here")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds per case")
+    parser.add_argument("--worker", nargs=4, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        return _worker(*args.worker)
+
+    plan = []
+    for case, frames, size, dtype in SUITES[args.suite]:
+        if args.case and case not in args.case:
+            continue
+        plan.append((case, args.frames or frames, args.size or size, args.dtype or dtype))
+    plan = list(dict.fromkeys(plan))
+
+    results = {}
+    for params in plan:
+        cid = case_id(*params)
+        print(f"running {cid} ...", flush=True)
+        results[cid] = run_one(*params, timeout=args.timeout)
+
+    stored = json.loads(args.baselines.read_text()) if args.baselines.exists() else {"results": {}}
+    rows, regressions = compare(
+        results, stored.get("results", {}), args.time_tolerance, args.rss_tolerance, args.min_time_delta
+    )
+
+    header = f"{'case':<36}{'wall s':>9}{'frames/s':>10}{'MB/s':>9}{'peak MB':>9}{'time':>8}{'rss':>8}  status"
+    print("\n" + header + "\n" + "-" * len(header))
+    for cid, res, tr, rr, status in rows:
+        print(
+            f"{cid:<36}{res['wall_s']:>9.2f}{res['frames_per_s']:>10.1f}{res['mb_per_s']:>9.1f}"
+            f"{res['peak_rss_mb']:>9.0f}{_fmt_ratio(tr):>8}{_fmt_ratio(rr):>8}  {status}"
+        )
+
+    if args.output:
+        args.output.write_text(json.dumps({"machine": _machine(), "results": results}, indent=2))
+    if args.update_baselines:
+        merged = {**stored.get("results", {}), **results}
+        args.baselines.write_text(json.dumps({"machine": _machine(), "results": merged}, indent=2, sort_keys=True))
+        print(f"\nbaselines updated: {args.baselines}")
+        return 0
+    if regressions:
+        print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,7 +5,25 @@ try:
 except ImportError:
     __version__ = "unknown"
 
+# BasicWidget pulls in napari and Qt; it is imported on first access so that `import napari_basicpy`
+# (and napari's plugin discovery) stays cheap. BaSiCPy and torch load when a fit or transform needs them.
+_LAZY = {
+    "BackendConfig": "._backend",
+    "BasicWidget": "._widget",
+}
 
-from ._widget import BasicWidget
+__all__ = ["BackendConfig", "BasicWidget"]
 
-__all__ = ["BasicWidget"]
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,213 @@
+"""Apply a known shading model: ``(image - darkfield) / flatfield`` without going through BaSiC.
+
+`BaSiC.transform` is built for fitting workflows (timelapse baselines, torch tensors, garbage
+collection after every call). Correcting with a finished model only needs one subtract and one
+multiply per pixel, so the engine keeps the reciprocal flatfield (and the darkfield, if there is
+one) as float32 and runs the kernel in row chunks on a small thread pool; numpy releases the GIL
+inside the ufuncs, so the chunks run in parallel.
+
+The result can go into a buffer from `allocate_output` instead of a new array: a temporary memory-mapped
+``.npy`` file or a Zarr store, both of which napari displays directly, so a corrected stack larger than
+memory can still become a layer.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# about 4 MB of float32 per task: large enough to amortise the dispatch, small enough for the cache
+_CHUNK_PIXELS = 1 << 20
+
+# where corrected stacks are written: a new array, a temporary memory map, a temporary Zarr store
+OUTPUTS = ("memory", "memmap", "zarr")
+
+
+def allocate_output(shape, output: str = "memory", directory: Optional[str] = None):
+    """float32 buffer of `shape` for corrected frames; see `OUTPUTS`.
+
+    Disk-backed buffers live in `directory` (the system temp folder by default) and are deleted once the
+    returned array is garbage collected. ``"zarr"`` needs the optional ``zarr`` package.
+    """
+    shape = tuple(int(n) for n in shape)
+    if output == "memory":
+        return np.empty(shape, dtype=np.float32)
+    if output == "memmap":
+        from ._tiles import allocate_mosaic
+
+        return allocate_mosaic(shape, directory=directory)
+    if output == "zarr":
+        try:
+            import zarr
+        except ImportError as e:
+            raise ImportError("Zarr output requires the 'zarr' package: pip install zarr") from e
+        path = tempfile.mkdtemp(prefix="basicpy_corrected_", suffix=".zarr", dir=directory)
+        chunks = (1,) * (len(shape) - 2) + shape[-2:]
+        arr = zarr.open_array(store=path, mode="w", shape=shape, chunks=chunks, dtype="float32")
+        weakref.finalize(arr, shutil.rmtree, path, True)
+        return arr
+    raise ValueError(f"Unknown output {output!r}; expected one of {OUTPUTS}")
+
+
+class FrameView:
+    """``(T, Y, X)`` view of a ``(..., Y, X)`` store that cannot be reshaped in place, such as Zarr.
+
+    Frame ``i`` is the store's frame at ``np.unravel_index(i, shape[:-2])``; reads and writes go frame
+    by frame, which matches the one-frame chunks of `allocate_output`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._leading = tuple(store.shape[:-2])
+        self.shape = (int(np.prod(self._leading, dtype=np.int64)), *store.shape[-2:])
+        self.dtype = store.dtype
+        self.ndim = 3
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _frames(self, key):
+        if isinstance(key, slice):
+            return range(*key.indices(len(self)))
+        return int(key)
+
+    def __getitem__(self, key):
+        frames = self._frames(key)
+        if isinstance(frames, int):
+            return np.asarray(self.store[np.unravel_index(frames, self._leading)])
+        return np.stack([np.asarray(self.store[np.unravel_index(i, self._leading)]) for i in frames])
+
+    def __setitem__(self, key, value):
+        frames = self._frames(key)
+        if isinstance(frames, int):
+            self.store[np.unravel_index(frames, self._leading)] = value
+            return
+        for i, frame in zip(frames, np.asarray(value)):
+            self.store[np.unravel_index(i, self._leading)] = frame
+
+
+def as_frames(arr):
+    """``(T, Y, X)`` form of a ``(..., Y, X)`` array: itself, reshaped (numpy, dask), or a `FrameView`."""
+    if len(arr.shape) == 3:
+        return arr
+    if hasattr(arr, "reshape"):
+        return arr.reshape((-1, *arr.shape[-2:]))
+    return FrameView(arr)
+
+
+class ApplyEngine:
+    """Shading correction with precomputed profiles.
+
+    Parameters
+    ----------
+    flatfield : np.ndarray
+        2D flatfield.
+    darkfield : np.ndarray, optional
+        2D darkfield; None or all zeros skips the subtraction.
+    max_workers : int, optional
+        Threads used for inputs larger than one chunk. Defaults to ``min(8, cpu_count)``.
+    """
+
+    def __init__(self, flatfield, darkfield=None, max_workers: Optional[int] = None):
+        flatfield = np.squeeze(np.asarray(flatfield, dtype=np.float32))
+        if flatfield.ndim != 2:
+            raise ValueError(f"Expected a 2D flatfield, got shape {flatfield.shape}")
+        with np.errstate(divide="ignore"):
+            self.inv_flatfield = np.reciprocal(flatfield)
+        self.darkfield = None
+        if darkfield is not None:
+            darkfield = np.squeeze(np.asarray(darkfield, dtype=np.float32))
+            if darkfield.shape != flatfield.shape:
+                raise ValueError(f"Darkfield shape {darkfield.shape} does not match flatfield {flatfield.shape}")
+            if np.any(darkfield):
+                self.darkfield = darkfield
+        self.shape = flatfield.shape
+        self.max_workers = max_workers or min(8, os.cpu_count() or 1)
+        self._executor = None
+        # callers may share one engine across threads (e.g. `scan_frames`); only one of them creates the pool
+        self._executor_lock = threading.Lock()
+
+    def _kernel(self, src, dst, rows):
+        if self.darkfield is None:
+            np.multiply(src, self.inv_flatfield[rows], out=dst, dtype=np.float32)
+        else:
+            np.subtract(src, self.darkfield[rows], out=dst, dtype=np.float32)
+            np.multiply(dst, self.inv_flatfield[rows], out=dst)
+
+    def __call__(self, images, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Correct `images` of shape ``(..., Y, X)``; the result is float32 with the same shape.
+
+        Parameters
+        ----------
+        images : array-like
+            Frames to correct. Anything sliceable works (numpy, dask, zarr); chunks are read as needed.
+        out : array-like, optional
+            float32 buffer of the same shape to write into, e.g. from `allocate_output`. Returned when given.
+        """
+        shape = tuple(images.shape)
+        if shape[-2:] != self.shape:
+            raise ValueError(f"Image frames {shape[-2:]} do not match the model shape {self.shape}")
+        if out is None:
+            out = np.empty(shape, dtype=np.float32)
+        elif tuple(out.shape) != shape or out.dtype != np.float32:
+            raise ValueError(f"out must be float32 with shape {shape}, got {out.dtype} {out.shape}")
+        if not isinstance(out, np.ndarray):
+            # stores such as Zarr are written frame by frame from a numpy buffer
+            frame = np.empty(self.shape, dtype=np.float32)
+            for idx in np.ndindex(shape[:-2]):
+                out[idx] = self(images[idx], out=frame)
+            return out
+
+        H, W = self.shape
+        frames = images.reshape((-1, H, W))
+        dst = out.reshape((-1, H, W))
+        rows_per_chunk = max(1, _CHUNK_PIXELS // W)
+        tasks = [
+            (i, slice(y, min(y + rows_per_chunk, H)))
+            for i in range(frames.shape[0])
+            for y in range(0, H, rows_per_chunk)
+        ]
+
+        def _task(task):
+            i, rows = task
+            self._kernel(np.asarray(frames[i, rows]), dst[i, rows], rows)
+
+        if len(tasks) == 1 or self.max_workers == 1:
+            for task in tasks:
+                _task(task)
+        else:
+            for _ in self._pool().map(_task, tasks):
+                pass
+        return out
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="basicpy-apply")
+            return self._executor
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if getattr(self, "_executor", None) is not None:
+            self._executor.shutdown(wait=False)
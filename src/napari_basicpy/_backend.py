@@ -0,0 +1,170 @@
+"""Compute backend settings: BaSiC device, torch thread pools and NumPy/BLAS thread limits.
+
+Library defaults either use every core (oversubscribing shared nodes when several fits run) or a
+single thread, depending on how torch and BLAS were built. `BackendConfig` makes the choice explicit,
+persists it as JSON in the user config folder, and is applied before each fit or transform.
+
+Example
+-------
+>>> from napari_basicpy import BackendConfig
+>>> cfg = BackendConfig(device="cpu", intra_op_threads=8, blas_threads=8)
+>>> cfg.apply()  # doctest: +SKIP
+>>> cfg.save()  # doctest: +SKIP
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass, fields
+from typing import Optional
+
+from .utils import config_dir
+
+logger = logging.getLogger(__name__)
+
+DEVICES = ["cpu", "cuda", "auto"]
+
+_BLAS_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS")
+
+# threadpoolctl limiter kept alive so the limits stay in place
+_blas_limiter = None
+# torch only accepts one inter-op setting per process
+_interop_applied: Optional[int] = None
+
+
+def _config_path() -> str:
+    return os.path.join(config_dir(), "backend.json")
+
+
+@dataclass
+class BackendConfig:
+    """Where and how wide BaSiC and the correction kernels run.
+
+    Attributes
+    ----------
+    device : str
+        ``"cpu"``, ``"cuda"`` or ``"auto"`` (CUDA if available). CUDA falls back to CPU when no GPU is found.
+    intra_op_threads : int
+        Threads torch uses inside one operation; 0 keeps the library default.
+    inter_op_threads : int
+        Threads torch uses to run independent operations; 0 keeps the default. Only the first value applied
+        in a process takes effect.
+    blas_threads : int
+        Thread limit for NumPy's BLAS/OpenMP pools; 0 keeps the default.
+    memory_budget_gb : float
+        Memory a fit or transform may use before it falls back to chunked or out-of-core modes; 0 uses
+        a share of the memory available when the run starts (see `napari_basicpy._planner`).
+    """
+
+    device: str = "cpu"
+    intra_op_threads: int = 0
+    inter_op_threads: int = 0
+    blas_threads: int = 0
+    memory_budget_gb: float = 0.0
+
+    def __post_init__(self):
+        if self.device not in DEVICES:
+            raise ValueError(f"device must be one of {DEVICES}, got {self.device!r}")
+        for f in ("intra_op_threads", "inter_op_threads", "blas_threads"):
+            value = int(getattr(self, f))
+            if value < 0:
+                raise ValueError(f"{f} must be >= 0")
+            setattr(self, f, value)
+        self.memory_budget_gb = float(self.memory_budget_gb)
+        if self.memory_budget_gb < 0:
+            raise ValueError("memory_budget_gb must be >= 0")
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "BackendConfig":
+        """Saved configuration, or the defaults if there is none (or it cannot be read)."""
+        path = path or _config_path()
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable backend config {path}: {e}")
+            return cls()
+        known = {f.name for f in fields(cls)}
+        try:
+            return cls(**{k: v for k, v in data.items() if k in known})
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Ignoring invalid backend config {path}: {e}")
+            return cls()
+
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or _config_path()
+        with open(path, "w") as f:
+            json.dump(asdict(self), f, indent=2)
+        return path
+
+    def resolved_device(self) -> str:
+        """Device BaSiC will actually use."""
+        if self.device == "cpu":
+            return "cpu"
+        import torch
+
+        if torch.cuda.is_available():
+            return "cuda"
+        if self.device == "cuda":
+            logger.warning("CUDA requested but not available; using CPU")
+        return "cpu"
+
+    def basic_settings(self) -> dict:
+        """Keyword arguments for ``BaSiC(...)``."""
+        return {"device": self.resolved_device()}
+
+    def apply(self, torch_backend: bool = True) -> dict:
+        """Set the thread limits for this process and return the effective settings, for run logs.
+
+        Parameters
+        ----------
+        torch_backend : bool
+            Also configure torch. Pass False for work that never calls BaSiC (applying a known model),
+            so torch is not imported just to set its thread pools.
+        """
+        global _blas_limiter, _interop_applied
+
+        effective = {}
+        if torch_backend:
+            import torch
+
+            if self.intra_op_threads:
+                torch.set_num_threads(self.intra_op_threads)
+            if self.inter_op_threads and self.inter_op_threads != _interop_applied:
+                try:
+                    torch.set_num_interop_threads(self.inter_op_threads)
+                    _interop_applied = self.inter_op_threads
+                except RuntimeError:
+                    logger.warning(
+                        "torch inter-op threads can only be set once per session; restart napari to change"
+                    )
+            effective = {
+                "device": self.resolved_device(),
+                "intra_op_threads": torch.get_num_threads(),
+                "inter_op_threads": torch.get_num_interop_threads(),
+            }
+
+        blas = "default"
+        if self.blas_threads:
+            try:
+                from threadpoolctl import threadpool_limits
+            except ImportError:
+                # only libraries loaded after this point pick the limit up
+                for var in _BLAS_ENV_VARS:
+                    os.environ[var] = str(self.blas_threads)
+                blas = f"{self.blas_threads} (environment; install threadpoolctl to limit loaded libraries)"
+            else:
+                if _blas_limiter is not None:
+                    _blas_limiter.restore_original_limits()
+                _blas_limiter = threadpool_limits(limits=self.blas_threads)
+                blas = str(self.blas_threads)
+        elif _blas_limiter is not None:
+            _blas_limiter.restore_original_limits()
+            _blas_limiter = None
+
+        effective["blas_threads"] = blas
+        return effective
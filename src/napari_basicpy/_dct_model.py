@@ -0,0 +1,175 @@
+"""Compact, resolution-independent shading model stored as low-frequency DCT coefficients.
+
+BaSiC profiles are smooth (the fit penalises their DCT coefficients), so a handful of cosine terms
+describe them to well below the noise level. The coefficients are stored in normalised coordinates,
+``field(y, x) = sum_uv c[u, v] * cos(pi * u * ty) * cos(pi * v * tx)`` with ``t = (i + 0.5) / n``, which
+lets the same model be evaluated at any image size (multiscale levels, binned acquisitions, tiles)
+with two small matrix products instead of resizing a full-resolution array.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT = "basicpy-dct-v1"
+
+_CANDIDATE_SIZES = (4, 6, 8, 12, 16, 24, 32, 48, 64)
+
+
+def _normalised_coeffs(field: np.ndarray) -> np.ndarray:
+    """All DCT-II coefficients of `field`, rescaled so that evaluation needs no size-dependent weights."""
+    from scipy.fft import dctn
+
+    field = np.asarray(field, dtype=np.float64)
+    H, W = field.shape
+    C = dctn(field, type=2, norm="ortho")
+    wy = np.full(H, np.sqrt(2.0 / H))
+    wy[0] = np.sqrt(1.0 / H)
+    wx = np.full(W, np.sqrt(2.0 / W))
+    wx[0] = np.sqrt(1.0 / W)
+    return C * wy[:, None] * wx[None, :]
+
+
+def _basis(n: int, k: int) -> np.ndarray:
+    t = (np.arange(n) + 0.5) / n
+    return np.cos(np.pi * np.outer(t, np.arange(k)))
+
+
+def evaluate(coeffs: np.ndarray, shape) -> np.ndarray:
+    """Evaluate normalised DCT `coeffs` on a ``(Y, X)`` pixel grid."""
+    H, W = (int(s) for s in shape[-2:])
+    ky, kx = coeffs.shape
+    return (_basis(H, ky) @ coeffs @ _basis(W, kx).T).astype(np.float32)
+
+
+def _fit_coeffs(field: np.ndarray, n_coeffs: Optional[int], tol: float) -> np.ndarray:
+    full = _normalised_coeffs(field)
+    H, W = full.shape
+    if n_coeffs is not None:
+        return full[: min(n_coeffs, H), : min(n_coeffs, W)].copy()
+    scale = max(float(np.abs(field).mean()), 1e-12)
+    for k in _CANDIDATE_SIZES:
+        c = full[: min(k, H), : min(k, W)]
+        rms = float(np.sqrt(np.mean((evaluate(c, field.shape) - field) ** 2)))
+        if rms / scale <= tol:
+            return c.copy()
+    return full[: min(_CANDIDATE_SIZES[-1], H), : min(_CANDIDATE_SIZES[-1], W)].copy()
+
+
+class DCTModel:
+    """Flatfield (and optional darkfield) as low-frequency DCT coefficients.
+
+    Parameters
+    ----------
+    flatfield_coeffs : np.ndarray
+        Normalised coefficients of the flatfield.
+    darkfield_coeffs : np.ndarray, optional
+        Normalised coefficients of the darkfield; None if no darkfield was fitted.
+    source_shape : tuple of int
+        ``(Y, X)`` of the profiles the model was made from, for reference.
+    cache_size : int
+        Number of reconstructed ``(kind, shape)`` profiles kept in memory.
+    """
+
+    def __init__(
+        self,
+        flatfield_coeffs: np.ndarray,
+        darkfield_coeffs: Optional[np.ndarray] = None,
+        source_shape: Tuple[int, int] = (0, 0),
+        cache_size: int = 8,
+    ):
+        self.flatfield_coeffs = np.asarray(flatfield_coeffs, dtype=np.float64)
+        self.darkfield_coeffs = None if darkfield_coeffs is None else np.asarray(darkfield_coeffs, dtype=np.float64)
+        self.source_shape = tuple(int(s) for s in source_shape)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_fields(
+        cls,
+        flatfield: np.ndarray,
+        darkfield: Optional[np.ndarray] = None,
+        n_coeffs: Optional[int] = None,
+        tol: float = 1e-3,
+    ) -> "DCTModel":
+        """Compress fitted profiles.
+
+        Parameters
+        ----------
+        flatfield, darkfield : np.ndarray
+            2D profiles as returned by BaSiC. An all-zero darkfield is dropped.
+        n_coeffs : int, optional
+            Coefficients kept per axis. By default the smallest size whose RMS reconstruction error stays
+            within `tol` (relative to the profile's mean) is chosen, up to 64.
+        tol : float
+            Maximum relative RMS reconstruction error when `n_coeffs` is not given.
+        """
+        flatfield = np.squeeze(np.asarray(flatfield))
+        if flatfield.ndim != 2:
+            raise ValueError(f"Expected a 2D flatfield, got shape {flatfield.shape}")
+        dark = None
+        if darkfield is not None:
+            darkfield = np.squeeze(np.asarray(darkfield))
+            if np.any(darkfield):
+                dark = _fit_coeffs(darkfield, n_coeffs, tol)
+        return cls(_fit_coeffs(flatfield, n_coeffs, tol), dark, flatfield.shape)
+
+    @property
+    def has_darkfield(self) -> bool:
+        return self.darkfield_coeffs is not None
+
+    def _get(self, kind: str, coeffs: np.ndarray, shape) -> np.ndarray:
+        key = (kind, tuple(int(s) for s in shape[-2:]))
+        with self._lock:
+            out = self._cache.get(key)
+            if out is None:
+                out = evaluate(coeffs, key[1])
+                out.flags.writeable = False
+                self._cache[key] = out
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            return out
+
+    def flatfield(self, shape) -> np.ndarray:
+        """Flatfield at ``shape[-2:]`` (read-only, cached)."""
+        return self._get("flatfield", self.flatfield_coeffs, shape)
+
+    def darkfield(self, shape) -> np.ndarray:
+        """Darkfield at ``shape[-2:]`` (read-only, cached); zeros if the model has none."""
+        if self.darkfield_coeffs is None:
+            return np.zeros(tuple(shape[-2:]), dtype=np.float32)
+        return self._get("darkfield", self.darkfield_coeffs, shape)
+
+    def save(self, path: str):
+        """Write the model to an ``.npz`` file (a few kilobytes)."""
+        arrays = {
+            "format": np.array(FORMAT),
+            "source_shape": np.asarray(self.source_shape),
+            "flatfield_coeffs": self.flatfield_coeffs.astype(np.float32),
+        }
+        if self.darkfield_coeffs is not None:
+            arrays["darkfield_coeffs"] = self.darkfield_coeffs.astype(np.float32)
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "DCTModel":
+        with np.load(path) as f:
+            if "format" not in f or str(f["format"]) != FORMAT:
+                raise ValueError(f"{path} is not a BaSiCPy DCT model")
+            dark = f["darkfield_coeffs"] if "darkfield_coeffs" in f else None
+            return cls(f["flatfield_coeffs"], dark, tuple(f["source_shape"]))
+
+    def __repr__(self) -> str:
+        k = "x".join(str(n) for n in self.flatfield_coeffs.shape)
+        dark = ", darkfield" if self.has_darkfield else ""
+        return f"DCTModel({k} coefficients{dark}, fitted at {self.source_shape})"
@@ -0,0 +1,199 @@
+"""Reuse preprocessing and results between fits of the same input.
+
+Tuning means rerunning the fit on one stack with slightly different smoothness or darkfield settings.
+Every `BaSiC.fit` first resizes the whole stack (and the segmentation mask) to the working size, frame
+by frame, which on large stacks costs more than the optimisation itself. `FitCache` keeps the
+working-size stack for the current input and hands it to BaSiC with ``working_size`` set to its own
+shape, so the resize inside BaSiC becomes an identity and the fitted profiles are the same as from the
+full stack. Results are also kept per settings, so going back to an earlier setting is immediate.
+Fits on the frames that passed screening (see `FitCache.fit`) index the cached stack.
+
+BaSiC's optimiser has no warm-start parameter; each new setting still runs the optimisation, but only
+that.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Optional
+
+import numpy as np
+
+from ._instrument import fingerprint_array
+from .utils import _upsample_profile
+
+logger = logging.getLogger(__name__)
+
+# fitted models kept for the current input, most recent last
+_MAX_RESULTS = 8
+
+
+def _settings_key(settings: dict, frames=None) -> str:
+    key = json.dumps(settings, sort_keys=True, default=str)
+    if frames is not None:
+        key += "|" + str(fingerprint_array(np.asarray(frames, dtype=np.intp)))
+    return key
+
+
+class FitCache:
+    """Working-size stack and fitted models for the most recent fit input."""
+
+    def __init__(self):
+        self._input_key = None
+        self._images: Optional[np.ndarray] = None
+        self._weight: Optional[np.ndarray] = None
+        self._results: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+
+    def clear(self):
+        self.__init__()
+
+    @staticmethod
+    def _key(data, fitting_weight, settings, key=None) -> tuple:
+        # identity plus a sampled hash: a new array or edited pixels both invalidate the cache; masks are
+        # rebuilt (inverted) on every run, so they are matched by content only
+        weight = None if fitting_weight is None else str(fingerprint_array(fitting_weight))
+        return (
+            id(data) if key is None else key,
+            str(fingerprint_array(data)),
+            weight,
+            json.dumps(settings.get("working_size"), default=str),
+            _settings_key(settings.get("resize_params") or {}),
+        )
+
+    @staticmethod
+    def supports(data) -> bool:
+        """``(T, Y, X)`` stacks, in memory or lazy (dask), are cached; anything else is fitted directly."""
+        return getattr(data, "ndim", None) == 3
+
+    def _select(self, data, fitting_weight, settings, key=None):
+        input_key = self._key(data, fitting_weight, settings, key)
+        if input_key != self._input_key:
+            self._results.clear()
+            self._images = self._weight = None
+            self._input_key = input_key
+
+    def working_stack(self, settings: dict, data, fitting_weight=None, report=None, key=None):
+        """Working-size stack and mask for `data`, computed on the first call for this input.
+
+        `key` identifies `data` in place of its identity, see `fit`.
+
+        Returns
+        -------
+        images : np.ndarray
+            ``(T, y, x)`` float32 stack at BaSiC's working size.
+        weight : np.ndarray or None
+            Segmentation mask at the same size.
+        """
+        with self._lock:
+            self._select(data, fitting_weight, settings, key)
+            return self._stack(settings, data, fitting_weight, report)
+
+    def _stack(self, settings, data, fitting_weight, report):
+        # the input is already selected (and the lock held)
+        if self._images is None:
+            with _stage(report, "preprocess", frames=data.shape[0]):
+                self._preprocess(self._basic(settings), data, fitting_weight)
+        else:
+            self.hits += 1
+        return self._images, self._weight
+
+    def remember(self, settings: dict, basic, frames=None):
+        """Keep a model fitted elsewhere on the current input (e.g. by a sweep) for `settings`."""
+        with self._lock:
+            self._results[_settings_key(settings, frames)] = basic
+            while len(self._results) > _MAX_RESULTS:
+                self._results.popitem(last=False)
+
+    def fit(self, settings: dict, data: np.ndarray, fitting_weight=None, report=None, frames=None, key=None):
+        """Fit BaSiC on `data`, reusing the working-size stack and earlier results when possible.
+
+        Parameters
+        ----------
+        settings : dict
+            Keyword arguments for ``BaSiC(...)``.
+        data : array-like
+            ``(T, Y, X)`` stack; numpy or dask. Lazy stacks are read once, for the first fit.
+        fitting_weight : np.ndarray, optional
+            Segmentation mask, as for ``BaSiC.fit``.
+        report : RunReport, optional
+            Receives ``preprocess`` and ``fit`` stages.
+        frames : array of int or slice, optional
+            Fit only these frames. They are selected from the cached working-size stack of all of `data`,
+            so the input is never copied and other subsets reuse the same preprocessing.
+        key : hashable, optional
+            Identifies `data` in place of ``id(data)``, for inputs that are rebuilt on every run from the
+            same source, e.g. the ROI crop of a layer: ``(id(layer_data), roi)``.
+
+        Returns
+        -------
+        BaSiC
+            Fitted model with full-size flatfield and darkfield, ready for ``transform``.
+        """
+        if isinstance(frames, slice):
+            frames = np.arange(data.shape[0])[frames]
+        result_key = _settings_key(settings, frames)
+        with self._lock:
+            self._select(data, fitting_weight, settings, key)
+            if result_key in self._results:
+                self._results.move_to_end(result_key)
+                self.hits += 1
+                logger.info("Reusing the fit for unchanged settings and input")
+                return self._results[result_key]
+            # selected once: fingerprinting the input for the key is not free on large stacks
+            images, weight = self._stack(settings, data, fitting_weight, report)
+        if frames is not None:
+            images = images[frames]
+            weight = None if weight is None else weight[frames]
+        with _stage(report, "fit", frames=len(images)):
+            basic = fit_working_stack(settings, images, weight)
+        # back to the full frame size
+        basic.flatfield = _upsample_profile(basic.flatfield, data.shape[-2:])
+        basic.darkfield = _upsample_profile(basic.darkfield, data.shape[-2:])
+        self.remember(settings, basic, frames)
+        return basic
+
+    @staticmethod
+    def _basic(settings):
+        from basicpy import BaSiC
+
+        return BaSiC(**settings)
+
+    def _preprocess(self, basic, data, fitting_weight):
+        if basic.device == "none":
+            # resolved the way BaSiC.fit does it; resizing happens before any fit
+            import torch
+
+            basic.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._images = _to_numpy(basic._resize_to_working_size(data[:, None]))[:, 0].astype(np.float32)
+        if fitting_weight is not None:
+            w = basic._resize_to_working_size(np.asarray(fitting_weight)[:, None], "nearest")
+            self._weight = (_to_numpy(w)[:, 0] > 0).astype(np.float32)
+
+
+def fit_working_stack(settings: dict, images: np.ndarray, weight: Optional[np.ndarray] = None):
+    """Fit BaSiC with `settings` on a stack that is already at working size.
+
+    The model is returned with the caller's settings and working-size profiles.
+    """
+    from basicpy import BaSiC
+
+    basic = BaSiC(**{**settings, "working_size": list(images.shape[-2:])})
+    basic.fit(images, fitting_weight=weight, skip_shape_warning=True)
+    for k, v in settings.items():
+        setattr(basic, k, v)
+    return basic
+
+
+def _to_numpy(a) -> np.ndarray:
+    # BaSiC resizes numpy input with torch and dask input with scikit-image
+    return a.cpu().numpy() if hasattr(a, "cpu") else np.asarray(a)
+
+
+def _stage(report, name, **kwargs):
+    return report.stage(name, **kwargs) if report is not None else nullcontext()
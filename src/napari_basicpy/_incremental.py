@@ -0,0 +1,155 @@
+"""Incremental fitting: keep a shading model up to date while frames keep arriving.
+
+BaSiC fits from scratch on a complete stack and has no warm-start hook, so refitting everything seen so
+far gets slower with every well. `IncrementalFit` keeps a bounded, uniform sample of all frames seen
+(reservoir sampling), stored at BaSiC's working size, which is all BaSiC looks at anyway. Each update
+fits on that reservoir only, so it costs the same for the tenth batch as for the thousandth, and blends
+the new estimate with the previous model so that the profiles evolve smoothly between updates.
+
+Example
+-------
+>>> from napari_basicpy._incremental import IncrementalFit
+>>> inc = IncrementalFit({"get_darkfield": True})
+>>> for batch in acquisition:  # doctest: +SKIP
+...     inc.add(batch)
+...     flatfield, darkfield = inc.update()
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .utils import _upsample_profile
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalFit:
+    """Running BaSiC model over a stream of frame batches.
+
+    Parameters
+    ----------
+    settings : dict
+        Keyword arguments for ``BaSiC(...)``. ``working_size`` sets the resolution the reservoir is
+        kept at (BaSiC's default if not given).
+    capacity : int
+        Maximum number of frames in the reservoir; bounds memory and the cost of each update.
+    blend : float
+        Weight of the previous model in each update, in ``[0, 1)``. 0 replaces the model with the fit on
+        the current reservoir.
+    seed : int
+        Seed for the reservoir sampling.
+    """
+
+    def __init__(self, settings: Optional[dict] = None, capacity: int = 256, blend: float = 0.3, seed: int = 0):
+        if capacity < 2:
+            raise ValueError("capacity must be at least 2")
+        if not 0 <= blend < 1:
+            raise ValueError("blend must be in [0, 1)")
+        self.settings = dict(settings or {})
+        self.capacity = int(capacity)
+        self.blend = float(blend)
+        self.seed = seed
+        self.frame_shape: Optional[Tuple[int, int]] = None
+        self.n_seen = 0
+        self.n_updates = 0
+        self._rng = np.random.default_rng(seed)
+        self._reservoir: Optional[np.ndarray] = None
+        self._basic = None
+        # profiles at working size; the full-size ones are interpolated from these
+        self._flatfield_small: Optional[np.ndarray] = None
+        self._darkfield_small: Optional[np.ndarray] = None
+
+    @property
+    def n_buffered(self) -> int:
+        return min(self.n_seen, self.capacity)
+
+    def _preprocessor(self):
+        if self._basic is None:
+            from basicpy import BaSiC
+
+            basic = BaSiC(**self.settings)
+            if basic.device == "none":
+                # resolved the way BaSiC.fit does it; resizing happens before any fit
+                import torch
+
+                basic.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self._basic = basic
+        return self._basic
+
+    def _downsample(self, frames: np.ndarray) -> np.ndarray:
+        # BaSiC's own resize, so the reservoir matches what a full fit would see
+        small = self._preprocessor()._resize_to_working_size(frames[:, None])
+        return small.cpu().numpy()[:, 0] if hasattr(small, "cpu") else np.asarray(small)[:, 0]
+
+    def add(self, frames) -> int:
+        """Add a batch of frames ``(..., Y, X)``; returns the number of frames seen so far."""
+        frames = np.asarray(frames)
+        if frames.ndim < 2:
+            raise ValueError("frames must be at least 2D")
+        frames = frames.reshape((-1, *frames.shape[-2:]))
+        if self.frame_shape is None:
+            self.frame_shape = frames.shape[-2:]
+        elif frames.shape[-2:] != self.frame_shape:
+            raise ValueError(f"Frame shape {frames.shape[-2:]} does not match earlier frames {self.frame_shape}")
+
+        small = self._downsample(frames)
+        if self._reservoir is None:
+            self._reservoir = np.empty((self.capacity, *small.shape[-2:]), dtype=np.float32)
+        for frame in small:
+            # Algorithm R: every frame seen so far is in the reservoir with equal probability
+            if self.n_seen < self.capacity:
+                self._reservoir[self.n_seen] = frame
+            else:
+                j = self._rng.integers(0, self.n_seen + 1)
+                if j < self.capacity:
+                    self._reservoir[j] = frame
+            self.n_seen += 1
+        return self.n_seen
+
+    def update(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Refit on the reservoir and blend with the previous model.
+
+        Returns
+        -------
+        flatfield, darkfield : np.ndarray
+            Full-size profiles; darkfield is None unless ``get_darkfield`` is set.
+        """
+        if self.n_buffered < 2:
+            raise ValueError("At least two frames are needed to fit")
+        from basicpy import BaSiC
+
+        sample = self._reservoir[: self.n_buffered]
+        # the reservoir is already at working size
+        basic = BaSiC(**{**self.settings, "working_size": list(sample.shape[-2:])})
+        basic.fit(sample, skip_shape_warning=True)
+        flatfield = np.asarray(basic.flatfield, dtype=np.float32)
+        darkfield = np.asarray(basic.darkfield, dtype=np.float32)
+
+        if self._flatfield_small is not None and self.blend > 0:
+            flatfield = self.blend * self._flatfield_small + (1 - self.blend) * flatfield
+            flatfield /= flatfield.mean()
+            darkfield = self.blend * self._darkfield_small + (1 - self.blend) * darkfield
+        self._flatfield_small = flatfield
+        self._darkfield_small = darkfield
+        self.n_updates += 1
+        logger.info(f"Incremental fit #{self.n_updates}: {self.n_buffered} of {self.n_seen} frames in the reservoir")
+        return self.profiles()
+
+    def profiles(self) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Current full-size flatfield and darkfield (None without ``get_darkfield``)."""
+        if self._flatfield_small is None:
+            raise ValueError("No model yet; call update() first")
+        flatfield = _upsample_profile(self._flatfield_small, self.frame_shape)
+        darkfield = None
+        if self.settings.get("get_darkfield"):
+            darkfield = _upsample_profile(self._darkfield_small, self.frame_shape)
+        return flatfield, darkfield
+
+    def reset(self):
+        """Forget all frames and the model."""
+        self.__init__(self.settings, self.capacity, self.blend, self.seed)
+
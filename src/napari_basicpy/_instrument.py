@@ -0,0 +1,318 @@
+"""Run instrumentation: time per stage, bytes moved, frame rates, peak memory and a JSON run report.
+
+A `RunReport` is created for each fit, autotune, transform, sequence or save run. Hot paths wrap their
+steps in ``report.stage(name, read=..., written=..., frames=...)`` (thread safe, so parallel readers and
+workers can report into the same stage), the widget turns ``report.status(done, total)`` into a live
+rate/ETA line, and ``report.write(...)`` stores settings, timings and input fingerprints as JSON next to
+the outputs.
+
+Stage times are summed over threads: with several workers a stage can report more seconds than the run's
+wall time, which is what identifies it as the bottleneck.
+"""
+
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from .utils import config_dir
+
+logger = logging.getLogger(__name__)
+
+# reports for runs whose outputs are layers rather than files
+_MAX_KEPT_REPORTS = 200
+
+
+def reports_dir() -> str:
+    path = os.path.join(config_dir(), "reports")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _rss() -> Optional[int]:
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def _process_peak_rss() -> Optional[int]:
+    if sys.platform == "win32":
+        try:
+            import psutil
+
+            return psutil.Process().memory_info().peak_wset
+        except (ImportError, AttributeError):
+            return None
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _MemorySampler(threading.Thread):
+    """Samples the process RSS a few times per second, for the peak during one run."""
+
+    def __init__(self, interval: float = 0.2):
+        super().__init__(daemon=True, name="basicpy-mem-sampler")
+        self.interval = interval
+        self.start_rss = _rss()
+        self.peak = self.start_rss
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = _rss()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        rss = _rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+
+# sampled elements gathered at a time from non-contiguous arrays
+_GATHER = 1 << 16
+
+
+def fingerprint_array(arr, sample_bytes: int = 1 << 20) -> dict:
+    """Shape, dtype and a hash of an evenly strided sample; cheap enough for arrays of any size."""
+    shape = tuple(int(s) for s in np.shape(arr))
+    info = {"shape": list(shape), "dtype": str(getattr(arr, "dtype", np.asarray(arr).dtype))}
+    if not isinstance(arr, np.ndarray):
+        # lazy arrays (dask, zarr) are not read just to fingerprint them
+        info["type"] = type(arr).__name__
+        return info
+    step = max(1, arr.size * arr.itemsize // sample_bytes)
+    h = hashlib.blake2b(digest_size=16)
+    if arr.flags.c_contiguous:
+        h.update(np.ascontiguousarray(arr.reshape(-1)[::step]).tobytes())
+    else:
+        # a view (e.g. a ROI crop) would be copied whole by reshape; gather the same flat positions in
+        # bounded pieces instead, which hashes the same bytes
+        for start in range(0, arr.size, step * _GATHER):
+            positions = np.arange(start, min(arr.size, start + step * _GATHER), step)
+            h.update(np.ascontiguousarray(arr[np.unravel_index(positions, shape)]).tobytes())
+    info["sample_blake2b"] = h.hexdigest()
+    return info
+
+
+def fingerprint_files(paths: Iterable[str]) -> dict:
+    """Count, total size and a hash over (name, size, mtime) of input files; no pixels are read."""
+    h = hashlib.blake2b(digest_size=16)
+    n = total = 0
+    for p in paths:
+        st = os.stat(p)
+        h.update(f"{p}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+        n += 1
+        total += st.st_size
+    return {"n_files": n, "total_bytes": total, "stat_blake2b": h.hexdigest()}
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return {"array": list(value.shape), "dtype": str(value.dtype)}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _fmt_duration(seconds: float) -> str:
+    return str(datetime.timedelta(seconds=int(round(seconds))))
+
+
+class RunReport:
+    """Timings and counters for one run.
+
+    Parameters
+    ----------
+    kind : str
+        ``"fit"``, ``"preview"``, ``"autotune"``, ``"sweep"``, ``"transform"``, ``"sequence"``, ``"watch"``
+        or ``"save"``.
+    settings : dict, optional
+        Settings to record (BaSiC parameters, save dtype, ...).
+    inputs : dict, optional
+        Input fingerprints, see `fingerprint_array` and `fingerprint_files`.
+    """
+
+    def __init__(self, kind: str, settings: Optional[dict] = None, inputs: Optional[dict] = None):
+        self.kind = kind
+        self.settings = dict(settings or {})
+        self.inputs = dict(inputs or {})
+        self.outputs: dict = {}
+        self.started = datetime.datetime.now().astimezone()
+        self.status_text = "running"
+        self.stages: dict = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.frames = 0
+        self._t0 = time.perf_counter()
+        self._wall: Optional[float] = None
+        self._lock = threading.Lock()
+        self._memory = _MemorySampler()
+        self._memory.start()
+
+    @property
+    def elapsed(self) -> float:
+        return self._wall if self._wall is not None else time.perf_counter() - self._t0
+
+    def _add(self, name, seconds, nbytes_read=0, nbytes_written=0, frames=0):
+        with self._lock:
+            st = self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "bytes": 0, "frames": 0})
+            st["seconds"] += seconds
+            st["calls"] += 1
+            st["bytes"] += nbytes_read + nbytes_written
+            st["frames"] += frames
+            self.bytes_read += nbytes_read
+            self.bytes_written += nbytes_written
+
+    @contextmanager
+    def stage(self, name: str, read: int = 0, written: int = 0, frames: int = 0):
+        """Time a block; `read`/`written` bytes and `frames` are credited to the stage and the run totals."""
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - t, read, written, frames)
+
+    def timed_iter(self, iterable: Iterable, name: str, nbytes=None, frames=None) -> Iterator:
+        """Yield from `iterable`, timing each ``next()`` as stage `name`.
+
+        `nbytes` and `frames` are optional callables that size each item.
+        """
+        it = iter(iterable)
+        while True:
+            t = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            self._add(
+                name,
+                time.perf_counter() - t,
+                nbytes(item) if nbytes else 0,
+                0,
+                frames(item) if frames else 0,
+            )
+            yield item
+
+    def count_frames(self, n: int):
+        with self._lock:
+            self.frames += n
+
+    def status(self, done: int, total: int, unit: str = "frames") -> str:
+        """One line for the viewer status bar: progress, rates and ETA."""
+        elapsed = max(self.elapsed, 1e-9)
+        rate = done / elapsed
+        parts = [f"BaSiCPy {self.kind}: {done}/{total} {unit} ({done / max(total, 1):.0%})", f"{rate:.1f} {unit}/s"]
+        if self.bytes_read:
+            parts.append(f"read {self.bytes_read / elapsed / 2**20:.0f} MB/s")
+        if self.bytes_written:
+            parts.append(f"write {self.bytes_written / elapsed / 2**20:.0f} MB/s")
+        if 0 < done < total:
+            parts.append(f"ETA {_fmt_duration((total - done) / rate)}")
+        return " · ".join(parts)
+
+    def finish(self, status: str = "done", **outputs) -> "RunReport":
+        if self._wall is None:
+            self._wall = time.perf_counter() - self._t0
+            self._memory.stop()
+        self.status_text = status
+        self.outputs.update(outputs)
+        return self
+
+    def summary(self) -> str:
+        wall = self.elapsed
+        parts = [f"{self.kind} {self.status_text} in {wall:.2f} s"]
+        if self.frames:
+            parts.append(f"{self.frames / wall:.1f} frames/s")
+        stages = ", ".join(f"{k} {v['seconds']:.2f} s" for k, v in self.stages.items())
+        if stages:
+            parts.append(stages)
+        if self._memory.peak:
+            parts.append(f"peak RSS {self._memory.peak / 2**20:.0f} MB")
+        return "; ".join(parts)
+
+    def to_dict(self) -> dict:
+        wall = self.elapsed
+        peak = self._memory.peak
+        return _jsonable(
+            {
+                "kind": self.kind,
+                "status": self.status_text,
+                "started": self.started.isoformat(timespec="seconds"),
+                "wall_seconds": wall,
+                "frames": self.frames,
+                "frames_per_second": self.frames / wall if wall > 0 else None,
+                "bytes_read": self.bytes_read,
+                "bytes_written": self.bytes_written,
+                "read_mb_per_second": self.bytes_read / wall / 2**20 if wall > 0 else None,
+                "write_mb_per_second": self.bytes_written / wall / 2**20 if wall > 0 else None,
+                "stages": self.stages,
+                "memory": {
+                    "rss_start_bytes": self._memory.start_rss,
+                    "rss_peak_bytes": peak,
+                    "process_peak_bytes": _process_peak_rss(),
+                },
+                "settings": self.settings,
+                "inputs": self.inputs,
+                "outputs": self.outputs,
+                "environment": {
+                    "python": sys.version.split()[0],
+                    "numpy": np.__version__,
+                    "napari_basicpy": _package_version(),
+                    "cpu_count": os.cpu_count(),
+                },
+            }
+        )
+
+    def write(self, path: Optional[str] = None) -> str:
+        """Write the report as JSON.
+
+        `path` may be a file or a folder; by default reports go to the per-user reports folder.
+        """
+        if path is None or os.path.isdir(path):
+            stamp = self.started.strftime("%Y%m%d-%H%M%S-%f")[:-3]
+            path = os.path.join(path or reports_dir(), f"basicpy_{self.kind}_{stamp}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(reports_dir()):
+            _prune_reports()
+        return path
+
+
+def _package_version() -> str:
+    from . import __version__
+
+    return __version__
+
+
+def _prune_reports():
+    folder = reports_dir()
+    files = sorted(
+        (os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".json")), key=os.path.getmtime
+    )
+    for f in files[:-_MAX_KEPT_REPORTS]:
+        try:
+            os.remove(f)
+        except OSError:
+            pass
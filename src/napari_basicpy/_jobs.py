@@ -0,0 +1,462 @@
+"""Persistent queue of fit, transform and sequence jobs.
+
+The widget runs one fit or transform at a time, on whatever is selected when Run is pressed. A `Job`
+instead records everything the run needs when it is queued: the input (a layer name and the file it was
+opened from, or a folder with its filters), a snapshot of the settings and, for transforms, the
+flatfield/darkfield arrays. Jobs run later, several at a time if configured, while the user keeps
+working.
+
+The queue lives in ``jobs/jobs.json`` in the user config folder, profile snapshots next to it as
+``.npy`` files. It is rewritten on every status change, so a crashed or closed napari leaves the
+queue as it was; jobs that were running then are queued again on the next start.
+
+Example
+-------
+>>> from napari_basicpy._jobs import JobQueue, run_job
+>>> queue = JobQueue("jobs.json")  # doctest: +SKIP
+>>> job = queue.add("sequence", "plate 1", params, arrays={"flatfield": flatfield})  # doctest: +SKIP
+>>> for done, total in run_job(job, queue):  # doctest: +SKIP
+...     queue.set_progress(job, done, total)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import ExitStack, nullcontext
+from dataclasses import asdict, dataclass, field, fields
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from ._instrument import reports_dir
+from ._metrics import MetricsRecorder, metrics_path, record_stack, report_outputs
+from .utils import SCALING_MODES, config_dir
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("fit", "transform", "sequence")
+FINISHED = ("done", "failed", "cancelled")
+
+JOBS_FILE = "jobs.json"
+
+
+def jobs_dir() -> str:
+    path = os.path.join(config_dir(), "jobs")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+@dataclass
+class Job:
+    """One queued run and its state.
+
+    Parameters
+    ----------
+    kind : str
+        ``"fit"``, ``"transform"`` (of a layer) or ``"sequence"`` (of a folder).
+    label : str
+        Name shown in the queue and used for output layers and files.
+    params : dict
+        JSON-serialisable snapshot of the inputs and settings, see `run_job`.
+    """
+
+    kind: str
+    label: str
+    params: dict = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    status: str = "queued"
+    done: int = 0
+    total: int = 0
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    outputs: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        if self.kind not in KINDS:
+            raise ValueError(f"Unknown job kind {self.kind!r}; expected one of {KINDS}")
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in FINISHED
+
+    @property
+    def fraction(self) -> float:
+        if self.status == "done":
+            return 1.0
+        return self.done / self.total if self.total else 0.0
+
+    def status_text(self) -> str:
+        if self.status == "running" and self.total:
+            return f"running {self.done}/{self.total}"
+        if self.status == "failed" and self.error:
+            return f"failed: {self.error}"
+        return self.status
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Job":
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in d.items() if k in names})
+
+
+class JobQueue:
+    """Ordered list of jobs, persisted as JSON.
+
+    Parameters
+    ----------
+    path : str, optional
+        Queue file; ``jobs/jobs.json`` in the user config folder by default. Profile snapshots are kept
+        in the same folder.
+    max_concurrent : int, optional
+        Jobs run at the same time; the saved value (else 1) if not given.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_concurrent: Optional[int] = None):
+        self.path = path or os.path.join(jobs_dir(), JOBS_FILE)
+        self.folder = os.path.dirname(os.path.abspath(self.path))
+        self.jobs: List[Job] = []
+        self.max_concurrent = 1
+        self._lock = threading.RLock()
+        self._load()
+        if max_concurrent is not None:
+            self.max_concurrent = max(1, int(max_concurrent))
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self.max_concurrent = max(1, int(state.get("max_concurrent", 1)))
+            jobs = [Job.from_dict(d) for d in state.get("jobs", [])]
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable job queue {self.path}: {e}")
+            return
+        for job in jobs:
+            if job.status == "running":
+                # napari was closed (or crashed) while it ran: run it again from the start
+                job.status, job.done, job.started = "queued", 0, None
+                job.outputs["interrupted"] = job.outputs.get("interrupted", 0) + 1
+        self.jobs = jobs
+        if any(job.outputs.get("interrupted") for job in jobs):
+            self.save()
+
+    def save(self) -> str:
+        with self._lock:
+            state = {"max_concurrent": self.max_concurrent, "jobs": [job.to_dict() for job in self.jobs]}
+            os.makedirs(self.folder, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(state, f, indent=1, default=str)
+            # atomic: a crash mid-write leaves the previous queue, not half of one
+            os.replace(tmp, self.path)
+        return self.path
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+    def __iter__(self) -> Iterator[Job]:
+        return iter(list(self.jobs))
+
+    def get(self, job_id: str) -> Job:
+        for job in self.jobs:
+            if job.id == job_id:
+                return job
+        raise KeyError(job_id)
+
+    # -----------------------------------------------------------------------------------------------------
+    # editing
+    # -----------------------------------------------------------------------------------------------------
+
+    def add(self, kind: str, label: str, params: dict, arrays: Optional[Dict[str, np.ndarray]] = None) -> Job:
+        """Queue a job; `arrays` (e.g. the profiles of a transform) are stored with it."""
+        job = Job(kind, label, dict(params))
+        os.makedirs(self.folder, exist_ok=True)
+        stored = []
+        for name, arr in (arrays or {}).items():
+            if arr is None:
+                continue
+            np.save(self._array_path(job, name), np.asarray(arr))
+            stored.append(name)
+        job.params["arrays"] = stored
+        with self._lock:
+            self.jobs.append(job)
+            self.save()
+        return job
+
+    def _array_path(self, job: Job, name: str) -> str:
+        return os.path.join(self.folder, f"{job.id}_{name}.npy")
+
+    def array(self, job: Job, name: str) -> Optional[np.ndarray]:
+        """A stored array of `job`, or None if it was queued without one."""
+        if name not in job.params.get("arrays", []):
+            return None
+        return np.load(self._array_path(job, name))
+
+    def remove(self, job_id: str):
+        """Drop a job that is not running, with its stored arrays."""
+        with self._lock:
+            job = self.get(job_id)
+            if job.status == "running":
+                raise ValueError("Cancel a running job before removing it")
+            self.jobs.remove(job)
+            for name in job.params.get("arrays", []):
+                try:
+                    os.remove(self._array_path(job, name))
+                except OSError:
+                    pass
+            self.save()
+
+    def clear_finished(self) -> int:
+        finished = [job.id for job in self.jobs if job.is_finished]
+        for job_id in finished:
+            self.remove(job_id)
+        return len(finished)
+
+    def retry(self, job_id: str) -> Job:
+        """Queue a failed or cancelled job again."""
+        with self._lock:
+            job = self.get(job_id)
+            if job.status not in ("failed", "cancelled"):
+                raise ValueError(f"Only failed or cancelled jobs can be retried, not {job.status} ones")
+            job.status, job.done, job.total, job.error = "queued", 0, 0, None
+            job.started = job.finished = None
+            self.save()
+            return job
+
+    def set_max_concurrent(self, n: int):
+        with self._lock:
+            self.max_concurrent = max(1, int(n))
+            self.save()
+
+    # -----------------------------------------------------------------------------------------------------
+    # scheduling
+    # -----------------------------------------------------------------------------------------------------
+
+    @property
+    def running(self) -> List[Job]:
+        return [job for job in self.jobs if job.status == "running"]
+
+    def next_ready(self) -> Optional[Job]:
+        """The oldest queued job, if fewer than `max_concurrent` jobs are running."""
+        with self._lock:
+            if len(self.running) >= self.max_concurrent:
+                return None
+            return next((job for job in self.jobs if job.status == "queued"), None)
+
+    def mark_running(self, job: Job):
+        with self._lock:
+            job.status, job.started, job.done, job.error = "running", time.time(), 0, None
+            self.save()
+
+    def set_progress(self, job: Job, done: int, total: int):
+        # progress is only saved with the next status change: a restarted job starts over anyway
+        job.done, job.total = int(done), int(total)
+
+    def mark_finished(self, job: Job, status: str = "done", error: Optional[str] = None, **outputs):
+        if status not in FINISHED:
+            raise ValueError(f"Unknown final status {status!r}")
+        with self._lock:
+            job.status, job.finished, job.error = status, time.time(), error
+            job.outputs.update(outputs)
+            self.save()
+
+
+class JobResult(NamedTuple):
+    """What a job leaves behind: JSON-serialisable `outputs` and arrays to show as layers."""
+
+    outputs: dict
+    layers: Dict[str, np.ndarray]
+
+
+def _read_source(params: dict):
+    path = params.get("source")
+    if not path:
+        raise ValueError(f"Layer {params.get('layer')!r} is not open and was not loaded from a file")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Layer {params.get('layer')!r} is not open and {path} no longer exists")
+    import tifffile
+
+    logger.info(f"Job input {params.get('layer')!r} is not open; reading {path}")
+    return tifffile.imread(path)
+
+
+def run_job(
+    job: Job, queue: JobQueue, data=None, fitting_weight=None, report=None
+) -> Iterator[Tuple[int, int]]:
+    """Run `job`, yielding ``(done, total)``; returns a `JobResult`.
+
+    Meant to be driven by a worker thread. Layer inputs are passed as `data` (and `fitting_weight` for
+    fits) by the caller; when `data` is None the file the layer was opened from is read instead.
+
+    ``job.params`` by kind:
+
+    - fit: ``settings`` (BaSiC keyword arguments), ``layer``, ``source``, ``out_folder`` (optional; the
+      profiles and a DCT model are saved there).
+    - transform: ``layer``, ``source``, ``is_timelapse``, ``basic_settings``, ``out_folder`` (optional;
+      the corrected stack is saved there instead of returned as a layer); stored ``flatfield`` and
+      ``darkfield`` arrays.
+    - sequence: ``folder``, ``out_folder``, ``filters`` (`index_sequence` keyword arguments),
+      ``is_timelapse``, ``basic_settings``, ``save_dtype``, ``save_mode``; stored profile arrays. With
+      channel ``routes`` (``[pattern, model]`` pairs) the profiles of ``route_models[i]`` are stored as
+      ``flatfield_<i>`` and ``darkfield_<i>``.
+    """
+    if job.kind == "sequence":
+        return (yield from _run_sequence_job(job, queue, report))
+    yield (0, 1)
+    if data is None:
+        data = _read_source(job.params)
+    if job.kind == "fit":
+        result = _run_fit_job(job, data, fitting_weight, report)
+    else:
+        result = _run_transform_job(job, queue, data, report)
+    yield (1, 1)
+    return result
+
+
+def _stage(report, name, **kwargs):
+    return report.stage(name, **kwargs) if report is not None else nullcontext()
+
+
+def _out_file(job: Job, suffix: str) -> str:
+    folder = job.params["out_folder"]
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{job.label}_{suffix}")
+
+
+def _metrics_recorder(job, folder, report) -> Optional[MetricsRecorder]:
+    # params["metrics"] is the table format ("csv" or "parquet"), or None for no QC metrics
+    fmt = job.params.get("metrics")
+    if not fmt:
+        return None
+    return MetricsRecorder(metrics_path(folder, fmt, report.started if report is not None else None))
+
+
+def _run_fit_job(job, data, fitting_weight, report) -> JobResult:
+    from basicpy import BaSiC
+
+    from ._dct_model import DCTModel
+
+    basic = BaSiC(**job.params.get("settings", {}))
+    n_frames = int(np.prod(data.shape[:-2]))
+    with _stage(report, "fit", frames=n_frames):
+        basic.fit(data, fitting_weight=fitting_weight)
+    if report is not None:
+        report.count_frames(n_frames)
+    flatfield = np.asarray(basic.flatfield, dtype=np.float32)
+    darkfield = np.asarray(basic.darkfield, dtype=np.float32) if basic.get_darkfield else None
+
+    layers = {"flatfield": flatfield}
+    if darkfield is not None:
+        layers["darkfield"] = darkfield
+    outputs = {}
+    if job.params.get("out_folder"):
+        import tifffile
+
+        with _stage(report, "write"):
+            for name, profile in layers.items():
+                outputs[name] = _out_file(job, f"{name}.tif")
+                tifffile.imwrite(outputs[name], profile)
+            outputs["model"] = _out_file(job, "model.npz")
+            DCTModel.from_fields(flatfield, darkfield).save(outputs["model"])
+    return JobResult(outputs, layers)
+
+
+def _run_transform_job(job, queue, data, report) -> JobResult:
+    from ._sequence import frame_corrector
+
+    flatfield, darkfield = queue.array(job, "flatfield"), queue.array(job, "darkfield")
+    if tuple(flatfield.shape) != tuple(data.shape[-2:]):
+        raise ValueError(f"Flatfield shape {flatfield.shape} does not match the frames {data.shape[-2:]}")
+    is_timelapse = bool(job.params.get("is_timelapse"))
+    n_frames = int(np.prod(data.shape[:-2]))
+    with frame_corrector(flatfield, darkfield, is_timelapse, job.params.get("basic_settings")) as correct:
+        with _stage(report, "correct", frames=n_frames):
+            if is_timelapse:
+                frames = np.asarray(data).reshape((-1, *data.shape[-2:]))
+                corrected = correct(frames).reshape(data.shape)
+            else:
+                corrected = correct(data)
+    if report is not None:
+        report.count_frames(n_frames)
+
+    metrics = _metrics_recorder(job, job.params.get("out_folder") or reports_dir(), report)
+    if metrics is not None:
+        with _stage(report, "metrics", frames=n_frames), metrics:
+            record_stack(metrics, corrected, raw=data)
+    outputs = report_outputs(metrics)
+
+    if job.params.get("out_folder"):
+        import tifffile
+
+        path = _out_file(job, "corrected.tif")
+        with _stage(report, "write", written=corrected.nbytes):
+            tifffile.imwrite(path, corrected)
+        return JobResult({"corrected": path, **outputs}, {})
+    return JobResult(outputs, {"corrected": corrected})
+
+
+def _run_sequence_job(job, queue, report) -> Iterator[Tuple[int, int]]:
+    from ._sequence import correct_sequence, estimate_batch_size, frame_corrector, index_sequence, routed_index
+
+    p = job.params
+    folder, out_folder = p["folder"], p["out_folder"]
+    if os.path.abspath(folder) == os.path.abspath(out_folder):
+        raise ValueError("Output folder must be different from the input folder")
+    index = index_sequence(folder, **p.get("filters", {}))
+    if not len(index):
+        raise ValueError(f"No files in {folder} match the filters")
+    file_routes = None
+    if p.get("routes"):
+        index, file_routes, unrouted = routed_index(index, [tuple(route) for route in p["routes"]])
+        if not len(index):
+            raise ValueError(f"No file in {folder} matches any channel route")
+        if unrouted:
+            logger.warning(f"{len(unrouted)} file(s) in {folder} match no channel route and are skipped")
+        models = {
+            model: (queue.array(job, f"flatfield_{i}"), queue.array(job, f"darkfield_{i}"))
+            for i, model in enumerate(p["route_models"])
+        }
+    else:
+        models = {None: (queue.array(job, "flatfield"), queue.array(job, "darkfield"))}
+    index.check_homogeneous()
+    for flatfield, _ in models.values():
+        if tuple(flatfield.shape) != tuple(index.frame_shape):
+            raise ValueError(f"Flatfield shape {flatfield.shape} does not match the frames {index.frame_shape}")
+    os.makedirs(out_folder, exist_ok=True)
+
+    def out_path(path):
+        return os.path.join(out_folder, os.path.relpath(path, folder))
+
+    batch_size = estimate_batch_size(index.files[0], target_gb=0.5, hard_cap=50)
+    is_timelapse = bool(p.get("is_timelapse"))
+    metrics = _metrics_recorder(job, out_folder, report)
+    with ExitStack() as stack:
+        correctors = {
+            model: stack.enter_context(frame_corrector(flatfield, darkfield, is_timelapse, p.get("basic_settings")))
+            for model, (flatfield, darkfield) in models.items()
+        }
+        if metrics is not None:
+            stack.enter_context(metrics)
+        yield from correct_sequence(
+            index,
+            out_path,
+            correctors if file_routes else correctors[None],
+            batch_size,
+            p.get("save_dtype", "float32"),
+            p.get("save_mode", SCALING_MODES[0]),
+            report=report,
+            metrics=metrics,
+            routes=file_routes,
+        )
+    outputs = {"output_folder": out_folder, "files": len(index), "frames": index.n_frames}
+    return JobResult({**outputs, **report_outputs(metrics)}, {})
@@ -0,0 +1,79 @@
+"""Live preview of a running sequence correction.
+
+`FrameRing` keeps copies of the last `capacity` corrected frames in a fixed, preallocated buffer.
+The worker pushes its in-memory batches as soon as they are corrected (no disk reads), and the GUI
+thread takes a `snapshot` at a throttled rate to refresh a preview layer, so a bad correction shows up
+minutes into a long run rather than at its end.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class FrameRing:
+    """Thread-safe ring buffer of the most recent frames.
+
+    Parameters
+    ----------
+    capacity : int
+        Number of frames kept.
+    frame_shape : tuple of int
+        ``(Y, X)`` shape of every frame.
+    dtype
+        Buffer dtype; pushed frames are cast to it.
+    """
+
+    def __init__(self, capacity: int, frame_shape: Tuple[int, int], dtype="float32"):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = int(capacity)
+        self._buffer = np.zeros((self.capacity, *frame_shape), dtype=dtype)
+        self._next = 0
+        self.count = 0  # frames pushed so far
+        self._lock = threading.Lock()
+
+    def push(self, frames: np.ndarray):
+        """Copy a ``(B, Y, X)`` batch (or one frame) in, overwriting the oldest frames."""
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[None]
+        n = len(frames)
+        frames = frames[-self.capacity :]
+        with self._lock:
+            start = (self._next + n - len(frames)) % self.capacity
+            idx = (start + np.arange(len(frames))) % self.capacity
+            self._buffer[idx] = frames
+            self._next = (self._next + n) % self.capacity
+            self.count += n
+
+    def __len__(self) -> int:
+        return min(self.count, self.capacity)
+
+    def snapshot(self) -> Optional[np.ndarray]:
+        """Copy of the kept frames, oldest first; None before the first push."""
+        with self._lock:
+            n = len(self)
+            if not n:
+                return None
+            idx = (self._next - n + np.arange(n)) % self.capacity
+            return self._buffer[idx]
+
+
+class Throttle:
+    """True at most once every `interval` seconds (the first call always passes)."""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self._last = -np.inf
+
+    def __call__(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if force or now - self._last >= self.interval:
+            self._last = now
+            return True
+        return False
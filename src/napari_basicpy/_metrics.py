@@ -0,0 +1,227 @@
+"""Per-frame correction-quality metrics, computed while frames stream through a transform.
+
+For every frame, before (``raw_*``) and after correction:
+
+- ``mean``: mean intensity; its trend over frames is the baseline.
+- ``cv``: coefficient of variation (std / mean) of the frame.
+- ``vignetting``: mean of the four corner regions divided by the mean of the central region; 1 for a
+  flat frame, below 1 for the usual vignetting.
+- ``low_freq``: fraction of the frame's (mean-removed) spectral energy below `cutoff` cycles per frame,
+  computed on a block-averaged copy; shading lives there, so correction should lower it.
+
+`MetricsRecorder` appends one row per frame to a CSV file as batches arrive (or collects them for a
+Parquet file, written on close; that needs the optional ``pyarrow`` package). It keeps every row's
+values in memory, the frame labels (file, page, ...) as well as the metrics, for the aggregate summary
+and the Parquet table; that is a few numbers per frame, so a 100k-frame run never holds images for QC.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from ._apply import as_frames
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("mean", "cv", "vignetting", "low_freq")
+FORMATS = ("csv", "parquet")
+
+
+def _block_mean(stack: np.ndarray, size: int) -> np.ndarray:
+    B, H, W = stack.shape
+    fy, fx = max(1, H // size), max(1, W // size)
+    h, w = (H // fy) * fy, (W // fx) * fx
+    return stack[:, :h, :w].reshape(B, h // fy, fy, w // fx, fx).mean(axis=(2, 4))
+
+
+def frame_metrics(stack, region: float = 0.2, size: int = 64, cutoff: float = 2.0) -> Dict[str, np.ndarray]:
+    """Per-frame metrics of a ``(B, Y, X)`` stack (or a single frame), see the module docstring.
+
+    Parameters
+    ----------
+    region : float
+        Side of the centre and corner regions, as a fraction of the frame side.
+    size : int
+        Approximate side of the block-averaged frames used for ``low_freq``.
+    cutoff : float
+        Radius, in cycles per frame, below which energy counts as low-frequency.
+    """
+    stack = np.asarray(stack, dtype=np.float32)
+    if stack.ndim == 2:
+        stack = stack[None]
+    stack = stack.reshape((-1, *stack.shape[-2:]))
+    B, H, W = stack.shape
+    eps = np.finfo(np.float32).tiny
+
+    mean = stack.mean(axis=(1, 2), dtype=np.float64)
+    std = stack.std(axis=(1, 2), dtype=np.float64)
+
+    ry, rx = max(1, int(round(H * region))), max(1, int(round(W * region)))
+    cy, cx = (H - ry) // 2, (W - rx) // 2
+    centre = stack[:, cy : cy + ry, cx : cx + rx].mean(axis=(1, 2), dtype=np.float64)
+    corners = np.mean(
+        [
+            stack[:, :ry, :rx].mean(axis=(1, 2), dtype=np.float64),
+            stack[:, :ry, -rx:].mean(axis=(1, 2), dtype=np.float64),
+            stack[:, -ry:, :rx].mean(axis=(1, 2), dtype=np.float64),
+            stack[:, -ry:, -rx:].mean(axis=(1, 2), dtype=np.float64),
+        ],
+        axis=0,
+    )
+
+    small = _block_mean(stack, size)
+    small = small - small.mean(axis=(1, 2), keepdims=True)
+    power = np.abs(np.fft.rfft2(small)) ** 2
+    ky = np.fft.fftfreq(small.shape[1]) * small.shape[1]
+    kx = np.fft.rfftfreq(small.shape[2]) * small.shape[2]
+    low = np.hypot(ky[:, None], kx[None, :]) <= cutoff
+    total = power.sum(axis=(1, 2))
+
+    return {
+        "mean": mean,
+        "cv": std / np.maximum(np.abs(mean), eps),
+        "vignetting": corners / np.where(np.abs(centre) > eps, centre, eps),
+        "low_freq": power[:, low].sum(axis=1) / np.maximum(total, eps),
+    }
+
+
+class MetricsRecorder:
+    """Stream per-frame metrics into a table file and aggregate them.
+
+    Parameters
+    ----------
+    path : str
+        Output file; the format follows the extension (``.csv`` or ``.parquet``).
+    raw : bool
+        Also record the metrics of the uncorrected frames (``raw_*`` columns) when they are given.
+    **kwargs
+        Passed to `frame_metrics`.
+    """
+
+    def __init__(self, path: str, raw: bool = True, **kwargs):
+        self.path = path
+        self.format = "parquet" if path.lower().endswith(".parquet") else "csv"
+        if self.format == "parquet":
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError as e:
+                raise ImportError("Writing Parquet files requires the 'pyarrow' package: pip install pyarrow") from e
+        self.raw = raw
+        self.kwargs = kwargs
+        self.n_frames = 0
+        self._columns: Dict[str, List] = {}
+        self._file = None
+        self._writer = None
+        self._lock = threading.Lock()
+
+    def update(self, labels: Sequence[dict], corrected, raw=None):
+        """Add the frames of a batch; ``labels[i]`` identifies frame ``i`` (file, page, frame number...)."""
+        self.add_rows(self.measure(labels, corrected, raw))
+
+    def measure(self, labels: Sequence[dict], corrected, raw=None) -> List[dict]:
+        """The rows `update` would add, without adding them (see `add_rows`)."""
+        values = dict(frame_metrics(corrected, **self.kwargs))
+        if self.raw and raw is not None:
+            values.update({f"raw_{k}": v for k, v in frame_metrics(raw, **self.kwargs).items()})
+        if len(labels) != len(values["mean"]):
+            raise ValueError(f"{len(labels)} labels for {len(values['mean'])} frames")
+        return [{**label, **{k: float(v[i]) for k, v in values.items()}} for i, label in enumerate(labels)]
+
+    def add_rows(self, rows: List[dict]):
+        """Add rows from `measure`, e.g. once the frames they describe are safely written."""
+        with self._lock:
+            for key in rows[0] if rows else ():
+                self._columns.setdefault(key, [])
+            for row in rows:
+                for key, col in self._columns.items():
+                    col.append(row.get(key))
+            if self.format == "csv":
+                self._write_csv(rows)
+            self.n_frames += len(rows)
+
+    def _write_csv(self, rows):
+        if self._writer is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=list(self._columns), extrasaction="ignore")
+            self._writer.writeheader()
+        self._writer.writerows(rows)
+
+    def summary(self) -> dict:
+        """Mean, 5th percentile, median and 95th percentile of every metric column."""
+        out = {}
+        with self._lock:
+            for key, col in self._columns.items():
+                name = key[4:] if key.startswith("raw_") else key
+                if name not in METRICS:
+                    continue
+                a = np.asarray(col, dtype=np.float64)
+                a = a[np.isfinite(a)]
+                if not a.size:
+                    continue
+                p5, p50, p95 = np.percentile(a, [5, 50, 95])
+                out[key] = {"mean": float(a.mean()), "p5": float(p5), "median": float(p50), "p95": float(p95)}
+        return out
+
+    def close(self) -> dict:
+        """Finish the file; returns `summary`."""
+        with self._lock:
+            if self.format == "csv":
+                if self._file is not None:
+                    self._file.close()
+                    self._file = self._writer = None
+            elif self._columns:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                pq.write_table(pa.table(self._columns), self.path)
+        logger.info(f"QC metrics for {self.n_frames} frames written to {self.path}")
+        return self.summary()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def frame_labels(start: int, n: int) -> List[dict]:
+    """Labels for frames ``start .. start + n - 1`` of an in-memory stack."""
+    return [{"frame": i} for i in range(start, start + n)]
+
+
+def record_stack(recorder: MetricsRecorder, corrected, raw=None, batch_frames: int = 64):
+    """Feed a ``(..., Y, X)`` stack to `recorder` in batches; stores (Zarr, dask) are read per batch."""
+    corrected = as_frames(corrected)
+    if raw is not None:
+        raw = as_frames(raw)
+    for start in range(0, len(corrected), batch_frames):
+        stop = min(start + batch_frames, len(corrected))
+        recorder.update(
+            frame_labels(start, stop - start),
+            np.asarray(corrected[start:stop]),
+            None if raw is None else np.asarray(raw[start:stop]),
+        )
+
+
+def metrics_path(folder: str, fmt: str = "csv", started: Optional[datetime.datetime] = None) -> str:
+    """``basicpy_metrics_<time>.<fmt>`` in `folder`, stamped like the run report started at `started`."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown metrics format {fmt!r}; expected one of {FORMATS}")
+    stamp = (started or datetime.datetime.now()).strftime("%Y%m%d-%H%M%S-%f")[:-3]
+    return os.path.join(folder, f"basicpy_metrics_{stamp}.{fmt}")
+
+
+def report_outputs(recorder: Optional[MetricsRecorder]) -> dict:
+    """Run-report outputs for `recorder`: the file and the aggregate summary (nothing without a recorder)."""
+    if recorder is None:
+        return {}
+    return {"metrics_file": recorder.path, "metrics": recorder.summary()}
@@ -0,0 +1,318 @@
+"""Pre-flight peak-memory estimates for fits and transforms, with fallbacks that keep within a budget.
+
+A fit or transform that does not fit in memory does not fail cleanly: the napari process is killed.
+`plan_fit` and `plan_transform` estimate the extra memory a run will allocate from the input's shape,
+BaSiC's working size and intensity sorting, and the timelapse and mask options, and compare it with a
+budget (configured in the compute backend settings, by default 75% of the memory available now).
+Data that is already loaded (the layer) is not counted; only what the run adds on top of it.
+
+The estimate follows the run's stages:
+
+- ``preprocess``: the stack (and mask) resized to the working size; lazy inputs are read frame by frame.
+- ``fit``: BaSiC's optimiser keeps about a dozen working-size copies of the stack, plus a fixed cost for
+  its compiled kernels.
+- ``output``: the float32 corrected stack.
+- ``correct``: temporaries of the correction; BaSiC's timelapse transform works on 100-frame chunks.
+
+When the estimate exceeds the budget, the plan falls back, in this order, to:
+
+1. out-of-core output: the corrected stack is written into a disk-backed array (see
+   `napari_basicpy._tiles.allocate_mosaic`) instead of memory;
+2. chunked transform: timelapse corrections run on batches of frames into that output;
+3. frame subsampling (fits only): the profiles are fitted on evenly spaced frames. This changes the
+   result, unlike the first two, and is reported as such.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+GB = 1024**3
+
+# share of the currently available memory a run may use when no budget is configured
+DEFAULT_FRACTION = 0.75
+# working-size copies held by BaSiC's optimiser, measured on CPU; sorting by intensity adds a few, the
+# darkfield makes no measurable difference
+_FIT_COPIES = 12
+_SORT_COPIES = 3
+# compiled kernels and optimiser state that do not scale with the stack
+_FIT_OVERHEAD = 768 * 1024**2
+# BaSiC.transform corrects in chunks of this many frames, with a few float32 temporaries per chunk
+TRANSFORM_CHUNK = 100
+_TRANSFORM_COPIES = 4
+# fewest frames a subsampled fit may use
+MIN_FIT_FRAMES = 16
+
+
+def available_memory() -> Optional[int]:
+    """Bytes of memory available to new allocations, or None if the platform does not tell."""
+    try:
+        import psutil
+
+        return int(psutil.virtual_memory().available)
+    except ImportError:
+        pass
+    try:
+        return int(os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE"))
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def memory_budget(budget_gb: float = 0.0) -> Optional[int]:
+    """`budget_gb` in bytes, or `DEFAULT_FRACTION` of the available memory when it is 0."""
+    if budget_gb:
+        return int(budget_gb * GB)
+    available = available_memory()
+    return None if available is None else int(available * DEFAULT_FRACTION)
+
+
+def _fmt(nbytes: float) -> str:
+    return f"{nbytes / GB:.2f} GB"
+
+
+@dataclass
+class MemoryPlan:
+    """Estimated peak memory of one run and the fallbacks chosen to stay within `budget`.
+
+    Attributes
+    ----------
+    kind : str
+        ``"fit"`` or ``"transform"``.
+    parts : dict
+        Estimated bytes per stage, for the plan as chosen.
+    full_estimate : int
+        Estimated bytes without any fallback.
+    budget : int or None
+        Bytes the run may use; None when unknown (no fallbacks are chosen then).
+    fit_frames : int or None
+        Frames the fit uses when subsampled, else None (all frames).
+    chunk_frames : int or None
+        Frames per batch for a chunked transform, else None (one pass).
+    out_of_core : bool
+        Write the corrected stack into a disk-backed array.
+    """
+
+    kind: str
+    parts: Dict[str, int]
+    full_estimate: int
+    budget: Optional[int] = None
+    fit_frames: Optional[int] = None
+    chunk_frames: Optional[int] = None
+    out_of_core: bool = False
+    notes: List[str] = field(default_factory=list)
+
+    @property
+    def estimate(self) -> int:
+        # summed over stages: cached stacks and the output outlive the stage that made them
+        return int(sum(self.parts.values()))
+
+    @property
+    def fallback(self) -> bool:
+        return bool(self.fit_frames or self.chunk_frames or self.out_of_core)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.budget is not None and self.estimate > self.budget
+
+    def text(self) -> str:
+        """One-paragraph summary for logs and messages."""
+        budget = "unknown budget" if self.budget is None else f"budget {_fmt(self.budget)}"
+        lines = [f"Estimated peak memory of this {self.kind}: {_fmt(self.estimate)} ({budget})."]
+        if self.fallback:
+            lines.append(f"Without fallbacks: {_fmt(self.full_estimate)}.")
+        lines.extend(self.notes)
+        if self.over_budget:
+            lines.append("The run may still run out of memory.")
+        return " ".join(lines)
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "estimate": self.estimate}
+
+
+def _working_pixels(shape: Sequence[int], working_size) -> int:
+    if working_size is None:
+        return int(np.prod(shape[-2:]))
+    if np.isscalar(working_size):
+        return int(working_size) ** 2
+    return int(np.prod(working_size))
+
+
+def _correct_parts(n_frames, frame_pixels, is_timelapse, mask, chunk_frames=None) -> Dict[str, int]:
+    frame_bytes = frame_pixels * 4
+    if not is_timelapse:
+        # ApplyEngine corrects in row chunks of about 4 MB per thread
+        return {"correct": 32 * 1024**2}
+    chunk = min(n_frames, chunk_frames or TRANSFORM_CHUNK, TRANSFORM_CHUNK)
+    parts = {"correct": chunk * frame_bytes * (_TRANSFORM_COPIES + (1 if mask else 0))}
+    if chunk_frames:
+        # a batch's result before it is copied into the output
+        parts["correct"] += chunk_frames * frame_bytes
+    return parts
+
+
+def _fit_parts(n_frames, working_pixels, settings, mask) -> Dict[str, int]:
+    stack = n_frames * working_pixels * 4
+    copies = _FIT_COPIES + (_SORT_COPIES if settings.get("sort_intensity") else 0)
+    return {
+        # resized stack, its float32 copy in the cache and the resized mask
+        "preprocess": stack * (2 + (1 if mask else 0)),
+        "fit": stack * copies + _FIT_OVERHEAD,
+    }
+
+
+def _chunk_frames(n_frames: int, frame_pixels: int, room: int) -> int:
+    # batches of whole BaSiC chunks where possible, never fewer than 2 frames
+    per_frame = frame_pixels * 4 * (_TRANSFORM_COPIES + 2)
+    frames = max(2, min(n_frames, room // max(per_frame, 1)))
+    return int(frames // TRANSFORM_CHUNK * TRANSFORM_CHUNK or frames)
+
+
+def plan_transform(
+    shape: Sequence[int],
+    is_timelapse: bool = False,
+    mask: bool = False,
+    budget: Optional[int] = None,
+    out_of_core: bool = False,
+) -> MemoryPlan:
+    """Memory plan for correcting a ``(..., Y, X)`` stack with known profiles.
+
+    Parameters
+    ----------
+    shape : sequence of int
+        Shape of the input.
+    is_timelapse : bool
+        Correct with BaSiC's timelapse baseline (chunked by BaSiC, one full-size output).
+    mask : bool
+        A segmentation mask is used (timelapse baselines only).
+    budget : int, optional
+        Bytes the run may use; see `memory_budget`.
+    out_of_core : bool
+        The output already goes to a disk-backed buffer (see `napari_basicpy._apply.allocate_output`); it is
+        then not counted, and not a fallback.
+    """
+    n_frames = int(np.prod(shape[:-2])) if len(shape) > 2 else 1
+    frame_pixels = int(np.prod(shape[-2:]))
+    chunk_frames = TRANSFORM_CHUNK if out_of_core and is_timelapse else None
+    parts = {
+        "output": 0 if out_of_core else n_frames * frame_pixels * 4,
+        **_correct_parts(n_frames, frame_pixels, is_timelapse, mask, chunk_frames),
+    }
+    plan = MemoryPlan("transform", parts, int(sum(parts.values())), budget)
+    if budget is None or plan.estimate <= budget:
+        return plan
+    if not out_of_core:
+        _out_of_core(plan)
+    if is_timelapse:
+        # BaSiC.transform returns a new array; only batches can go into a disk-backed one
+        _chunked(plan, n_frames, frame_pixels, mask, budget)
+    return plan
+
+
+def plan_fit(
+    shape: Sequence[int],
+    settings: dict,
+    is_timelapse: bool = False,
+    mask: bool = False,
+    budget: Optional[int] = None,
+    fit_shape: Optional[Sequence[int]] = None,
+) -> MemoryPlan:
+    """Memory plan for fitting a ``(T, Y, X)`` stack and correcting it.
+
+    Parameters
+    ----------
+    shape : sequence of int
+        Shape of the input.
+    settings : dict
+        ``BaSiC`` keyword arguments; ``working_size`` (default 128) and ``sort_intensity`` matter.
+    is_timelapse : bool
+        The corrected stack gets a timelapse baseline.
+    mask : bool
+        A segmentation mask is used.
+    budget : int, optional
+        Bytes the run may use; see `memory_budget`.
+    fit_shape : sequence of int, optional
+        Shape of the fitted part of the input when the fit is restricted to a region of interest.
+    """
+    n_frames = int(np.prod(shape[:-2])) if len(shape) > 2 else 1
+    frame_pixels = int(np.prod(shape[-2:]))
+    working_pixels = _working_pixels(fit_shape or shape, settings.get("working_size", 128))
+    parts = {
+        **_fit_parts(n_frames, working_pixels, settings, mask),
+        "output": n_frames * frame_pixels * 4,
+        **_correct_parts(n_frames, frame_pixels, is_timelapse, mask),
+    }
+    plan = MemoryPlan("fit", parts, int(sum(parts.values())), budget)
+    if budget is None or plan.estimate <= budget:
+        return plan
+    _out_of_core(plan)
+    if is_timelapse:
+        _chunked(plan, n_frames, frame_pixels, mask, budget)
+    if plan.estimate > budget:
+        fixed = plan.estimate - plan.parts["preprocess"] - plan.parts["fit"] + _FIT_OVERHEAD
+        per_frame = sum(_fit_parts(1, working_pixels, settings, mask).values()) - _FIT_OVERHEAD
+        frames = int(max(0, budget - fixed) // max(per_frame, 1))
+        frames = max(MIN_FIT_FRAMES, min(frames, n_frames - 1))
+        if frames < n_frames:
+            plan.fit_frames = frames
+            plan.parts.update(_fit_parts(frames, working_pixels, settings, mask))
+            plan.notes.append(
+                f"The profiles are fitted on {frames} evenly spaced of {n_frames} frames (frame subsampling)."
+            )
+    return plan
+
+
+def _out_of_core(plan: MemoryPlan):
+    plan.out_of_core = True
+    plan.parts["output"] = 0
+    plan.notes.append("The corrected stack is written to a temporary file on disk (out-of-core output).")
+
+
+def _chunked(plan: MemoryPlan, n_frames, frame_pixels, mask, budget):
+    room = budget - (plan.estimate - plan.parts["correct"])
+    plan.chunk_frames = _chunk_frames(n_frames, frame_pixels, room)
+    plan.parts.update(_correct_parts(n_frames, frame_pixels, True, mask, plan.chunk_frames))
+    plan.notes.append(f"The timelapse correction runs on batches of {plan.chunk_frames} frames (chunked transform).")
+
+
+def fit_frame_indices(n_frames: int, fit_frames: Optional[int]):
+    """Frames a subsampled fit uses: an evenly strided slice (a view of in-memory data), or all."""
+    if not fit_frames or fit_frames >= n_frames:
+        return slice(None)
+    return slice(None, None, int(np.ceil(n_frames / fit_frames)))
+
+
+def correct_chunked(
+    correct: Callable[[np.ndarray, Optional[np.ndarray]], np.ndarray],
+    data,
+    out: np.ndarray,
+    chunk_frames: int,
+    fitting_weight=None,
+    stitch: bool = True,
+) -> Iterator[int]:
+    """Correct ``(T, Y, X)`` `data` batch by batch into `out`; yields the frames done.
+
+    ``correct(frames, weight)`` gets each batch with the matching slice of `fitting_weight` (or None).
+    With `stitch`, consecutive batches overlap by one frame and each batch is offset so that the shared
+    frame matches, as BaSiC does between its own chunks: a timelapse baseline then stays continuous.
+    """
+    n_frames = data.shape[0]
+    start = 0
+    while start < n_frames:
+        first = max(0, start - 1) if stitch else start
+        stop = min(first + chunk_frames, n_frames)
+        if stop <= start:
+            stop = min(start + chunk_frames, n_frames)
+        weight = None if fitting_weight is None else np.asarray(fitting_weight[first:stop])
+        corrected = np.asarray(correct(np.asarray(data[first:stop]), weight), dtype=np.float32)
+        if stitch and first < start:
+            corrected += float(np.mean(out[first] - corrected[0]))
+        out[start:stop] = corrected[start - first :]
+        start = stop
+        yield stop
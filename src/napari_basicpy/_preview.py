@@ -0,0 +1,97 @@
+"""Preview fits: a fit on a heavily reduced copy of the input, for interactive tuning.
+
+A full fit works on every frame at BaSiC's working size (128 px by default). The flatfield is smooth,
+so its overall shape already shows on far fewer pixels and frames: `PreviewFit` keeps a copy of the
+selected stack reduced to at most `max_frames` evenly spaced frames of `size` x `size` pixels, fits on
+that in well under a second, and upsamples the profiles to the full frame size for display. The
+reduced copy is kept until the input changes, so changing a setting and previewing again only costs
+the fit. The full fit (Run) then uses the same settings.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from contextlib import nullcontext
+from typing import Optional, Tuple
+
+import numpy as np
+
+from ._fit_cache import FitCache, _to_numpy, fit_working_stack
+from .utils import _upsample_profile
+
+logger = logging.getLogger(__name__)
+
+
+class PreviewFit:
+    """Reduced copy of the last previewed stack and the fit on it.
+
+    Parameters
+    ----------
+    size : int
+        Side of the reduced frames, in pixels.
+    max_frames : int
+        Maximum number of frames kept, evenly spaced over the stack.
+    """
+
+    def __init__(self, size: int = 32, max_frames: int = 24):
+        if size < 8 or max_frames < 2:
+            raise ValueError("size must be at least 8 and max_frames at least 2")
+        self.size = int(size)
+        self.max_frames = int(max_frames)
+        self._key = None
+        self._images: Optional[np.ndarray] = None
+        self._weight: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Drop the reduced copy, e.g. because another layer was selected."""
+        with self._lock:
+            self._key = self._images = self._weight = None
+
+    @property
+    def cached(self) -> bool:
+        return self._images is not None
+
+    def frame_indices(self, n_frames: int) -> np.ndarray:
+        return np.unique(np.linspace(0, n_frames - 1, min(n_frames, self.max_frames)).round().astype(int))
+
+    def stack(self, settings: dict, data, fitting_weight=None, report=None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Reduced ``(t, size, size)`` stack and mask of `data`, computed once per input."""
+        key = FitCache._key(data, fitting_weight, {"resize_params": settings.get("resize_params")})
+        with self._lock:
+            if key != self._key:
+                from basicpy import BaSiC
+
+                idx = self.frame_indices(data.shape[0])
+                basic = BaSiC(**{**settings, "working_size": self.size})
+                if basic.device == "none":
+                    # resolved the way BaSiC.fit does it; resizing happens before any fit
+                    import torch
+
+                    basic.device = "cuda" if torch.cuda.is_available() else "cpu"
+                stage = report.stage("preprocess", frames=len(idx)) if report is not None else nullcontext()
+                with stage:
+                    frames = np.asarray(data[idx], dtype=np.float32)
+                    self._images = _to_numpy(basic._resize_to_working_size(frames[:, None]))[:, 0]
+                    self._weight = None
+                    if fitting_weight is not None:
+                        w = np.asarray(fitting_weight)[idx]
+                        w = basic._resize_to_working_size(w[:, None], "nearest")
+                        self._weight = (_to_numpy(w)[:, 0] > 0).astype(np.float32)
+                self._key = key
+                logger.info(f"Preview input: {len(idx)} of {data.shape[0]} frames at {self.size} px")
+            return self._images, self._weight
+
+    def fit(self, settings: dict, data, fitting_weight=None, report=None) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Fit on the reduced stack; returns full-size flatfield and darkfield (None without get_darkfield)."""
+        images, weight = self.stack(settings, data, fitting_weight, report)
+        stage = report.stage("fit", frames=len(images)) if report is not None else nullcontext()
+        with stage:
+            basic = fit_working_stack(settings, images, weight)
+        shape = data.shape[-2:]
+        flatfield = _upsample_profile(np.asarray(basic.flatfield, dtype=np.float32), shape)
+        darkfield = None
+        if settings.get("get_darkfield"):
+            darkfield = _upsample_profile(np.asarray(basic.darkfield, dtype=np.float32), shape)
+        return flatfield, darkfield
@@ -0,0 +1,81 @@
+"""Fit on a region of interest and embed the profiles back into the full frame.
+
+Cameras with a dead border and sub-array acquisitions only carry shading information in part of the
+sensor. `roi_bounds` turns the shapes of a napari Shapes layer into the bounding ``(y, x)`` slices of
+the frame, `crop_frames` takes that region of every frame as a view (numpy, memory maps) or a lazy
+slice (dask, Zarr), so only the region is ever read, and `embed_profile` places a fitted profile back
+into full-frame coordinates, filling the rest of the frame according to `FILLS`:
+
+- ``"edge"``: repeat the profile's border values outwards (nearest-edge extrapolation).
+- ``"neutral"``: no correction outside the ROI (flatfield 1, darkfield 0).
+- ``"nan"``: NaN, so corrected pixels outside the ROI are visibly undefined.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FILLS = ("edge", "neutral", "nan")
+
+Bounds = Tuple[slice, slice]
+
+
+def roi_bounds(shapes: Sequence[np.ndarray], frame_shape, min_size: int = 8) -> Bounds:
+    """Bounding ``(y, x)`` slices of all `shapes` (vertex arrays; the last two columns are y, x), clipped to the frame.
+
+    Raises ``ValueError`` if there are no shapes or the region is smaller than `min_size` pixels on a side.
+    """
+    H, W = (int(s) for s in frame_shape[-2:])
+    vertices = [np.asarray(v, dtype=np.float64)[:, -2:] for v in shapes if len(v)]
+    if not vertices:
+        raise ValueError("The ROI layer has no shapes.")
+    pts = np.concatenate(vertices)
+    y0, x0 = np.floor(pts.min(axis=0)).astype(int)
+    y1, x1 = np.ceil(pts.max(axis=0)).astype(int) + 1
+    y0, y1 = max(y0, 0), min(y1, H)
+    x0, x1 = max(x0, 0), min(x1, W)
+    if y1 - y0 < min_size or x1 - x0 < min_size:
+        raise ValueError(f"The ROI covers {max(y1 - y0, 0)} x {max(x1 - x0, 0)} pixels of the frame; need {min_size}+")
+    return slice(y0, y1), slice(x0, x1)
+
+
+def crop_frames(data, bounds: Optional[Bounds]):
+    """The ROI of every frame of ``(..., Y, X)`` `data`, without reading or copying (None: all of `data`)."""
+    if bounds is None or data is None:
+        return data
+    return data[(Ellipsis, *bounds)]
+
+
+def embed_profile(profile, bounds: Bounds, frame_shape, fill: str = "edge", neutral: float = 1.0) -> np.ndarray:
+    """Place a profile fitted on the ROI `bounds` into a full ``frame_shape[-2:]`` frame.
+
+    Parameters
+    ----------
+    fill : str
+        How the frame outside the ROI is filled, one of `FILLS`.
+    neutral : float
+        Value of the ``"neutral"`` fill: 1 for flatfields, 0 for darkfields.
+    """
+    if fill not in FILLS:
+        raise ValueError(f"Unknown ROI fill {fill!r}; expected one of {FILLS}")
+    profile = np.asarray(profile, dtype=np.float32)
+    H, W = (int(s) for s in frame_shape[-2:])
+    ys, xs = bounds
+    if fill == "edge":
+        return np.pad(profile, ((ys.start, H - ys.stop), (xs.start, W - xs.stop)), mode="edge")
+    out = np.full((H, W), neutral if fill == "neutral" else np.nan, dtype=np.float32)
+    out[ys, xs] = profile
+    return out
+
+
+def bounds_to_dict(bounds: Optional[Bounds]) -> Optional[dict]:
+    """JSON form of `bounds` for run reports."""
+    if bounds is None:
+        return None
+    ys, xs = bounds
+    return {"y": [ys.start, ys.stop], "x": [xs.start, xs.stop]}
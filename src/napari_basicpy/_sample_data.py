@@ -34,6 +34,18 @@ def make_sample_data_random() -> List[napari.types.LayerData]:
     return [(images, {"name": "Random"}, "image")]
 
 
+def make_sample_data_synthetic() -> List[napari.types.LayerData]:
+    """Shaded stack with drifting baseline; the true flatfield and darkfield come as hidden layers."""
+    from ._synthetic import make_synthetic
+
+    data = make_synthetic(n_frames=32, shape=(512, 512), dtype="uint16")
+    return [
+        (data.images, {"name": "Synthetic"}, "image"),
+        (data.flatfield, {"name": "true flatfield", "visible": False}, "image"),
+        (data.darkfield, {"name": "true darkfield", "visible": False}, "image"),
+    ]
+
+
 def make_sample_data_cell_culture() -> List[napari.types.LayerData]:
     data = basicpy.datasets.cell_culture()
     return [(data, {"name": "Cell Culture"}, "image")]
@@ -0,0 +1,202 @@
+"""Pre-fit screening: leave blank, saturated and out-of-focus frames out of the fit.
+
+One streaming pass over the stack (batches read and reduced on a thread pool, so lazy stacks are never
+fully loaded) collects three cheap statistics per frame:
+
+- ``mean``: mean intensity. Blank frames (shutter closed, empty wells) and flashes sit far from the rest.
+- ``saturation``: fraction of pixels at the stack's maximum value (or at `saturation_value`); clipped
+  pixels pile up there, while in an unclipped stack only a few pixels reach it.
+- ``focus``: variance of the Laplacian of a block-averaged copy, divided by the squared mean; blurred
+  frames lose the mid-frequency detail it measures.
+
+Frames whose log-mean or log-focus lies more than `z` robust standard deviations (median/MAD) from the
+median, or whose saturated fraction exceeds `max_saturation`, are rejected. The result is an index
+list; the fit selects those frames from the working-size stack instead of copying the input.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from ._metrics import _block_mean
+
+logger = logging.getLogger(__name__)
+
+STATS = ("mean", "saturation", "focus")
+REASONS = ("blank", "bright", "saturated", "out of focus")
+
+
+def frame_stats(stack, size: int = 256) -> Dict[str, np.ndarray]:
+    """Per-frame mean, maximum, number of pixels at the maximum and focus of a ``(B, Y, X)`` stack."""
+    stack = np.asarray(stack)
+    if stack.ndim == 2:
+        stack = stack[None]
+    flat = stack.reshape(len(stack), -1)
+    peak = flat.max(axis=1)
+    at_peak = (flat == peak[:, None]).sum(axis=1)
+    mean = flat.mean(axis=1, dtype=np.float64)
+
+    small = _block_mean(stack.astype(np.float32, copy=False), size)
+    lap = (
+        -4 * small[:, 1:-1, 1:-1]
+        + small[:, :-2, 1:-1]
+        + small[:, 2:, 1:-1]
+        + small[:, 1:-1, :-2]
+        + small[:, 1:-1, 2:]
+    )
+    eps = np.finfo(np.float32).tiny
+    focus = lap.reshape(len(stack), -1).var(axis=1, dtype=np.float64) / np.maximum(mean**2, eps)
+    return {"mean": mean, "max": peak.astype(np.float64), "at_max": at_peak, "focus": focus}
+
+
+def _robust_z(values: np.ndarray, floor: float) -> np.ndarray:
+    med = np.median(values)
+    scale = max(1.4826 * float(np.median(np.abs(values - med))), floor)
+    return (values - med) / scale
+
+
+@dataclass
+class ScreenResult:
+    """Frames kept for the fit, rejected frames with their reasons, and the per-frame statistics."""
+
+    n_frames: int
+    keep: np.ndarray
+    rejected: Dict[int, List[str]] = field(default_factory=dict)
+    stats: Dict[str, np.ndarray] = field(default_factory=dict)
+    settings: dict = field(default_factory=dict)
+    note: str = ""
+
+    @property
+    def n_rejected(self) -> int:
+        return len(self.rejected)
+
+    def counts(self) -> Dict[str, int]:
+        out = dict.fromkeys(REASONS, 0)
+        for reasons in self.rejected.values():
+            for r in reasons:
+                out[r] += 1
+        return {k: v for k, v in out.items() if v}
+
+    def text(self) -> str:
+        if not self.rejected:
+            return f"Frame screening: all {self.n_frames} frames kept" + (f" ({self.note})" if self.note else "")
+        reasons = ", ".join(f"{n} {r}" for r, n in self.counts().items())
+        listed = ", ".join(str(i) for i in list(self.rejected)[:20]) + (", ..." if self.n_rejected > 20 else "")
+        return (
+            f"Frame screening: {self.n_rejected} of {self.n_frames} frames left out of the fit ({reasons}): {listed}"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "n_frames": self.n_frames,
+            "n_kept": int(len(self.keep)),
+            "rejected": {str(i): r for i, r in self.rejected.items()},
+            "counts": self.counts(),
+            "settings": self.settings,
+            "note": self.note,
+        }
+
+
+def screen_frames(
+    data,
+    z: float = 4.0,
+    max_saturation: float = 0.01,
+    saturation_value: Optional[float] = None,
+    min_keep: float = 0.5,
+    batch_frames: int = 32,
+    max_workers: Optional[int] = None,
+    report=None,
+) -> ScreenResult:
+    """Screen the frames of a ``(T, Y, X)`` stack (numpy, dask or Zarr) for the fit.
+
+    Parameters
+    ----------
+    z : float
+        Robust z-score beyond which a frame's log-mean (either side) or log-focus (low side) is an outlier.
+    max_saturation : float
+        Largest accepted fraction of saturated pixels.
+    saturation_value : float, optional
+        Saturation level; by default the maximum of the whole stack.
+    min_keep : float
+        If screening would keep fewer than this fraction of the frames, the "outliers" are not rare and
+        nothing is rejected.
+    batch_frames, max_workers : int
+        Frames per batch and reader threads.
+    report : RunReport, optional
+        Receives a ``screen`` stage.
+    """
+    n = int(data.shape[0])
+    max_workers = max_workers or min(4, os.cpu_count() or 1)
+    settings = {"z": z, "max_saturation": max_saturation, "saturation_value": saturation_value, "min_keep": min_keep}
+    parts: Dict[int, Dict[str, np.ndarray]] = {}
+    at_level: Dict[int, np.ndarray] = {}
+
+    def _task(start):
+        batch = np.asarray(data[start : start + batch_frames])
+        stats = frame_stats(batch)
+        count = None
+        if saturation_value is not None:
+            count = (batch.reshape(len(batch), -1) >= saturation_value).sum(axis=1)
+        return start, stats, count
+
+    stage = report.stage("screen", frames=n) if report is not None else nullcontext()
+    with stage, ThreadPoolExecutor(max_workers=max_workers) as ex:
+        pending = set()
+
+        def collect(done):
+            for fut in done:
+                start, stats, count = fut.result()
+                parts[start] = stats
+                if count is not None:
+                    at_level[start] = count
+
+        for start in range(0, n, batch_frames):
+            pending.add(ex.submit(_task, start))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        collect(wait(pending).done)
+
+    starts = sorted(parts)
+    stats = {k: np.concatenate([parts[s][k] for s in starts]) for k in parts[starts[0]]}
+    n_pixels = int(np.prod(data.shape[1:]))
+    if saturation_value is None:
+        top = stats["max"].max()
+        saturation = np.where(stats["max"] >= top, stats["at_max"] / n_pixels, 0.0)
+    else:
+        saturation = np.concatenate([at_level[s] for s in starts]) / n_pixels
+    out_stats = {"mean": stats["mean"], "saturation": saturation, "focus": stats["focus"]}
+
+    tiny = np.finfo(np.float64).tiny
+    mean_z = _robust_z(np.log(np.maximum(stats["mean"], tiny)), floor=0.05)
+    focus_z = _robust_z(np.log(np.maximum(stats["focus"], tiny)), floor=0.05)
+    rejected: Dict[int, List[str]] = {}
+    for i in range(n):
+        reasons = []
+        if mean_z[i] < -z or stats["mean"][i] <= 0:
+            reasons.append("blank")
+        elif mean_z[i] > z:
+            reasons.append("bright")
+        if saturation[i] > max_saturation:
+            reasons.append("saturated")
+        if focus_z[i] < -z and "blank" not in reasons:
+            reasons.append("out of focus")
+        if reasons:
+            rejected[i] = reasons
+
+    note = ""
+    if n - len(rejected) < max(2, int(np.ceil(min_keep * n))):
+        note = f"{len(rejected)} outliers are too many to be outliers; all frames kept"
+        logger.warning(f"Frame screening: {note}")
+        rejected = {}
+    keep = np.array([i for i in range(n) if i not in rejected], dtype=np.intp)
+    result = ScreenResult(n, keep, rejected, out_stats, settings, note)
+    logger.info(result.text())
+    return result
@@ -0,0 +1,955 @@
+"""Discovery, header probing and frame-level streaming for image sequences stored as folders of TIFF files.
+
+A sequence is a list of files, each holding one or more series (OME/ImageJ/shaped TIFF), each series
+holding one or more 2D frames. Sequence mode treats every frame as an independent image: frames are read
+page by page, corrected in batches that may span files, and written back with the source file's
+series/page layout, so peak memory is bounded by the batch rather than by the file size. Outputs keep the
+source's compression, strip/tile layout, resolution, description (ImageJ/OME/shaped) and other
+descriptive tags, and are compressed on a thread pool.
+"""
+
+from __future__ import annotations
+
+import fnmatch
+import io
+import logging
+import os
+import queue
+import re
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_INDEX_CACHE: Dict[tuple, "SequenceIndex"] = {}
+_PROBE_CACHE: Dict[str, Tuple[int, int, "FileInfo"]] = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def natural_key(s: str):
+    """Sort key that orders ``img2.tif`` before ``img10.tif``."""
+    return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", s)]
+
+
+def parse_filter_text(s: str) -> list[str]:
+    if s is None:
+        return []
+    s = s.replace(", ", ",")
+    tokens = [t.strip() for t in s.split(",") if t.strip()]
+    return tokens
+
+
+def parse_routes(s: str) -> List[Tuple[str, str]]:
+    """Parse ``pattern=model`` pairs separated by commas, semicolons or newlines.
+
+    E.g. ``"w1DAPI=dapi.npz, w2GFP=gfp.npz"``; see `route_of` for how patterns match.
+    """
+    routes = []
+    for item in re.split(r"[,;\n]", s or ""):
+        if not item.strip():
+            continue
+        pattern, sep, model = item.partition("=")
+        if not sep or not pattern.strip() or not model.strip():
+            raise ValueError(f"Route {item.strip()!r} is not of the form pattern=model")
+        routes.append((pattern.strip(), model.strip()))
+    return routes
+
+
+def route_of(name: str, routes: List[Tuple[str, str]]) -> Optional[str]:
+    """Model of the first route matching file name `name`, or None.
+
+    Patterns with glob wildcards (``*?[``) must match the whole name; others are substrings, like
+    filter tokens.
+    """
+    for pattern, model in routes:
+        if any(c in pattern for c in "*?["):
+            if fnmatch.fnmatch(name, pattern):
+                return model
+        elif pattern in name:
+            return model
+    return None
+
+
+def route_files(index: "SequenceIndex", routes: List[Tuple[str, str]]) -> Dict[str, Optional[str]]:
+    """Model name (None if no route matches) of every file of `index`, matched on its relative path."""
+    return {f.path: route_of(os.path.relpath(f.path, index.folder), routes) for f in index.files}
+
+
+def routed_index(
+    index: "SequenceIndex", routes: List[Tuple[str, str]]
+) -> Tuple["SequenceIndex", Dict[str, str], List[str]]:
+    """Split `index` by `routes`: the index of the routed files, their models, and the unrouted paths.
+
+    Unrouted files (readable or not) are left out of the returned index, so `SequenceIndex.check_homogeneous`
+    only has to hold for the files that are actually corrected.
+    """
+    file_routes = route_files(index, routes)
+    routed = {path: model for path, model in file_routes.items() if model is not None}
+    errors = {
+        path: msg
+        for path, msg in index.errors.items()
+        if route_of(os.path.relpath(path, index.folder), routes) is not None
+    }
+    files = [f for f in index.files if f.path in routed]
+    unrouted = [path for path, model in file_routes.items() if model is None]
+    return replace(index, files=files, errors=errors, signature=()), routed, unrouted
+
+
+@dataclass(frozen=True)
+class SeriesInfo:
+    shape: Tuple[int, ...]
+    dtype: str
+    axes: str = ""
+
+    @property
+    def n_frames(self) -> int:
+        return int(np.prod(self.shape[:-2], dtype=np.int64))
+
+
+@dataclass(frozen=True)
+class FileInfo:
+    """Header information of a single TIFF file, read without decoding pixels."""
+
+    path: str
+    shape: Tuple[int, ...]
+    dtype: str
+    n_pages: int
+    series: Tuple[SeriesInfo, ...] = ()
+
+    @property
+    def frame_shape(self) -> Tuple[int, ...]:
+        return tuple(self.shape[-2:])
+
+    @property
+    def n_frames(self) -> int:
+        if not self.series:
+            return int(np.prod(self.shape[:-2], dtype=np.int64))
+        return sum(s.n_frames for s in self.series)
+
+    @property
+    def frame_nbytes(self) -> int:
+        return int(np.prod(self.frame_shape)) * np.dtype(self.dtype).itemsize
+
+    @property
+    def nbytes(self) -> int:
+        return int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """One 2D frame of a sequence: page `index` (flattened over leading axes) of `series` in `path`."""
+
+    path: str
+    series: int
+    index: int
+
+
+@dataclass
+class SequenceIndex:
+    """Sorted, filtered and header-probed listing of a sequence folder."""
+
+    folder: str
+    files: List[FileInfo] = field(default_factory=list)
+    errors: Dict[str, str] = field(default_factory=dict)
+    signature: tuple = field(default=(), repr=False)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def paths(self) -> list[str]:
+        return [f.path for f in self.files]
+
+    @property
+    def layouts(self) -> Dict[Tuple[Tuple[int, ...], str], int]:
+        """Number of files for each distinct ``(shape, dtype)``."""
+        out: Dict[Tuple[Tuple[int, ...], str], int] = {}
+        for f in self.files:
+            key = (f.shape, f.dtype)
+            out[key] = out.get(key, 0) + 1
+        return out
+
+    @property
+    def frame_layouts(self) -> Dict[Tuple[Tuple[int, ...], str], int]:
+        """Number of frames for each distinct ``(frame_shape, dtype)`` over all files and series."""
+        out: Dict[Tuple[Tuple[int, ...], str], int] = {}
+        for f in self.files:
+            for si in f.series or (SeriesInfo(f.shape, f.dtype),):
+                key = (tuple(si.shape[-2:]), si.dtype)
+                out[key] = out.get(key, 0) + si.n_frames
+        return out
+
+    @property
+    def n_frames(self) -> int:
+        return sum(f.n_frames for f in self.files)
+
+    @property
+    def frame_shape(self) -> Optional[Tuple[int, ...]]:
+        return self.files[0].frame_shape if self.files else None
+
+    def frames(self) -> Iterator[FrameRef]:
+        """Enumerate every 2D frame in file, series, page order."""
+        for f in self.files:
+            for s, si in enumerate(f.series or (SeriesInfo(f.shape, f.dtype),)):
+                for k in range(si.n_frames):
+                    yield FrameRef(f.path, s, k)
+
+    @property
+    def is_homogeneous(self) -> bool:
+        return not self.errors and len(self.frame_layouts) <= 1
+
+    @property
+    def shape(self) -> Optional[Tuple[int, ...]]:
+        return self.files[0].shape if self.files else None
+
+    @property
+    def dtype(self) -> Optional[str]:
+        return self.files[0].dtype if self.files else None
+
+    def check_homogeneous(self):
+        """Raise ``ValueError`` unless every file is readable and all frames share shape and dtype.
+
+        Files may hold different numbers of pages or series; only the 2D frames must agree.
+        """
+        if self.errors:
+            path, msg = next(iter(self.errors.items()))
+            raise ValueError(
+                f"{len(self.errors)} file(s) in {self.folder} could not be read as TIFF, "
+                f"e.g. {os.path.basename(path)}: {msg}"
+            )
+        layouts = self.frame_layouts
+        if len(layouts) > 1:
+            summary = ", ".join(
+                f"{n} frames of {shape} {dtype}"
+                for (shape, dtype), n in sorted(layouts.items(), key=lambda kv: -kv[1])
+            )
+            first = {}
+            for f in self.files:
+                for si in f.series or (SeriesInfo(f.shape, f.dtype),):
+                    first.setdefault((tuple(si.shape[-2:]), si.dtype), os.path.basename(f.path))
+            examples = ", ".join(f"{v} {k[0]}" for k, v in first.items())
+            raise ValueError(f"Files in this sequence have different shapes/dtypes: {summary} (e.g. {examples})")
+
+    def summary(self) -> str:
+        if not self.files:
+            return "no matched files"
+        parts = [f"{n} x {shape} {dtype}" for (shape, dtype), n in self.layouts.items()]
+        if self.n_frames != len(self.files):
+            parts.append(f"{self.n_frames} frames")
+        if self.errors:
+            parts.append(f"{len(self.errors)} unreadable")
+        return ", ".join(parts)
+
+
+def _name_matches(name: str, tokens, pattern: Optional[str], regex) -> bool:
+    for t in tokens or []:
+        if t and t not in name:
+            return False
+    if regex is not None:
+        return regex.search(name) is not None
+    if pattern:
+        return fnmatch.fnmatch(name, pattern)
+    return True
+
+
+def _walk(folder: str, recursive: bool):
+    """Yield file names relative to `folder`."""
+    stack = [""]
+    while stack:
+        rel = stack.pop()
+        with os.scandir(os.path.join(folder, rel) if rel else folder) as it:
+            for e in it:
+                name = os.path.join(rel, e.name) if rel else e.name
+                if e.is_dir():
+                    if recursive:
+                        stack.append(name)
+                elif e.is_file():
+                    yield name
+
+
+def _folder_signature(folder: str, recursive: bool) -> tuple:
+    """Cheap change detector: directory mtimes change whenever entries are added, removed or renamed."""
+    sig = [(folder, os.stat(folder).st_mtime_ns)]
+    if recursive:
+        for root, dirs, _ in os.walk(folder):
+            for d in dirs:
+                p = os.path.join(root, d)
+                sig.append((p, os.stat(p).st_mtime_ns))
+    return tuple(sig)
+
+
+def list_sequence_files(
+    folder: str,
+    tokens: Optional[list[str]] = None,
+    pattern: Optional[str] = None,
+    use_regex: bool = False,
+    recursive: bool = False,
+) -> list[str]:
+    """List files in `folder` matching all filter tokens and an optional glob/regex, naturally sorted.
+
+    Parameters
+    ----------
+    folder : str
+        Source folder.
+    tokens : list of str, optional
+        Substrings that must all appear in the file name.
+    pattern : str, optional
+        Glob (default) or regular expression matched against the file name.
+    use_regex : bool
+        Interpret `pattern` as a regular expression.
+    recursive : bool
+        Descend into subfolders; matching is done on the path relative to `folder`.
+
+    Returns
+    -------
+    list of str
+        Absolute file paths.
+    """
+    regex = re.compile(pattern) if (use_regex and pattern) else None
+    names = [name for name in _walk(folder, recursive) if _name_matches(name, tokens, pattern, regex)]
+    names.sort(key=natural_key)
+    return [os.path.join(folder, n) for n in names]
+
+
+def probe_tiff(path: str) -> FileInfo:
+    """Read shape, dtype and page count from the TIFF header without decoding any pixel data."""
+    import tifffile
+
+    with tifffile.TiffFile(path) as tf:
+        series = tuple(
+            SeriesInfo(tuple(int(n) for n in s.shape), np.dtype(s.dtype).str, s.axes) for s in tf.series
+        )
+        return FileInfo(
+            path=path,
+            shape=series[0].shape,
+            dtype=series[0].dtype,
+            n_pages=len(tf.pages),
+            series=series,
+        )
+
+
+def _probe_cached(path: str) -> FileInfo:
+    st = os.stat(path)
+    with _CACHE_LOCK:
+        hit = _PROBE_CACHE.get(path)
+    if hit is not None and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+        return hit[2]
+    info = probe_tiff(path)
+    with _CACHE_LOCK:
+        _PROBE_CACHE[path] = (st.st_size, st.st_mtime_ns, info)
+    return info
+
+
+def index_sequence(
+    folder: str,
+    tokens: Optional[list[str]] = None,
+    pattern: Optional[str] = None,
+    use_regex: bool = False,
+    recursive: bool = False,
+    max_workers: Optional[int] = None,
+    refresh: bool = False,
+) -> SequenceIndex:
+    """Build (or reuse) the index of a sequence folder.
+
+    Listing is cached per folder and filter and invalidated when a directory mtime changes. Header
+    probes are cached per file and invalidated when its size or mtime changes, so re-indexing an
+    unchanged folder only costs a ``stat`` per file.
+
+    Parameters
+    ----------
+    folder : str
+        Source folder.
+    tokens, pattern, use_regex, recursive
+        Filters, see `list_sequence_files`.
+    max_workers : int, optional
+        Threads used for header probing. Defaults to ``min(32, cpu_count + 4)``.
+    refresh : bool
+        Ignore any cached listing.
+
+    Returns
+    -------
+    SequenceIndex
+    """
+    folder = os.path.abspath(folder)
+    key = (folder, tuple(tokens or ()), pattern or "", bool(use_regex), bool(recursive))
+    sig = _folder_signature(folder, recursive)
+
+    with _CACHE_LOCK:
+        cached = _INDEX_CACHE.get(key)
+    if cached is not None and not refresh and cached.signature == sig:
+        paths = cached.paths + list(cached.errors)
+    else:
+        paths = list_sequence_files(folder, tokens, pattern, use_regex, recursive)
+
+    def _probe(p):
+        try:
+            return _probe_cached(p), None
+        except Exception as e:  # not a TIFF, truncated, permission denied, ...
+            return None, f"{type(e).__name__}: {e}"
+
+    index = SequenceIndex(folder=folder, signature=sig)
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        for p, (info, err) in zip(paths, ex.map(_probe, paths)):
+            if info is not None:
+                index.files.append(info)
+            else:
+                index.errors[p] = err
+    index.files.sort(key=lambda f: natural_key(os.path.relpath(f.path, folder)))
+
+    with _CACHE_LOCK:
+        _INDEX_CACHE[key] = index
+    logger.info("Indexed %s: %s", folder, index.summary())
+    return index
+
+
+class FrameReader:
+    """Read single frames from TIFF files, keeping the current file open.
+
+    Frames are read through the series' page list when every page has its own IFD, and through a
+    read-only memory map for contiguous files that store many frames behind one IFD (ImageJ hyperstacks).
+    Only when neither applies is the whole series decoded once and kept until the next file.
+    """
+
+    def __init__(self):
+        self._path = None
+        self._tf = None
+        self._series_cache: Dict[int, np.ndarray] = {}
+
+    def _open(self, path: str):
+        if path != self._path:
+            import tifffile
+
+            self.close()
+            self._tf = tifffile.TiffFile(path)
+            self._path = path
+        return self._tf
+
+    def read(self, ref: FrameRef) -> np.ndarray:
+        tf = self._open(ref.path)
+        series = tf.series[ref.series]
+        n_frames = int(np.prod(series.shape[:-2], dtype=np.int64))
+        if len(series.pages) == n_frames and series.pages[ref.index] is not None:
+            return series.pages[ref.index].asarray()
+        frames = self._series_cache.get(ref.series)
+        if frames is None:
+            if series.dataoffset is not None:
+                import tifffile
+
+                frames = tifffile.memmap(ref.path, series=ref.series, mode="r")
+            else:
+                logger.warning("Decoding whole series %d of %s to access single frames", ref.series, ref.path)
+                frames = series.asarray()
+            frames = frames.reshape(-1, *series.shape[-2:])
+            self._series_cache[ref.series] = frames
+        return np.asarray(frames[ref.index])
+
+    def close(self):
+        self._series_cache = {}
+        if self._tf is not None:
+            self._tf.close()
+        self._tf = None
+        self._path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_frame_batches(
+    index: SequenceIndex,
+    batch_size: int,
+    reader: Optional[FrameReader] = None,
+    routes: Optional[Dict[str, Optional[str]]] = None,
+) -> Iterator[Tuple[List[FrameRef], np.ndarray]]:
+    """Yield ``(refs, stack)`` with at most `batch_size` frames stacked along axis 0.
+
+    Batches may span file boundaries, so single-page folders and large multi-page stacks are both
+    processed with the same bounded memory footprint. With `routes` (path -> model, see `route_files`)
+    the folder is still read once in order, but one batch is filled per model, so every batch holds
+    frames of a single model; files routed to None are skipped.
+    """
+    own = reader is None
+    reader = reader or FrameReader()
+    try:
+        pending: Dict[Optional[str], Tuple[List[FrameRef], List[np.ndarray]]] = {}
+        for ref in index.frames():
+            key = None if routes is None else routes.get(ref.path)
+            if routes is not None and key is None:
+                continue
+            refs, frames = pending.setdefault(key, ([], []))
+            refs.append(ref)
+            frames.append(reader.read(ref))
+            if len(refs) == batch_size:
+                del pending[key]
+                yield refs, np.stack(frames, axis=0)
+        for refs, frames in pending.values():
+            yield refs, np.stack(frames, axis=0)
+    finally:
+        if own:
+            reader.close()
+
+
+def batched(iterable, n: int, key: Optional[Callable] = None):
+    """Split `iterable` into lists of at most `n` items; with `key`, one list per ``key(item)`` (None skipped)."""
+    pending: dict = {}
+    for item in iterable:
+        k = None if key is None else key(item)
+        if key is not None and k is None:
+            continue
+        batch = pending.setdefault(k, [])
+        batch.append(item)
+        if len(batch) == n:
+            yield pending.pop(k)
+    yield from pending.values()
+
+
+def scan_frames(
+    index: SequenceIndex,
+    fn: Callable[[np.ndarray, List[FrameRef]], None],
+    batch_size: int,
+    max_workers: Optional[int] = None,
+    routes: Optional[Dict[str, Optional[str]]] = None,
+) -> Iterator[int]:
+    """Read all frames in batches and call ``fn(stack, refs)`` on each, in parallel; yield frames finished.
+
+    Used for read-only passes over a folder (e.g. collecting the value range of corrected frames).
+    Batches complete out of order, and at most ``2 * max_workers`` batches are in flight at once.
+    With `routes`, batches are split per model exactly as in `iter_frame_batches`.
+    """
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+    local = threading.local()
+    readers: List[FrameReader] = []
+
+    def _task(refs):
+        reader = getattr(local, "reader", None)
+        if reader is None:
+            reader = local.reader = FrameReader()
+            readers.append(reader)
+        fn(np.stack([reader.read(r) for r in refs], axis=0), refs)
+        return len(refs)
+
+    key = None if routes is None else (lambda ref: routes.get(ref.path))
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            pending = set()
+            for refs in batched(index.frames(), batch_size, key):
+                pending.add(ex.submit(_task, refs))
+                if len(pending) >= 2 * max_workers:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        yield fut.result()
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    yield fut.result()
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+# descriptive tags copied as they are; tags tifffile writes itself (layout, compression, resolution,
+# description, software, datetime) are passed as write arguments instead
+_COPY_TAGS = {269, 285, 315, 316, 33432}  # DocumentName, PageName, Artist, HostComputer, Copyright
+# private tags hold offsets into the source file or describe its pixel layout; copies would be invalid
+_POINTER_TAGS = {330, 400, 34665, 34853, 40965, 50838}  # SubIFDs, ..., Exif/GPS/Interop IFDs, IJ byte counts
+# tag types whose decoded values tifffile can write back unchanged (no RATIONAL pairs)
+_COPY_TYPES = {1, 2, 3, 4, 6, 7, 8, 9, 11, 12, 16, 17}
+_LOSSLESS = {"ADOBE_DEFLATE", "DEFLATE", "LZW", "LZMA", "ZSTD", "PACKBITS", "LERC", "LZ4"}
+_OME_TYPES = {
+    "uint8": "uint8",
+    "int8": "int8",
+    "uint16": "uint16",
+    "int16": "int16",
+    "uint32": "uint32",
+    "int32": "int32",
+    "float32": "float",
+    "float64": "double",
+}
+
+
+@lru_cache(maxsize=None)
+def _encodable(compression: Optional[str], predictor: bool, dtype: str) -> bool:
+    # codecs other than zlib/lzma need imagecodecs; find out once per combination with a tiny write
+    import tifffile
+
+    try:
+        tifffile.imwrite(io.BytesIO(), np.zeros((8, 8), dtype), compression=compression, predictor=predictor or None)
+    except Exception:
+        return False
+    return True
+
+
+def _compression_options(page, dtype: str) -> dict:
+    name = page.compression.name
+    if name == "NONE":
+        return {}
+    predictor = page.predictor != 1
+    if name not in _LOSSLESS:
+        # lossy codecs (JPEG, WebP, ...) would degrade the corrected values, and most reject float data
+        name, predictor = "ADOBE_DEFLATE", True
+    for compression, pred in ((name, predictor), (name, False), ("ADOBE_DEFLATE", predictor), ("ADOBE_DEFLATE", False)):
+        if _encodable(compression, pred, dtype):
+            if (compression, pred) != (page.compression.name, predictor):
+                logger.debug(f"Writing {compression} (predictor {pred}) instead of {page.compression.name}")
+            return {"compression": compression, "predictor": pred or None}
+    return {}
+
+
+def tiff_write_options(path: str, dtype="float32") -> List[dict]:
+    """``TiffWriter.write`` keyword arguments reproducing the metadata of every series of `path`.
+
+    Keeps the compression (lossless codecs only; lossy ones and codecs that cannot be written here fall
+    back to deflate), predictor, strip or tile layout, resolution, the first page's description (with
+    the OME pixel type updated to `dtype`), software, date and other descriptive and private tags.
+    """
+    import tifffile
+
+    dtype = np.dtype(dtype).name
+    options = []
+    with tifffile.TiffFile(path) as tf:
+        for i, series in enumerate(tf.series):
+            page = series.pages[0] if series.pages else tf.pages[0]
+            page = page.keyframe if hasattr(page, "keyframe") else page
+            opts = {"photometric": "minisblack", **_compression_options(page, dtype)}
+            if page.is_tiled:
+                opts["tile"] = (page.tilelength, page.tilewidth)
+            elif opts.get("compression") and page.rowsperstrip < page.imagelength:
+                opts["rowsperstrip"] = page.rowsperstrip
+            if "XResolution" in page.tags:
+                opts["resolution"] = page.resolution
+                opts["resolutionunit"] = page.resolutionunit
+            description = page.description if (i == 0 or page.description != tf.pages[0].description) else ""
+            if description:
+                if tf.is_ome and dtype in _OME_TYPES:
+                    description = re.sub(
+                        r'(<Pixels\b[^>]*?\bType=")[^"]*(")', rf"\g<1>{_OME_TYPES[dtype]}\g<2>", description
+                    )
+                opts["description"] = description
+                opts["metadata"] = None
+            else:
+                opts["metadata"] = {"axes": series.axes} if series.axes else {}
+            if page.software:
+                opts["software"] = page.software
+            if page.datetime is not None:
+                opts["datetime"] = page.datetime
+            extratags = []
+            for tag in page.tags.values():
+                copy = tag.code in _COPY_TAGS or (tag.code >= 32768 and tag.code not in _POINTER_TAGS)
+                if copy and int(tag.dtype) in _COPY_TYPES:
+                    extratags.append((tag.code, int(tag.dtype), tag.count, tag.value, True))
+            if extratags:
+                opts["extratags"] = extratags
+            options.append(opts)
+    return options
+
+
+def _write_tiff(out_fp: str, frame: np.ndarray, source: Optional[str]):
+    import tifffile
+
+    options = tiff_write_options(source, frame.dtype)[0] if source else {}
+    tifffile.imwrite(out_fp, frame, **options)
+
+
+class _StreamedTiff:
+    """Write the series of one output file from frames pushed one at a time.
+
+    tifffile pulls pages from an iterator, so the writer runs on its own thread and is fed through a
+    small bounded queue; at most ``maxsize`` frames of this file are ever held in memory. With
+    `copy_metadata`, each series is written with the options `tiff_write_options` reads from the source.
+    """
+
+    def __init__(self, path: str, info: FileInfo, dtype, maxsize: int = 8, copy_metadata: bool = True):
+        self.path = path
+        self.info = info
+        self.dtype = np.dtype(dtype)
+        self.copy_metadata = copy_metadata
+        self.remaining = info.n_frames
+        self._queue: "queue.Queue" = queue.Queue(maxsize=maxsize)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name=f"basicpy-write-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def _pages(self, n):
+        for _ in range(n):
+            frame = self._queue.get()
+            if frame is None:
+                raise RuntimeError("output stream closed early")
+            yield frame
+
+    def _run(self):
+        import tifffile
+
+        try:
+            nbytes = self.info.n_frames * int(np.prod(self.info.frame_shape)) * self.dtype.itemsize
+            options = tiff_write_options(self.info.path, self.dtype) if self.copy_metadata else []
+            with tifffile.TiffWriter(self.path, bigtiff=nbytes > 2**32 - 2**25) as tw:
+                for i, si in enumerate(self.info.series):
+                    opts = options[i] if i < len(options) else {"metadata": {"axes": si.axes} if si.axes else {}}
+                    tw.write(self._pages(si.n_frames), shape=si.shape, dtype=self.dtype, **opts)
+        except BaseException as e:  # surfaced to the producer on the next push/close
+            self._error = e
+            # unblock a producer waiting on a full queue
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def push(self, frame: np.ndarray):
+        while True:
+            if self._error is not None:
+                raise self._error
+            try:
+                self._queue.put(frame, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        self.remaining -= 1
+
+    def close(self):
+        incomplete = self.remaining > 0
+        if incomplete and self._thread.is_alive():
+            self._queue.put(None)
+        self._thread.join()
+        if incomplete:
+            # cancelled run: leave the partial file, but don't mask the reason we stopped
+            logger.warning("Output %s is incomplete (%d frame(s) missing)", self.path, self.remaining)
+        elif self._error is not None:
+            raise self._error
+
+
+class SequenceWriter:
+    """Write corrected frames back to per-file outputs with the same series/page layout as the source.
+
+    Frames must be pushed in `SequenceIndex.frames` order. Single-frame files are compressed and written
+    on a pool of `max_workers` threads (at most twice that many frames wait for it); multi-frame files
+    are streamed page by page on their own threads and closed as soon as their last frame arrives.
+    With `copy_metadata`, outputs keep the source's compression, resolution, description and tags (see
+    `tiff_write_options`).
+    """
+
+    def __init__(
+        self,
+        index: SequenceIndex,
+        out_path: Callable[[str], str],
+        max_workers: Optional[int] = None,
+        copy_metadata: bool = True,
+    ):
+        self._infos = {f.path: f for f in index.files}
+        self._out_path = out_path
+        self._open: Dict[str, _StreamedTiff] = {}
+        self.max_workers = max_workers or min(4, os.cpu_count() or 1)
+        self.copy_metadata = copy_metadata
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: set = set()
+
+    def _submit(self, out_fp: str, frame: np.ndarray, source: str):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="basicpy-write")
+        while len(self._pending) >= 2 * self.max_workers:
+            self._reap(wait(self._pending, return_when=FIRST_COMPLETED).done)
+        self._pending.add(self._executor.submit(_write_tiff, out_fp, frame, source if self.copy_metadata else None))
+
+    def _reap(self, done):
+        self._pending -= done
+        for fut in done:
+            fut.result()
+
+    def write(self, ref: FrameRef, frame: np.ndarray):
+        info = self._infos[ref.path]
+        out_fp = self._out_path(ref.path)
+        if info.n_frames == 1:
+            os.makedirs(os.path.dirname(out_fp) or ".", exist_ok=True)
+            self._submit(out_fp, frame, ref.path)
+            return
+        stream = self._open.get(ref.path)
+        if stream is None:
+            os.makedirs(os.path.dirname(out_fp) or ".", exist_ok=True)
+            stream = self._open[ref.path] = _StreamedTiff(
+                out_fp, info, frame.dtype, copy_metadata=self.copy_metadata
+            )
+        stream.push(frame)
+        if stream.remaining == 0:
+            del self._open[ref.path]
+            stream.close()
+
+    def write_batch(self, refs: List[FrameRef], frames: np.ndarray):
+        for ref, frame in zip(refs, frames):
+            self.write(ref, frame)
+
+    def close(self):
+        streams, self._open = list(self._open.values()), {}
+        try:
+            if self._pending:
+                self._reap(wait(self._pending).done)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            for stream in streams:
+                stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def ref_labels(folder: str, refs: List[FrameRef]) -> List[dict]:
+    """Table labels of sequence frames: file relative to `folder`, series and page."""
+    return [{"file": os.path.relpath(r.path, folder), "series": r.series, "page": r.index} for r in refs]
+
+
+def estimate_batch_size(file_info: FileInfo, target_gb: float = 0.5, hard_cap: int = 64) -> int:
+    """Frames per batch so that a batch stays around `target_gb`, from the header only."""
+    # per 2D frame: input bytes plus the float32 copy made by the transform
+    bytes_per = file_info.frame_nbytes + int(np.prod(file_info.frame_shape)) * 4
+    if bytes_per <= 0:
+        return 16
+    bs = max(1, int((target_gb * (1024**3)) // bytes_per))
+    return min(bs, hard_cap)
+
+
+@contextmanager
+def frame_corrector(flatfield, darkfield=None, is_timelapse: bool = False, basic_settings: Optional[dict] = None):
+    """Yield ``correct(stack)`` mapping a ``(B, Y, X)`` batch to its corrected float32 batch.
+
+    Without a timelapse baseline the model is applied directly (`ApplyEngine`); otherwise every batch goes
+    through ``BaSiC.transform``, which estimates the baseline per batch.
+    """
+    if not is_timelapse:
+        from ._apply import ApplyEngine
+
+        with ApplyEngine(flatfield, darkfield) as engine:
+            yield engine
+        return
+
+    from basicpy import BaSiC
+
+    basic = BaSiC(**(basic_settings or {}))
+    basic.darkfield = np.zeros_like(flatfield) if darkfield is None else np.asarray(darkfield)
+    basic.flatfield = np.asarray(flatfield)
+
+    def correct(stack):
+        corr = np.asarray(basic.transform(stack, is_timelapse=True, fitting_weight=None, use_tqdm=False))
+        return corr[None] if corr.ndim == 2 else corr
+
+    yield correct
+
+
+def correct_sequence(
+    index: SequenceIndex,
+    out_path: Callable[[str], str],
+    correct,
+    batch_size: int,
+    save_dtype: str = "float32",
+    save_mode: Optional[str] = None,
+    report=None,
+    metrics=None,
+    preview=None,
+    routes: Optional[Dict[str, Optional[str]]] = None,
+) -> Iterator[Tuple[int, int]]:
+    """Correct every frame of `index` and write it to ``out_path(source_path)``; yield ``(done, total)``.
+
+    Integer outputs need the value range of the corrected frames first, so they take two passes over
+    the folder (the first one read and corrected in parallel); float32 output takes one. A
+    `MetricsRecorder` passed as `metrics` gets every frame before and after correction, and a
+    `FrameRing` passed as `preview` every corrected batch, as it is computed.
+
+    `correct` maps a ``(B, Y, X)`` batch to its corrected batch. For multi-channel folders, pass
+    `routes` (path -> model name, see `route_files`) and a dict of model name -> ``correct``: every
+    file goes to its model in the same pass, batches are kept per model, and integer outputs are
+    scaled per model. Files routed to None are skipped.
+    """
+    from .utils import SCALING_MODES, _cast_to_range, _StreamingRange
+
+    save_mode = save_mode or SCALING_MODES[0]
+    stage = report.stage if report is not None else (lambda *args, **kwargs: nullcontext())
+    if routes is None:
+        correctors = {None: correct}
+        counts = {None: index.n_frames}
+    else:
+        correctors = correct
+        counts = {}
+        for f in index.files:
+            if routes.get(f.path) is not None:
+                counts[routes[f.path]] = counts.get(routes[f.path], 0) + f.n_frames
+        missing = set(counts) - set(correctors)
+        if missing:
+            raise ValueError(f"No model for route(s) {', '.join(sorted(missing))}")
+
+    def model_of(refs):
+        return None if routes is None else routes[refs[0].path]
+
+    n_frames = sum(counts.values())
+    two_pass = save_dtype != "float32"
+    total = n_frames * (2 if two_pass else 1)
+    done = 0
+
+    value_ranges = dict.fromkeys(counts)
+    if two_pass:
+        # pass 1: global range of the *corrected* values; same batch partition as pass 2, so timelapse
+        # baselines come out identical
+        accs = {key: _StreamingRange(n_batches=-(-n // batch_size)) for key, n in counts.items()}
+
+        def scan(stack, refs):
+            # the read happens in scan_frames' threads; its bytes are credited here
+            with stage("scan (correct + range)", read=stack.nbytes, frames=len(stack)):
+                corr = correctors[model_of(refs)](stack)
+                accs[model_of(refs)].update(corr)
+                if preview is not None:
+                    preview.push(corr)
+
+        for n in scan_frames(index, scan, batch_size, routes=routes):
+            done += n
+            yield (done, total)
+        for key, acc in accs.items():
+            value_ranges[key] = acc.value_range(save_dtype, save_mode)
+            name = "Sequence" if key is None else key
+            logger.info(f"{name} output range {acc.min}..{acc.max}, mapped from {value_ranges[key]}")
+
+    with SequenceWriter(index, out_path) as writer:
+        batches = iter_frame_batches(index, batch_size, routes=routes)
+        if report is not None:
+            batches = report.timed_iter(
+                batches, "read", nbytes=lambda item: item[1].nbytes, frames=lambda item: len(item[0])
+            )
+        for refs, stack in batches:
+            # pass 2 casts every batch with the same global range
+            with stage("correct", frames=len(refs)):
+                corr = correctors[model_of(refs)](stack)
+            if preview is not None:
+                preview.push(corr)
+            if metrics is not None:
+                with stage("metrics", frames=len(refs)):
+                    metrics.update(ref_labels(index.folder, refs), corr, raw=stack)
+            with stage("cast", frames=len(refs)):
+                corr = _cast_to_range(corr, save_dtype, value_ranges[model_of(refs)])
+            # multi-page files are reassembled with the source page layout
+            with stage("write", written=corr.nbytes, frames=len(refs)):
+                writer.write_batch(refs, corr)
+            del stack, corr
+
+            if report is not None:
+                report.count_frames(len(refs))
+            done += len(refs)
+            yield (done, total)
+        # multi-page outputs are written by background threads; wait for them here
+        with stage("write"):
+            writer.close()
+
+
+def clear_cache():
+    """Drop all cached listings and header probes."""
+    with _CACHE_LOCK:
+        _INDEX_CACHE.clear()
+        _PROBE_CACHE.clear()
@@ -0,0 +1,254 @@
+"""Smoothness sweeps: fit a grid of smoothness values on one shared working-size stack.
+
+Picking `smoothness_flatfield` (and `smoothness_darkfield`) by hand means one full fit per guess.
+`smoothness_sweep` resizes the stack and the mask to BaSiC's working size once (through `FitCache`,
+so a later Run with one of the swept settings is immediate), fits every candidate on it from a thread
+pool and scores each one with the cost BaSiC's autotune minimises: the entropy of the corrected
+working-size stack plus a penalty on the flatfield's high-frequency content. Lower is better.
+
+Unlike autotune, which fixes the histogram range from an initial fit, the sweep fixes it from the
+uncorrected stack, so that all candidates are scored on the same range without an extra fit.
+"""
+
+from __future__ import annotations
+
+import csv
+import itertools
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ._fit_cache import FitCache, fit_working_stack
+from .utils import _upsample_profile
+
+logger = logging.getLogger(__name__)
+
+# BaSiC.autotune's defaults for the cost; the widget passes the values from "Autotune settings"
+COST_DEFAULTS = {
+    "histogram_qmin": 0.01,
+    "histogram_qmax": 0.99,
+    "vmin_factor": 0.6,
+    "vrange_factor": 1.5,
+    "histogram_bins": 1000,
+    "histogram_use_fitting_weight": True,
+    "fourier_l0_norm_image_threshold": 0.1,
+    "fourier_l0_norm_fourier_radius": 10,
+    "fourier_l0_norm_threshold": 0.0,
+    "fourier_l0_norm_cost_coef": 30,
+}
+
+# sample of the stack used for the histogram range
+_RANGE_SAMPLE = 1 << 20
+
+
+def parse_grid(text: str) -> List[float]:
+    """Smoothness values from text.
+
+    ``"0.5, 1, 2"`` lists values; ``"0.1:10:5"`` gives 5 log-spaced values from 0.1 to 10 (smoothness
+    acts on a log scale). Duplicates are dropped and the result is sorted.
+    """
+    text = (text or "").strip()
+    if not text:
+        return []
+    if ":" in text:
+        parts = text.split(":")
+        if len(parts) != 3:
+            raise ValueError(f"Expected start:stop:count, got {text!r}")
+        start, stop, n = float(parts[0]), float(parts[1]), int(parts[2])
+        if start <= 0 or stop <= 0 or n < 1:
+            raise ValueError("start and stop must be positive and count at least 1")
+        values = np.geomspace(start, stop, n)
+    else:
+        values = [float(t) for t in text.replace(";", ",").split(",") if t.strip()]
+    if any(v < 0 for v in values):
+        raise ValueError("Smoothness values must not be negative")
+    return sorted({float(f"{v:.6g}") for v in values})
+
+
+@dataclass
+class SweepResult:
+    """Fitted profiles and scores of every candidate, in grid order.
+
+    Attributes
+    ----------
+    rows : list of dict
+        Per candidate: ``smoothness_flatfield``, ``smoothness_darkfield``, ``cost``, ``entropy``,
+        ``fourier_l0``, ``converged`` and ``seconds``.
+    flatfields : np.ndarray
+        ``(N, Y, X)`` full-size flatfields.
+    darkfields : np.ndarray or None
+        ``(N, Y, X)`` full-size darkfields, when ``get_darkfield`` is set.
+    """
+
+    rows: List[dict]
+    flatfields: np.ndarray
+    darkfields: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def best(self) -> int:
+        """Index of the lowest-cost candidate that converged (of any, if none did)."""
+        costs = [(not r["converged"], r["cost"]) for r in self.rows]
+        return min(range(len(costs)), key=costs.__getitem__)
+
+    def settings(self, i: int) -> dict:
+        row = self.rows[i]
+        return {k: row[k] for k in ("smoothness_flatfield", "smoothness_darkfield") if row[k] is not None}
+
+    def to_csv(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(self.rows[0]))
+            writer.writeheader()
+            writer.writerows(self.rows)
+        return path
+
+
+def _histogram_range(images: np.ndarray, cost: dict) -> float:
+    # the same width autotune derives from its initial fit, here from the uncorrected stack
+    flat = images.reshape(-1)
+    sample = flat[:: max(1, flat.size // _RANGE_SAMPLE)]
+    vmin, vmax = np.quantile(sample, [cost["histogram_qmin"], cost["histogram_qmax"]])
+    return float((vmax - vmin * cost["vmin_factor"]) * cost["vrange_factor"])
+
+
+def _score(basic, images, weight, is_timelapse, val_range, cost) -> dict:
+    from basicpy.metrics_numpy import autotune_cost_numpy, entropy, fourier_L0_norm
+
+    flatfield = np.asarray(basic.flatfield, dtype=np.float32)
+    if is_timelapse:
+        corrected = np.asarray(basic.transform(images, fitting_weight=weight, is_timelapse=True, use_tqdm=False))
+    else:
+        corrected = (images - np.asarray(basic.darkfield, dtype=np.float32)) / flatfield
+    flat = corrected.reshape(-1)
+    vmin = float(np.quantile(flat[:: max(1, flat.size // _RANGE_SAMPLE)], cost["histogram_qmin"]))
+    vmin *= cost["vmin_factor"]
+    weights = weight if (weight is not None and cost["histogram_use_fitting_weight"]) else None
+    kwargs = dict(
+        entropy_vmin=vmin,
+        entropy_vmax=vmin + val_range,
+        histogram_bins=int(cost["histogram_bins"]),
+        fourier_l0_norm_image_threshold=cost["fourier_l0_norm_image_threshold"],
+        fourier_l0_norm_fourier_radius=cost["fourier_l0_norm_fourier_radius"],
+        fourier_l0_norm_threshold=cost["fourier_l0_norm_threshold"],
+        fourier_l0_norm_cost_coef=cost["fourier_l0_norm_cost_coef"],
+        weights=weights,
+    )
+    converged = bool(getattr(basic, "_converge_flag", True)) and np.isfinite(corrected).all()
+    if not converged or np.allclose(flatfield, 1):
+        # autotune discards these as well
+        value = float("inf")
+    else:
+        value = float(autotune_cost_numpy(corrected, flatfield, **kwargs))
+    return {
+        "cost": value,
+        "entropy": float(entropy(corrected, vmin, vmin + val_range, int(cost["histogram_bins"]), weights)),
+        "fourier_l0": float(
+            fourier_L0_norm(flatfield, cost["fourier_l0_norm_image_threshold"], cost["fourier_l0_norm_fourier_radius"])
+        ),
+        "converged": converged,
+    }
+
+
+def smoothness_sweep(
+    settings: dict,
+    data,
+    flatfield_values: Sequence[float],
+    darkfield_values: Optional[Sequence[float]] = None,
+    fitting_weight=None,
+    is_timelapse: bool = False,
+    cost: Optional[dict] = None,
+    fit_cache: Optional[FitCache] = None,
+    max_workers: Optional[int] = None,
+    report=None,
+) -> Iterator[Tuple[int, int]]:
+    """Fit every smoothness combination on a shared working-size stack; yield ``(done, total)``.
+
+    Parameters
+    ----------
+    settings : dict
+        ``BaSiC`` keyword arguments shared by all candidates.
+    data : array-like
+        ``(T, Y, X)`` stack.
+    flatfield_values : sequence of float
+        Values of ``smoothness_flatfield`` to try.
+    darkfield_values : sequence of float, optional
+        Values of ``smoothness_darkfield`` to try with each flatfield value (with ``get_darkfield``);
+        by default the one in `settings` (or BaSiC's default).
+    fitting_weight : np.ndarray, optional
+        Segmentation mask, as for ``BaSiC.fit``.
+    is_timelapse : bool
+        Score the candidates on timelapse-corrected stacks, as autotune does.
+    cost : dict, optional
+        Cost parameters, see `COST_DEFAULTS`.
+    fit_cache : FitCache, optional
+        Cache providing the working-size stack; the fitted candidates are remembered in it.
+    max_workers : int, optional
+        Candidates fitted at the same time.
+    report : RunReport, optional
+        Receives ``preprocess`` and ``sweep`` stages.
+
+    Returns
+    -------
+    SweepResult
+    """
+    if not flatfield_values:
+        raise ValueError("No smoothness values to sweep")
+    cost = {**COST_DEFAULTS, **(cost or {})}
+    dark = list(darkfield_values or []) if settings.get("get_darkfield") else []
+    grid = [
+        {"smoothness_flatfield": f, **({"smoothness_darkfield": d} if d is not None else {})}
+        for f, d in itertools.product(flatfield_values, dark or [None])
+    ]
+    total = len(grid)
+    yield (0, total)
+
+    fit_cache = fit_cache if fit_cache is not None else FitCache()
+    images, weight = fit_cache.working_stack(settings, data, fitting_weight, report)
+    val_range = _histogram_range(images, cost)
+    shape = data.shape[-2:]
+
+    def run(candidate):
+        t0 = time.perf_counter()
+        cand_settings = {**settings, **candidate}
+        basic = fit_working_stack(cand_settings, images, weight)
+        row = {
+            "smoothness_flatfield": float(basic.smoothness_flatfield),
+            "smoothness_darkfield": float(basic.smoothness_darkfield) if settings.get("get_darkfield") else None,
+            **_score(basic, images, weight, is_timelapse, val_range, cost),
+        }
+        basic.flatfield = _upsample_profile(basic.flatfield, shape)
+        basic.darkfield = _upsample_profile(basic.darkfield, shape)
+        fit_cache.remember(cand_settings, basic)
+        row["seconds"] = round(time.perf_counter() - t0, 3)
+        return row, basic
+
+    max_workers = max_workers or min(4, total, os.cpu_count() or 1)
+    results: List[Optional[tuple]] = [None] * total
+    stage = report.stage("sweep", frames=data.shape[0] * total) if report is not None else nullcontext()
+    with stage, ThreadPoolExecutor(max_workers=max_workers) as ex:
+        futures = {ex.submit(run, candidate): i for i, candidate in enumerate(grid)}
+        for done, fut in enumerate(as_completed(futures), 1):
+            results[futures[fut]] = fut.result()
+            yield (done, total)
+
+    rows = [row for row, _ in results]
+    flatfields = np.stack([np.asarray(b.flatfield, dtype=np.float32) for _, b in results])
+    darkfields = None
+    if settings.get("get_darkfield"):
+        darkfields = np.stack([np.asarray(b.darkfield, dtype=np.float32) for _, b in results])
+    result = SweepResult(rows, flatfields, darkfields)
+    best = result.rows[result.best]
+    logger.info(
+        f"Sweep of {total} candidates: best smoothness_flatfield={best['smoothness_flatfield']} "
+        f"(cost {best['cost']:.4g})"
+    )
+    return result
@@ -0,0 +1,314 @@
+"""Synthetic shading datasets with known ground truth, at any size.
+
+Frames follow the BaSiC image model::
+
+    image[t] = (baseline[t] + signal[t]) * flatfield + darkfield + noise
+
+`signal` is a sparse field of bright objects on a textured background. Every frame is generated from
+its own seed, so a frame can be produced on its own (lazily, in any order, in parallel) and is the same
+whether it comes from an in-memory stack, a dask array, a folder of TIFFs or a Zarr store.
+
+Example
+-------
+>>> from napari_basicpy._synthetic import make_synthetic
+>>> data = make_synthetic(n_frames=64, shape=(1024, 1024), dtype="uint16", lazy=True)
+>>> data.images  # doctest: +SKIP
+dask.array<synthetic, shape=(64, 1024, 1024), dtype=uint16, chunksize=(1, 1024, 1024), chunktype=numpy.ndarray>
+>>> data.flatfield.mean()  # doctest: +SKIP
+1.0
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+from dataclasses import asdict, dataclass
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# default mean intensity for each dtype: well inside the range, so shading never clips
+_DEFAULT_INTENSITY = {"uint8": 80.0, "uint16": 12000.0}
+
+
+@dataclass(frozen=True)
+class SyntheticSpec:
+    """Parameters of a synthetic dataset.
+
+    Attributes
+    ----------
+    n_frames : int
+        Number of frames.
+    shape : tuple of int
+        Frame shape ``(Y, X)``.
+    dtype : str
+        ``"uint8"``, ``"uint16"`` or ``"float32"``. Integer frames are rounded and clipped.
+    intensity : float, optional
+        Background level of the unshaded frames; objects reach a few times this. Defaults to a safe
+        level for the dtype (1000 for float32).
+    vignetting : float
+        Relative drop of the flatfield from the centre to the corners (0 gives a flat field).
+    darkfield : float
+        Mean darkfield as a fraction of `intensity` (0 gives no darkfield).
+    baseline_drift : float
+        Relative amplitude of the per-frame baseline drift (0 gives a constant baseline), e.g. bleaching.
+    noise : float
+        Standard deviation of additive Gaussian noise as a fraction of `intensity`.
+    density : float
+        Fraction of pixels covered by bright objects.
+    seed : int
+        Seed for the fields and the frames.
+    """
+
+    n_frames: int = 16
+    shape: Tuple[int, int] = (512, 512)
+    dtype: str = "uint16"
+    intensity: Optional[float] = None
+    vignetting: float = 0.4
+    darkfield: float = 0.05
+    baseline_drift: float = 0.1
+    noise: float = 0.01
+    density: float = 0.05
+    seed: int = 0
+
+    def __post_init__(self):
+        if self.dtype not in ("uint8", "uint16", "float32"):
+            raise ValueError(f"dtype must be uint8, uint16 or float32, got {self.dtype!r}")
+        if len(self.shape) != 2 or min(self.shape) < 2:
+            raise ValueError(f"shape must be (Y, X) with both sides >= 2, got {self.shape}")
+        if self.n_frames < 1:
+            raise ValueError("n_frames must be >= 1")
+        if not 0 <= self.vignetting < 1:
+            raise ValueError("vignetting must be in [0, 1)")
+        object.__setattr__(self, "shape", tuple(int(s) for s in self.shape))
+
+    @property
+    def level(self) -> float:
+        if self.intensity is not None:
+            return float(self.intensity)
+        return _DEFAULT_INTENSITY.get(self.dtype, 1000.0)
+
+
+class SyntheticData(NamedTuple):
+    """A synthetic stack and the fields it was made with.
+
+    `images` is a numpy array, a dask array, or None when the frames were written to disk.
+    """
+
+    images: object
+    flatfield: np.ndarray
+    darkfield: np.ndarray
+    baseline: np.ndarray
+    spec: SyntheticSpec
+
+
+def _flatfield(spec: SyntheticSpec) -> np.ndarray:
+    rng = np.random.default_rng([spec.seed, 0])
+    H, W = spec.shape
+    cy, cx = rng.uniform(-0.1, 0.1, 2)
+    y = np.linspace(-1, 1, H, dtype=np.float32)[:, None] - cy
+    x = np.linspace(-1, 1, W, dtype=np.float32)[None, :] - cx
+    r2 = (y * y + x * x) / 2
+    field = 1 - spec.vignetting * r2
+    return (field / field.mean()).astype(np.float32)
+
+
+def _darkfield(spec: SyntheticSpec) -> np.ndarray:
+    H, W = spec.shape
+    if spec.darkfield <= 0:
+        return np.zeros((H, W), dtype=np.float32)
+    # a gentle diagonal ramp, as from uneven sensor offsets
+    ramp = np.add.outer(np.linspace(0, 1, H, dtype=np.float32), np.linspace(0, 1, W, dtype=np.float32)) / 2
+    return (spec.darkfield * spec.level * (0.8 + 0.4 * ramp)).astype(np.float32)
+
+
+def _baseline(spec: SyntheticSpec) -> np.ndarray:
+    t = np.linspace(0, 1, spec.n_frames, dtype=np.float32)
+    # exponential decay with a small oscillation, normalised to start at 1
+    drift = np.exp(-spec.baseline_drift * 3 * t) * (1 + 0.2 * spec.baseline_drift * np.sin(6 * np.pi * t))
+    return (drift / drift[0]).astype(np.float32)
+
+
+class _Generator:
+    """Makes frame `i` from the spec and the precomputed fields."""
+
+    def __init__(self, spec: SyntheticSpec):
+        self.spec = spec
+        self.flatfield = _flatfield(spec)
+        self.darkfield = _darkfield(spec)
+        self.baseline = _baseline(spec)
+
+    def signal(self, i: int) -> np.ndarray:
+        """Unshaded content of frame `i` on top of the baseline."""
+        spec = self.spec
+        rng = np.random.default_rng([spec.seed, 1, i])
+        H, W = spec.shape
+        level = spec.level
+        # coarse texture, upsampled by repetition: cheap at any frame size
+        coarse = rng.uniform(0.0, 0.3, ((H + 15) // 16, (W + 15) // 16)).astype(np.float32)
+        sig = np.repeat(np.repeat(coarse, 16, axis=0), 16, axis=1)[:H, :W]
+        n_objects = int(spec.density * H * W / 25)
+        if n_objects:
+            ys = rng.integers(0, H - 1, n_objects)
+            xs = rng.integers(0, W - 1, n_objects)
+            amp = rng.uniform(1.0, 3.0, n_objects).astype(np.float32)
+            # 2x2 objects; bright, sparse foreground as in fluorescence tiles
+            for dy in (0, 1):
+                for dx in (0, 1):
+                    np.add.at(sig, (ys + dy, xs + dx), amp)
+        return sig * (level / 2)
+
+    def frame(self, i: int) -> np.ndarray:
+        spec = self.spec
+        level = spec.level
+        img = (self.baseline[i] * level + self.signal(i)) * self.flatfield + self.darkfield
+        if spec.noise > 0:
+            rng = np.random.default_rng([spec.seed, 2, i])
+            img += rng.standard_normal(spec.shape, dtype=np.float32) * (spec.noise * level)
+        if spec.dtype == "float32":
+            return img.astype(np.float32, copy=False)
+        info = np.iinfo(spec.dtype)
+        return np.clip(np.rint(img), info.min, info.max).astype(spec.dtype)
+
+    def frames(self, block_id=None, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        stop = self.spec.n_frames if stop is None else stop
+        if block_id is not None:
+            start = stop = block_id[0]
+            stop += 1
+        return np.stack([self.frame(i) for i in range(start, stop)])
+
+
+def _spec(spec: Optional[SyntheticSpec], kwargs) -> SyntheticSpec:
+    if spec is not None and kwargs:
+        raise TypeError("pass either a SyntheticSpec or keyword arguments, not both")
+    return spec if spec is not None else SyntheticSpec(**kwargs)
+
+
+def make_synthetic(spec: Optional[SyntheticSpec] = None, lazy: bool = False, **kwargs) -> SyntheticData:
+    """Synthesize a shaded stack and return it with the ground-truth fields.
+
+    Parameters
+    ----------
+    spec : SyntheticSpec, optional
+        Dataset parameters; alternatively pass the `SyntheticSpec` fields as keyword arguments.
+    lazy : bool
+        Return a dask array with one chunk per frame instead of computing the stack.
+
+    Returns
+    -------
+    SyntheticData
+        ``images`` of shape ``(n_frames, Y, X)`` plus the flatfield (mean 1), darkfield and baseline.
+    """
+    spec = _spec(spec, kwargs)
+    gen = _Generator(spec)
+    if lazy:
+        import dask.array as da
+        from dask.base import tokenize
+
+        images = da.map_blocks(
+            gen.frames,
+            dtype=spec.dtype,
+            chunks=((1,) * spec.n_frames, (spec.shape[0],), (spec.shape[1],)),
+            name=f"synthetic-{tokenize(asdict(spec))}",
+        )
+    else:
+        images = gen.frames()
+    return SyntheticData(images, gen.flatfield, gen.darkfield, gen.baseline, spec)
+
+
+def write_synthetic_folder(
+    folder: str,
+    spec: Optional[SyntheticSpec] = None,
+    name: str = "frame_{:05d}.tif",
+    truth_path: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    **kwargs,
+) -> SyntheticData:
+    """Write a synthetic dataset as one TIFF per frame, generating frames in parallel.
+
+    Memory use is a few frames regardless of the dataset size.
+
+    Parameters
+    ----------
+    folder : str
+        Output folder; created if needed.
+    spec : SyntheticSpec, optional
+        Dataset parameters, or pass them as keyword arguments.
+    name : str
+        Format string for the file names, given the frame index.
+    truth_path : str, optional
+        Also save the ground truth as ``.npz`` here. Keep it outside `folder` if the folder will be
+        processed as a sequence.
+    max_workers : int, optional
+        Threads generating and writing frames.
+
+    Returns
+    -------
+    SyntheticData
+        Ground truth, with ``images`` set to None.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import tifffile
+
+    spec = _spec(spec, kwargs)
+    gen = _Generator(spec)
+    os.makedirs(folder, exist_ok=True)
+
+    def _write(i):
+        tifffile.imwrite(os.path.join(folder, name.format(i)), gen.frame(i))
+
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, os.cpu_count() or 1)) as pool:
+        for _ in pool.map(_write, range(spec.n_frames)):
+            pass
+    data = SyntheticData(None, gen.flatfield, gen.darkfield, gen.baseline, spec)
+    if truth_path:
+        save_truth(truth_path, data)
+    return data
+
+
+def write_synthetic_zarr(
+    path: str, spec: Optional[SyntheticSpec] = None, chunk_frames: int = 1, **kwargs
+) -> SyntheticData:
+    """Write a synthetic dataset to a Zarr group; requires the optional ``zarr`` package.
+
+    The group holds ``images`` (chunked by `chunk_frames` whole frames) and the ground truth arrays
+    ``flatfield``, ``darkfield`` and ``baseline``; the spec is stored in the group attributes.
+
+    Returns
+    -------
+    SyntheticData
+        Ground truth, with ``images`` set to the Zarr array.
+    """
+    try:
+        import zarr
+    except ImportError as e:
+        raise ImportError("Writing Zarr stores requires the 'zarr' package: pip install zarr") from e
+
+    spec = _spec(spec, kwargs)
+    gen = _Generator(spec)
+    group = zarr.open_group(path, mode="w")
+    H, W = spec.shape
+    images = group.zeros(name="images", shape=(spec.n_frames, H, W), chunks=(chunk_frames, H, W), dtype=spec.dtype)
+    for start in range(0, spec.n_frames, chunk_frames):
+        stop = min(start + chunk_frames, spec.n_frames)
+        images[start:stop] = gen.frames(start=start, stop=stop)
+    group["flatfield"] = gen.flatfield
+    group["darkfield"] = gen.darkfield
+    group["baseline"] = gen.baseline
+    group.attrs["synthetic_spec"] = {k: list(v) if isinstance(v, tuple) else v for k, v in asdict(spec).items()}
+    return SyntheticData(images, gen.flatfield, gen.darkfield, gen.baseline, spec)
+
+
+def save_truth(path: str, data: SyntheticData):
+    """Save the ground-truth fields of `data` as ``.npz``."""
+    np.savez_compressed(
+        path,
+        flatfield=data.flatfield,
+        darkfield=data.darkfield,
+        baseline=data.baseline,
+        **{f"spec_{k}": np.asarray(v) for k, v in asdict(data.spec).items() if v is not None},
+    )
+
@@ -0,0 +1,119 @@
+import sys
+
+import numpy as np
+import pytest
+
+from napari_basicpy import _apply
+from napari_basicpy._apply import ApplyEngine, FrameView, allocate_output, as_frames
+from napari_basicpy._planner import correct_chunked
+
+
+@pytest.fixture
+def profiles():
+    rng = np.random.default_rng(0)
+    flat = rng.uniform(0.5, 1.5, (40, 30)).astype(np.float32)
+    dark = rng.uniform(0, 5, (40, 30)).astype(np.float32)
+    return flat, dark
+
+
+def test_matches_reference(profiles, monkeypatch):
+    flat, dark = profiles
+    images = np.random.default_rng(1).integers(0, 4000, (3, 2, 40, 30)).astype(np.uint16)
+    expected = (images.astype(np.float32) - dark) / flat
+
+    # several chunks per frame, so the threaded path is exercised
+    monkeypatch.setattr(_apply, "_CHUNK_PIXELS", 300)
+    with ApplyEngine(flat, dark, max_workers=4) as engine:
+        out = engine(images)
+    assert out.dtype == np.float32 and out.shape == images.shape
+    np.testing.assert_allclose(out, expected, rtol=1e-5)
+
+    buf = np.empty(images.shape, np.float32)
+    assert ApplyEngine(flat, dark)(images, out=buf) is buf
+    np.testing.assert_allclose(buf, expected, rtol=1e-5)
+
+
+def test_zero_darkfield_is_skipped(profiles):
+    flat, _ = profiles
+    engine = ApplyEngine(flat, np.zeros_like(flat))
+    assert engine.darkfield is None
+    image = np.full((40, 30), 100, np.uint8)
+    np.testing.assert_allclose(engine(image), 100 / flat, rtol=1e-6)
+    with pytest.raises(ValueError, match="do not match"):
+        engine(np.zeros((20, 30)))
+
+
+class _Store:
+    """Array store that only supports item assignment, like Zarr."""
+
+    def __init__(self, shape):
+        self.data = np.zeros(shape, np.float32)
+        self.shape, self.dtype = shape, self.data.dtype
+
+    def __getitem__(self, key):
+        return self.data[key].copy()
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+
+
+def test_output_buffers(profiles, tmp_path):
+    flat, dark = profiles
+    images = np.random.default_rng(1).integers(0, 4000, (2, 3, 40, 30)).astype(np.uint16)
+    expected = ApplyEngine(flat, dark)(images)
+
+    out = allocate_output(images.shape, "memmap", directory=str(tmp_path))
+    assert isinstance(out, np.memmap) and len(list(tmp_path.iterdir())) == 1
+    np.testing.assert_array_equal(ApplyEngine(flat, dark)(images, out=out), expected)
+    del out
+    assert not list(tmp_path.iterdir())  # removed with the array
+
+    store = _Store(images.shape)
+    assert ApplyEngine(flat, dark)(images, out=store) is store
+    np.testing.assert_array_equal(store.data, expected)
+
+    with pytest.raises(ValueError, match="Unknown output"):
+        allocate_output(images.shape, "gpu")
+
+
+def test_zarr_output(profiles, tmp_path, monkeypatch):
+    flat, dark = profiles
+    images = np.random.default_rng(1).integers(0, 4000, (2, 3, 40, 30)).astype(np.uint16)
+    with monkeypatch.context() as m:
+        m.setitem(sys.modules, "zarr", None)
+        with pytest.raises(ImportError, match="zarr"):
+            allocate_output(images.shape, "zarr")
+
+    pytest.importorskip("zarr")
+    out = allocate_output(images.shape, "zarr", directory=str(tmp_path))
+    np.testing.assert_array_equal(ApplyEngine(flat, dark)(images, out=out)[:], ApplyEngine(flat, dark)(images))
+    # 4D timelapse batches go through a frame view of the store
+    out = allocate_output(images.shape, "zarr", directory=str(tmp_path))
+    for _ in correct_chunked(lambda batch, _: batch * 2.0, as_frames(images), as_frames(out), 4):
+        pass
+    np.testing.assert_array_equal(out[:], images * 2.0)
+
+
+def test_frame_view():
+    images = np.arange(2 * 3 * 4 * 5, dtype=np.float32).reshape((2, 3, 4, 5))
+    store = _Store(images.shape)
+    view = as_frames(store)
+    assert isinstance(view, FrameView) and view.shape == (6, 4, 5) and len(view) == 6
+    assert np.shares_memory(as_frames(images), images)  # numpy arrays are reshaped in place
+
+    for _ in correct_chunked(lambda batch, _: batch + 1, as_frames(images), view, 4):
+        pass
+    np.testing.assert_array_equal(store.data, images + 1)
+    np.testing.assert_array_equal(view[4], images[1, 1] + 1)
+    np.testing.assert_array_equal(view[1:4], images.reshape((6, 4, 5))[1:4] + 1)
+
+
+def test_pool_is_shared_across_threads(profiles):
+    from concurrent.futures import ThreadPoolExecutor
+
+    engine = ApplyEngine(*profiles)
+    with ThreadPoolExecutor(8) as callers:
+        pools = set(callers.map(lambda _: id(engine._pool()), range(64)))
+    assert len(pools) == 1
+    engine.close()
+    assert engine._executor is None
@@ -0,0 +1,34 @@
+import json
+
+import pytest
+import torch
+
+from napari_basicpy import BackendConfig
+
+
+@pytest.fixture(autouse=True)
+def config_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("NAPARI_BASICPY_CONFIG_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_persistence(config_home):
+    assert BackendConfig.load() == BackendConfig()
+    path = BackendConfig(device="auto", intra_op_threads=2, blas_threads=3).save()
+    assert json.load(open(path))["intra_op_threads"] == 2
+    assert BackendConfig.load() == BackendConfig(device="auto", intra_op_threads=2, blas_threads=3)
+
+    (config_home / "backend.json").write_text('{"device": "tpu"}')
+    assert BackendConfig.load() == BackendConfig()
+
+
+def test_apply_sets_torch_threads():
+    previous = torch.get_num_threads()
+    try:
+        effective = BackendConfig(device="cuda", intra_op_threads=1).apply()
+        assert effective["intra_op_threads"] == 1
+        assert effective["device"] == ("cuda" if torch.cuda.is_available() else "cpu")
+    finally:
+        torch.set_num_threads(previous)
+    with pytest.raises(ValueError):
+        BackendConfig(blas_threads=-1)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from napari_basicpy._dct_model import DCTModel
+
+
+def _vignette(shape):
+    yy, xx = np.mgrid[: shape[0], : shape[1]]
+    yy = (yy + 0.5) / shape[0] - 0.5
+    xx = (xx + 0.5) / shape[1] - 0.5
+    return (1.2 - 0.8 * (yy**2 + xx**2)).astype(np.float32)
+
+
+def test_roundtrip(tmp_path):
+    flat = _vignette((128, 160))
+    dark = np.full((128, 160), 3.0, np.float32)
+    model = DCTModel.from_fields(flat, dark)
+    assert model.flatfield_coeffs.shape[0] < 64
+
+    path = tmp_path / "model.npz"
+    model.save(path)
+    assert path.stat().st_size < 20_000
+    loaded = DCTModel.load(path)
+    assert loaded.source_shape == (128, 160)
+    np.testing.assert_allclose(loaded.flatfield((128, 160)), flat, rtol=1e-2)
+    np.testing.assert_allclose(loaded.darkfield((128, 160)), dark, atol=1e-3)
+
+
+def test_resolution_independent():
+    model = DCTModel.from_fields(_vignette((128, 160)), np.zeros((128, 160)))
+    assert not model.has_darkfield
+    np.testing.assert_allclose(model.flatfield((64, 80)), _vignette((64, 80)), rtol=1e-2)
+    assert model.flatfield((64, 80)) is model.flatfield((3, 64, 80))
+    assert not model.darkfield((64, 80)).any()
+
+
+def test_load_rejects_other_files(tmp_path):
+    np.savez(tmp_path / "other.npz", a=np.zeros(3))
+    with pytest.raises(ValueError, match="not a BaSiCPy DCT model"):
+        DCTModel.load(tmp_path / "other.npz")
@@ -0,0 +1,63 @@
+import dask.array as da
+import numpy as np
+from basicpy import BaSiC
+
+from napari_basicpy._fit_cache import FitCache
+from napari_basicpy._synthetic import make_synthetic
+
+
+def test_cached_fit_matches_direct_fit():
+    images = make_synthetic(n_frames=12, shape=(96, 80), dtype="float32").images
+    settings = {"get_darkfield": True, "device": "cpu", "working_size": 32}
+
+    direct = BaSiC(**settings)
+    direct.fit(images)
+    cache = FitCache()
+    cached = cache.fit(settings, images)
+
+    assert cached.flatfield.shape == (96, 80)
+    np.testing.assert_allclose(cached.flatfield, direct.flatfield, atol=1e-5)
+    np.testing.assert_allclose(cached.darkfield, direct.darkfield, atol=1e-3)
+    np.testing.assert_allclose(cached.baseline, direct.baseline, rtol=1e-5)
+    assert cached.working_size == 32
+
+
+def test_reuse_and_invalidation():
+    images = make_synthetic(n_frames=8, shape=(64, 64), dtype="float32").images
+    settings = {"device": "cpu", "working_size": 32}
+    cache = FitCache()
+
+    first = cache.fit(settings, images)
+    assert cache.fit(settings, images) is first
+    assert cache.hits == 1
+    # new settings reuse the working-size stack, not the result
+    second = cache.fit({**settings, "smoothness_flatfield": 2.0}, images)
+    assert second is not first and cache.hits == 2
+
+    other = images.copy()
+    other[::2] *= 2
+    assert cache.fit(settings, other) is not first
+    assert cache.hits == 2
+
+
+def test_key_for_rebuilt_views():
+    images = make_synthetic(n_frames=8, shape=(64, 64), dtype="float32").images
+    settings = {"device": "cpu", "working_size": 32}
+    cache = FitCache()
+    roi = (slice(8, 56), slice(4, 60))
+
+    # each run crops a new view of the same layer data; the key makes them one input
+    first = cache.fit(settings, images[(Ellipsis, *roi)], key=(id(images), roi))
+    assert cache.fit(settings, images[(Ellipsis, *roi)], key=(id(images), roi)) is first
+    assert cache.hits == 1
+    other = (slice(0, 48), slice(4, 60))
+    assert cache.fit(settings, images[(Ellipsis, *other)], key=(id(images), other)) is not first
+
+
+def test_lazy_input():
+    images = make_synthetic(n_frames=8, shape=(64, 64), dtype="uint16").images
+    lazy = da.from_array(images, chunks=(1, 64, 64))
+    settings = {"device": "cpu", "working_size": 32}
+    assert FitCache.supports(lazy)
+    basic = FitCache().fit(settings, lazy)
+    assert basic.flatfield.shape == (64, 64)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from napari_basicpy._incremental import IncrementalFit
+from napari_basicpy._synthetic import make_synthetic
+
+
+def test_reservoir_is_bounded():
+    inc = IncrementalFit({"working_size": 16}, capacity=8)
+    frames = np.random.default_rng(0).uniform(100, 200, (20, 32, 32)).astype(np.float32)
+    assert inc.add(frames[:5]) == 5
+    assert inc.add(frames[5:]) == 20
+    assert inc.n_buffered == 8
+    assert inc._reservoir.shape == (8, 16, 16)
+    with pytest.raises(ValueError):
+        inc.add(np.zeros((2, 16, 16)))
+
+
+def test_updates_track_the_true_flatfield():
+    data = make_synthetic(n_frames=48, shape=(96, 96), dtype="float32", baseline_drift=0.0)
+    inc = IncrementalFit({"get_darkfield": False, "working_size": 64}, capacity=32)
+    errors = []
+    for start in range(0, 48, 16):
+        inc.add(data.images[start : start + 16])
+        flatfield, darkfield = inc.update()
+        assert flatfield.shape == (96, 96)
+        assert darkfield is None
+        errors.append(np.abs(flatfield / flatfield.mean() - data.flatfield).mean())
+    assert inc.n_updates == 3
+    assert errors[-1] < 0.05
+
+    inc.reset()
+    assert inc.n_seen == 0
+    with pytest.raises(ValueError):
+        inc.profiles()
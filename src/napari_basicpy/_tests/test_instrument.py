@@ -0,0 +1,100 @@
+import json
+import os
+import threading
+import tracemalloc
+
+import numpy as np
+
+from napari_basicpy._instrument import RunReport, fingerprint_array, fingerprint_files
+
+
+def test_stages_accumulate_across_threads():
+    report = RunReport("sequence")
+
+    def work():
+        for _ in range(10):
+            with report.stage("correct", read=100, written=50, frames=1):
+                pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    report.finish()
+
+    st = report.stages["correct"]
+    assert st["calls"] == 40
+    assert st["frames"] == 40
+    assert report.bytes_read == 4000
+    assert report.bytes_written == 2000
+
+
+def test_timed_iter_counts_bytes():
+    report = RunReport("sequence")
+    frames = [np.zeros((4, 4), dtype=np.uint16) for _ in range(3)]
+    out = list(report.timed_iter(frames, "read", nbytes=lambda a: a.nbytes, frames=lambda a: 1))
+    report.finish()
+    assert len(out) == 3
+    assert report.stages["read"]["bytes"] == 3 * 32
+    assert report.stages["read"]["frames"] == 3
+
+
+def test_status_line_has_eta():
+    report = RunReport("sequence")
+    line = report.status(5, 10)
+    assert "5/10 frames" in line and "ETA" in line
+    assert "ETA" not in report.status(10, 10)
+    report.finish()
+
+
+def test_write_to_folder_file_and_default(tmp_path, monkeypatch):
+    monkeypatch.setenv("NAPARI_BASICPY_CONFIG_DIR", str(tmp_path / "config"))
+    report = RunReport("fit", settings={"get_darkfield": True, "smoothness": np.float32(1.5)})
+    with report.stage("fit", frames=8):
+        pass
+    report.count_frames(8)
+    report.finish(flatfield_shape=(16, 16))
+
+    in_folder = report.write(str(tmp_path))
+    assert os.path.dirname(in_folder) == str(tmp_path)
+    as_file = report.write(str(tmp_path / "report.json"))
+    default = report.write()
+    assert os.path.dirname(default) == os.path.join(str(tmp_path / "config"), "reports")
+
+    for path in (in_folder, as_file, default):
+        with open(path) as f:
+            data = json.load(f)
+        assert data["kind"] == "fit"
+        assert data["status"] == "done"
+        assert data["frames"] == 8
+        assert data["settings"]["smoothness"] == 1.5
+        assert data["outputs"]["flatfield_shape"] == [16, 16]
+        assert "fit" in data["stages"]
+
+
+def test_fingerprints_are_stable(tmp_path):
+    a = np.arange(1000, dtype=np.float32).reshape(10, 100)
+    assert fingerprint_array(a) == fingerprint_array(a.copy())
+    b = a.copy()
+    b[0, 0] = -1
+    assert fingerprint_array(a) != fingerprint_array(b)
+
+    # a view (a ROI crop) hashes like its copy, without being copied whole
+    stack = np.arange(48 * 512 * 512, dtype=np.float32).reshape(48, 512, 512)
+    crop = stack[:, 20:500, 10:490]
+    expected = fingerprint_array(np.ascontiguousarray(crop))
+    tracemalloc.start()
+    assert fingerprint_array(crop) == expected
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert peak < crop.nbytes // 8  # a few MB of gathered samples and indices, not the 44 MB crop
+
+    paths = []
+    for i in range(3):
+        p = tmp_path / f"f{i}.bin"
+        p.write_bytes(b"x" * (i + 1))
+        paths.append(str(p))
+    fp = fingerprint_files(paths)
+    assert fp["n_files"] == 3 and fp["total_bytes"] == 6
+    assert fp == fingerprint_files(paths)
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+import tifffile
+
+from napari_basicpy._jobs import JobQueue, run_job
+from napari_basicpy._synthetic import make_synthetic
+
+
+def _drain(gen):
+    progress = []
+    while True:
+        try:
+            progress.append(next(gen))
+        except StopIteration as stop:
+            return progress, stop.value
+
+
+def test_queue_persists_and_requeues_running_jobs(tmp_path):
+    path = str(tmp_path / "jobs.json")
+    queue = JobQueue(path, max_concurrent=2)
+    a = queue.add("transform", "a", {"layer": "a"}, arrays={"flatfield": np.ones((4, 4)), "darkfield": None})
+    b = queue.add("sequence", "b", {"folder": "in", "out_folder": "out"})
+    c = queue.add("fit", "c", {"layer": "c"})
+    assert a.params["arrays"] == ["flatfield"]
+
+    assert queue.next_ready() is a
+    queue.mark_running(a)
+    assert queue.next_ready() is b
+    queue.mark_running(b)
+    assert queue.next_ready() is None  # two running
+    queue.mark_finished(b, "failed", error="boom")
+
+    # a restart (or crash) while `a` runs: it is queued again, everything else is kept
+    restored = JobQueue(path)
+    assert restored.max_concurrent == 2
+    assert [(j.label, j.status) for j in restored] == [("a", "queued"), ("b", "failed"), ("c", "queued")]
+    assert restored.get(a.id).outputs["interrupted"] == 1
+    np.testing.assert_array_equal(restored.array(restored.get(a.id), "flatfield"), np.ones((4, 4)))
+    assert restored.array(restored.get(a.id), "darkfield") is None
+
+    with pytest.raises(ValueError):
+        restored.retry(c.id)
+    restored.retry(b.id)
+    assert restored.get(b.id).status == "queued"
+    restored.mark_running(restored.get(c.id))
+    with pytest.raises(ValueError):
+        restored.remove(c.id)
+    restored.remove(a.id)
+    assert not (tmp_path / f"{a.id}_flatfield.npy").exists()
+    assert [j.label for j in JobQueue(path)] == ["b", "c"]
+
+
+def test_sequence_and_transform_jobs(tmp_path):
+    data = make_synthetic(n_frames=6, shape=(32, 32), dtype="uint16", noise=0.0)
+    src = tmp_path / "in"
+    src.mkdir()
+    for i, frame in enumerate(data.images):
+        tifffile.imwrite(src / f"f{i}.tif", frame)
+    queue = JobQueue(str(tmp_path / "q" / "jobs.json"))
+    arrays = {"flatfield": data.flatfield, "darkfield": data.darkfield}
+
+    params = {"folder": str(src), "out_folder": str(tmp_path / "out"), "metrics": "csv"}
+    seq = queue.add("sequence", "s", params, arrays=arrays)
+    progress, result = _drain(run_job(seq, queue))
+    assert progress[-1] == (6, 6)
+    assert result.outputs["frames"] == 6
+    assert result.outputs["metrics_file"].startswith(str(tmp_path / "out"))
+    np.testing.assert_allclose(result.outputs["metrics"]["vignetting"]["median"], 1, atol=0.05)
+
+    # a layer job whose layer is not open reads the file it came from
+    tifffile.imwrite(tmp_path / "stack.tif", data.images)
+    tr = queue.add("transform", "t", {"layer": "stack", "source": str(tmp_path / "stack.tif")}, arrays=arrays)
+    _, result = _drain(run_job(tr, queue))
+    corrected = result.layers["corrected"]
+    np.testing.assert_allclose(corrected[2], tifffile.imread(tmp_path / "out" / "f2.tif"), rtol=1e-6)
+
+    missing = queue.add("transform", "m", {"layer": "gone"}, arrays=arrays)
+    with pytest.raises(ValueError, match="not open"):
+        _drain(run_job(missing, queue))
+
+
+def test_sequence_job_routes(tmp_path):
+    src = tmp_path / "in"
+    src.mkdir()
+    for i in range(2):
+        tifffile.imwrite(src / f"s{i}_w1DAPI.tif", np.full((8, 8), 10.0, np.float32))
+        tifffile.imwrite(src / f"s{i}_w2GFP.tif", np.full((8, 8), 10.0, np.float32))
+    # an unrouted file of another shape does not stop the job
+    tifffile.imwrite(src / "s0_w3BF.tif", np.zeros((4, 4), np.float32))
+    queue = JobQueue(str(tmp_path / "q" / "jobs.json"))
+    params = {
+        "folder": str(src),
+        "out_folder": str(tmp_path / "out"),
+        "routes": [["w1DAPI", "dapi"], ["w2GFP", "gfp"]],
+        "route_models": ["dapi", "gfp"],
+    }
+    arrays = {"flatfield_0": np.full((8, 8), 2.0, np.float32), "flatfield_1": np.full((8, 8), 0.5, np.float32)}
+    job = queue.add("sequence", "routed", params, arrays=arrays)
+    progress, result = _drain(run_job(job, queue))
+    assert progress[-1] == (4, 4) and result.outputs["files"] == 4
+    np.testing.assert_allclose(tifffile.imread(tmp_path / "out" / "s1_w1DAPI.tif"), 5.0)
+    np.testing.assert_allclose(tifffile.imread(tmp_path / "out" / "s1_w2GFP.tif"), 20.0)
+    assert not (tmp_path / "out" / "s0_w3BF.tif").exists()
@@ -0,0 +1,64 @@
+import csv
+import sys
+
+import numpy as np
+import pytest
+import tifffile
+
+from napari_basicpy._metrics import MetricsRecorder, frame_metrics, record_stack
+from napari_basicpy._sequence import correct_sequence, frame_corrector, index_sequence
+from napari_basicpy._synthetic import make_synthetic
+
+
+def test_correction_flattens_metrics():
+    data = make_synthetic(n_frames=8, shape=(128, 128), noise=0.0)
+    raw = frame_metrics(data.images)
+    corrected = frame_metrics((data.images - data.darkfield) / data.flatfield)
+
+    assert raw["vignetting"].shape == (8,)
+    assert np.all(raw["vignetting"] < 0.95)
+    np.testing.assert_allclose(corrected["vignetting"], 1, atol=0.05)
+    assert np.all(corrected["low_freq"] < raw["low_freq"])
+    assert np.all(corrected["cv"] < raw["cv"])
+
+    flat = frame_metrics(np.full((64, 64), 5.0))
+    assert flat["cv"][0] == 0 and flat["vignetting"][0] == 1 and flat["low_freq"][0] == 0
+
+
+def test_recorder_streams_sequence_metrics(tmp_path):
+    data = make_synthetic(n_frames=10, shape=(32, 32), dtype="uint16", noise=0.0)
+    src = tmp_path / "in"
+    src.mkdir()
+    for i in range(0, 10, 2):
+        tifffile.imwrite(src / f"f{i}.tif", data.images[i : i + 2])
+    index = index_sequence(str(src))
+
+    path = tmp_path / "out" / "metrics.csv"
+    with frame_corrector(data.flatfield, data.darkfield) as correct, MetricsRecorder(str(path)) as metrics:
+        for _ in correct_sequence(
+            index, lambda p: str(tmp_path / "out" / p.rsplit("/", 1)[-1]), correct, 3, "uint16", metrics=metrics
+        ):
+            pass
+
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == metrics.n_frames == 10
+    assert {(r["file"], r["page"]) for r in rows} == {(f"f{i}.tif", str(p)) for i in range(0, 10, 2) for p in (0, 1)}
+    summary = metrics.summary()
+    assert summary["vignetting"]["median"] > summary["raw_vignetting"]["median"]
+    assert set(summary["cv"]) == {"mean", "p5", "median", "p95"}
+
+
+def test_parquet_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        MetricsRecorder(str(tmp_path / "metrics.parquet"))
+
+
+def test_parquet_output(tmp_path):
+    pytest.importorskip("pyarrow")
+    pd = pytest.importorskip("pandas")
+    path = str(tmp_path / "metrics.parquet")
+    with MetricsRecorder(path) as metrics:
+        record_stack(metrics, np.random.default_rng(0).random((5, 16, 16)), batch_frames=2)
+    assert list(pd.read_parquet(path)["frame"]) == [0, 1, 2, 3, 4]
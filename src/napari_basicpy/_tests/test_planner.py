@@ -0,0 +1,42 @@
+import numpy as np
+
+from napari_basicpy._backend import BackendConfig
+from napari_basicpy._planner import GB, correct_chunked, fit_frame_indices, plan_fit, plan_transform
+
+
+def test_plans_fall_back_in_order():
+    shape = (2000, 1024, 1024)  # 7.8 GB of float32 output
+    assert not plan_transform(shape, budget=64 * GB).fallback
+
+    plan = plan_transform(shape, budget=2 * GB)
+    assert plan.out_of_core and not plan.chunk_frames and not plan.over_budget
+    assert plan.full_estimate > 7 * GB > plan.estimate
+
+    plan = plan_transform(shape, is_timelapse=True, mask=True, budget=4 * GB)
+    assert plan.out_of_core and plan.chunk_frames % 100 == 0 and not plan.over_budget
+
+    settings = {"working_size": 128, "sort_intensity": True}
+    full = plan_fit(shape, settings, budget=None)
+    assert not full.fallback and full.parts["fit"] > full.parts["preprocess"]
+    plan = plan_fit(shape, settings, is_timelapse=True, budget=1 * GB)
+    assert plan.out_of_core and plan.chunk_frames and 16 <= plan.fit_frames < 2000
+    assert not plan.over_budget and "subsampling" in plan.text()
+    assert plan_fit(shape, settings, budget=GB // 10).over_budget  # the fixed cost alone does not fit
+
+    assert fit_frame_indices(2000, plan.fit_frames).step >= 2000 // plan.fit_frames
+    assert fit_frame_indices(10, None) == slice(None)
+    assert BackendConfig(memory_budget_gb=4).memory_budget_gb == 4.0
+
+
+def test_chunked_correction_stitches_batches():
+    rng = np.random.default_rng(0)
+    data = rng.random((23, 8, 8)).astype(np.float32) + np.arange(23, dtype=np.float32)[:, None, None]
+
+    def correct(frames, weight):
+        # a per-batch baseline, as BaSiC's timelapse transform estimates one per call
+        return frames - frames[0].mean()
+
+    out = np.zeros_like(data)
+    done = list(correct_chunked(correct, data, out, chunk_frames=5))
+    assert done[-1] == 23
+    np.testing.assert_allclose(out, correct(data, None), atol=1e-5)
@@ -0,0 +1,22 @@
+import numpy as np
+
+from napari_basicpy._preview import PreviewFit
+from napari_basicpy._synthetic import make_synthetic
+
+
+def test_preview_is_reduced_and_cached():
+    data = make_synthetic(n_frames=40, shape=(96, 80), dtype="uint16", seed=4)
+    preview = PreviewFit(size=16, max_frames=10)
+    images, weight = preview.stack({}, data.images)
+    assert images.shape == (10, 16, 16) and weight is None
+    assert preview.frame_indices(40)[[0, -1]].tolist() == [0, 39]
+
+    flatfield, darkfield = preview.fit({"smoothness_flatfield": 1.0}, data.images)
+    assert flatfield.shape == (96, 80) and darkfield is None
+    assert np.abs(flatfield - data.flatfield).mean() < 0.05
+    # a new setting reuses the reduced stack
+    assert preview.stack({}, data.images)[0] is images
+
+    preview.invalidate()
+    assert not preview.cached
+    assert preview.stack({}, data.images)[0] is not images
@@ -0,0 +1,39 @@
+import dask.array as da
+import numpy as np
+import pytest
+
+from napari_basicpy._roi import crop_frames, embed_profile, roi_bounds
+
+
+def test_bounds_and_lazy_crop():
+    shapes = [np.array([[0, 10.4, 20.2], [0, 40, 50]]), np.array([[15, 12], [60, 35.5]])]
+    bounds = roi_bounds(shapes, (4, 64, 80))
+    assert bounds == (slice(10, 61), slice(12, 51))
+    # clipped to the frame
+    assert roi_bounds([np.array([[-5, -5], [100, 30]])], (64, 80)) == (slice(0, 64), slice(0, 31))
+    with pytest.raises(ValueError, match="no shapes"):
+        roi_bounds([], (64, 80))
+    with pytest.raises(ValueError, match="pixels"):
+        roi_bounds([np.array([[1, 1], [3, 3]])], (64, 80))
+
+    data = np.arange(4 * 64 * 80, dtype=np.float32).reshape(4, 64, 80)
+    crop = crop_frames(data, bounds)
+    assert crop.shape == (4, 51, 39) and np.shares_memory(crop, data)
+    lazy = crop_frames(da.from_array(data, chunks=(1, 32, 40)), bounds)
+    assert lazy.shape == crop.shape and lazy.numblocks == (4, 2, 2)
+    assert crop_frames(data, None) is data
+
+
+def test_embed_fills():
+    bounds = (slice(2, 5), slice(1, 3))
+    profile = np.arange(6, dtype=np.float32).reshape(3, 2) + 1
+    edge = embed_profile(profile, bounds, (8, 6))
+    assert edge.shape == (8, 6)
+    np.testing.assert_array_equal(edge[bounds], profile)
+    np.testing.assert_array_equal(edge[0, :], [1, 1, 2, 2, 2, 2])
+    neutral = embed_profile(profile, bounds, (8, 6), "neutral", neutral=0.0)
+    assert neutral.sum() == profile.sum() and neutral[0, 0] == 0
+    nan = embed_profile(profile, bounds, (8, 6), "nan")
+    assert np.isnan(nan).sum() == 48 - 6
+    with pytest.raises(ValueError, match="fill"):
+        embed_profile(profile, bounds, (8, 6), "zeros")
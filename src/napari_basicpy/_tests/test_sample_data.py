@@ -1,15 +1,17 @@
 """Test sample data."""
 
 def test_data(make_napari_viewer):
-    samples = [
-        "sample_data_random",
-    ]
+    # sample -> number of layers it adds (synthetic data comes with the true flatfield and darkfield)
+    samples = {
+        "sample_data_random": 1,
+        "sample_data_synthetic": 3,
+    }
 
     viewer = make_napari_viewer()
-    for sample in samples:
+    for sample, n_layers in samples.items():
         n = len(viewer.layers)
         viewer.open_sample(
             "napari-basicpy",
             sample,
         )
-        assert len(viewer.layers) == (n + 1)
+        assert len(viewer.layers) == (n + n_layers)
@@ -0,0 +1,50 @@
+import dask.array as da
+import numpy as np
+from scipy.ndimage import gaussian_filter
+
+from napari_basicpy._fit_cache import FitCache
+from napari_basicpy._screen import screen_frames
+from napari_basicpy._synthetic import make_synthetic
+
+
+def _messy_stack():
+    images = make_synthetic(n_frames=40, shape=(96, 96), dtype="uint16", noise=0.01).images.copy()
+    images[5] = images[5] // 50  # shutter closed
+    images[12] = np.minimum(images[12].astype(np.int64) * 8, 65535)  # clipped
+    images[20] = gaussian_filter(images[20].astype(np.float32), 6).astype(np.uint16)  # out of focus
+    return images
+
+
+def test_screening_rejects_outliers():
+    images = _messy_stack()
+    result = screen_frames(images, batch_frames=7, max_workers=2)
+
+    assert result.rejected[5] == ["blank"]
+    assert "saturated" in result.rejected[12]
+    assert result.rejected[20] == ["out of focus"]
+    assert set(result.rejected) == {5, 12, 20}
+    np.testing.assert_array_equal(result.keep, [i for i in range(40) if i not in (5, 12, 20)])
+    assert result.to_dict()["n_kept"] == 37
+    assert "3 of 40 frames" in result.text()
+
+    # lazy input is read batch by batch and screened the same way
+    assert set(screen_frames(da.from_array(images, chunks=(4, 96, 96))).rejected) == {5, 12, 20}
+
+    # a clean stack keeps everything; so does one where too many frames would go
+    assert not screen_frames(np.delete(images, [5, 12, 20], axis=0)).rejected
+    guarded = screen_frames(images, min_keep=0.95)
+    assert not guarded.rejected and len(guarded.keep) == 40 and guarded.note
+
+
+def test_fit_on_screened_indices():
+    images = _messy_stack().astype(np.float32)
+    keep = screen_frames(images).keep
+    settings = {"device": "cpu", "working_size": 32}
+    cache = FitCache()
+
+    screened = cache.fit(settings, images, frames=keep)
+    reference = FitCache().fit(settings, np.ascontiguousarray(images[keep]))
+    np.testing.assert_allclose(screened.flatfield, reference.flatfield, atol=1e-4)
+    # the full stack's working-size copy is reused by the unscreened fit
+    cache.fit(settings, images)
+    assert cache.hits == 1
@@ -0,0 +1,245 @@
+import os
+
+import numpy as np
+import pytest
+import tifffile
+
+from napari_basicpy._live import FrameRing
+from napari_basicpy._sequence import (
+    SequenceWriter,
+    clear_cache,
+    correct_sequence,
+    frame_corrector,
+    index_sequence,
+    iter_frame_batches,
+    list_sequence_files,
+    parse_routes,
+    route_files,
+    routed_index,
+)
+
+
+@pytest.fixture
+def seq_folder(tmp_path):
+    clear_cache()
+    for i in (1, 2, 10):
+        tifffile.imwrite(tmp_path / f"img{i}_w1DAPI.tif", np.full((16, 24), i, np.uint16))
+    tifffile.imwrite(tmp_path / "img3_w2GFP.tif", np.zeros((16, 24), np.uint16))
+    (tmp_path / "sub").mkdir()
+    tifffile.imwrite(tmp_path / "sub" / "img4_w1DAPI.tif", np.zeros((16, 24), np.uint16))
+    (tmp_path / "notes.txt").write_text("not an image")
+    return tmp_path
+
+
+def test_list_filters(seq_folder):
+    names = [os.path.basename(p) for p in list_sequence_files(str(seq_folder), tokens=["w1"])]
+    assert names == ["img1_w1DAPI.tif", "img2_w1DAPI.tif", "img10_w1DAPI.tif"]
+
+    assert len(list_sequence_files(str(seq_folder), pattern="*.tif")) == 4
+    assert len(list_sequence_files(str(seq_folder), pattern="*.tif", recursive=True)) == 5
+    assert len(list_sequence_files(str(seq_folder), pattern=r"img\d_w2", use_regex=True)) == 1
+
+
+def test_index_probes_headers(seq_folder):
+    index = index_sequence(str(seq_folder), pattern="*.tif")
+    assert len(index) == 4
+    assert index.is_homogeneous
+    assert index.shape == (16, 24)
+    assert index.files[0].n_pages == 1
+    index.check_homogeneous()
+
+
+def test_index_cache_invalidation(seq_folder):
+    index = index_sequence(str(seq_folder), tokens=["w1"])
+    assert len(index) == 3
+    tifffile.imwrite(seq_folder / "img11_w1DAPI.tif", np.zeros((16, 24), np.uint16))
+    index = index_sequence(str(seq_folder), tokens=["w1"])
+    assert len(index) == 4
+
+
+def test_heterogeneous_fails_fast(seq_folder):
+    tifffile.imwrite(seq_folder / "img5_w1DAPI.tif", np.zeros((8, 8), np.uint8))
+    index = index_sequence(str(seq_folder), pattern="*.tif")
+    assert not index.is_homogeneous
+    with pytest.raises(ValueError, match="different shapes"):
+        index.check_homogeneous()
+
+    index = index_sequence(str(seq_folder))
+    assert "notes.txt" in "".join(index.errors)
+    with pytest.raises(ValueError, match="could not be read"):
+        index.check_homogeneous()
+
+
+def test_multipage_roundtrip(tmp_path):
+    clear_cache()
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    stack = np.arange(3 * 2 * 8 * 10, dtype=np.uint16).reshape(3, 2, 8, 10)
+    with tifffile.TiffWriter(src / "well1.ome.tif", ome=True) as tw:
+        tw.write(stack, metadata={"axes": "ZCYX"})
+        tw.write(stack[0, 0], metadata={"axes": "YX"})
+    tifffile.imwrite(src / "well2.tif", stack[:, 0], imagej=True, metadata={"axes": "ZYX"})
+
+    index = index_sequence(str(src))
+    index.check_homogeneous()
+    assert index.n_frames == 7 + 3
+
+    def out_path(p):
+        return str(out / os.path.basename(p))
+
+    with SequenceWriter(index, out_path) as writer:
+        for refs, batch in iter_frame_batches(index, batch_size=4):
+            assert batch.shape[0] <= 4
+            writer.write_batch(refs, batch.astype(np.float32) * 2)
+
+    with tifffile.TiffFile(out / "well1.ome.tif") as tf:
+        assert [s.shape for s in tf.series] == [(3, 2, 8, 10), (8, 10)]
+        np.testing.assert_array_equal(tf.series[0].asarray(), stack * 2.0)
+    np.testing.assert_array_equal(tifffile.imread(out / "well2.tif"), stack[:, 0] * 2.0)
+
+
+def test_writer_copies_metadata(tmp_path):
+    clear_cache()
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    frame = np.arange(32 * 40, dtype=np.uint16).reshape(32, 40)
+    for i in range(3):
+        tifffile.imwrite(
+            src / f"f{i}.tif",
+            frame + i,
+            compression="zlib",
+            predictor=True,
+            rowsperstrip=8,
+            resolution=(2.5, 2.5),
+            resolutionunit="CENTIMETER",
+            description="acquired on scope 7",
+            metadata=None,
+            software="acquire 1.2",
+            extratags=[(65000, "s", 0, "stage=12,34", True), (285, "s", 0, f"pos{i}", True)],
+        )
+    index = index_sequence(str(src))
+
+    with SequenceWriter(index, lambda p: str(out / os.path.basename(p)), max_workers=2) as writer:
+        for refs, batch in iter_frame_batches(index, batch_size=2):
+            writer.write_batch(refs, batch.astype(np.float32))
+
+    for i in range(3):
+        with tifffile.TiffFile(out / f"f{i}.tif") as tf:
+            page = tf.pages[0]
+            np.testing.assert_array_equal(page.asarray(), frame + i)
+            assert page.dtype == np.float32
+            assert page.compression.name == "ADOBE_DEFLATE"  # the float predictor needs imagecodecs
+            assert page.rowsperstrip == 8
+            np.testing.assert_allclose(page.resolution, (2.5, 2.5))
+            assert page.resolutionunit == 3
+            assert page.description == "acquired on scope 7"
+            assert page.software == "acquire 1.2"
+            assert page.tags[65000].value == "stage=12,34"
+            assert page.tags[285].value == f"pos{i}"
+
+
+def test_live_preview_ring(tmp_path):
+    ring = FrameRing(4, (2, 3))
+    assert ring.snapshot() is None
+    frames = np.arange(7 * 6, dtype=np.float32).reshape(7, 2, 3)
+    ring.push(frames[:3])
+    np.testing.assert_array_equal(ring.snapshot(), frames[:3])
+    ring.push(frames[3])
+    ring.push(frames[4:])
+    np.testing.assert_array_equal(ring.snapshot(), frames[3:])
+    ring.push(frames)
+    np.testing.assert_array_equal(ring.snapshot(), frames[3:])
+    assert ring.count == 14
+
+    clear_cache()
+    src = tmp_path / "src"
+    src.mkdir()
+    for i in range(6):
+        tifffile.imwrite(src / f"f{i}.tif", np.full((8, 8), i + 1, np.uint16))
+    index = index_sequence(str(src))
+    live = FrameRing(3, index.frame_shape)
+    seen = []
+
+    def out_path(p):
+        return str(tmp_path / "out" / os.path.basename(p))
+
+    with frame_corrector(np.full((8, 8), 0.5, np.float32), None) as correct:
+        for _ in correct_sequence(index, out_path, correct, 2, preview=live):
+            seen.append(live.snapshot()[:, 0, 0])
+    # filled batch by batch, from memory, before the run ends
+    np.testing.assert_array_equal(seen[0], [2, 4])
+    np.testing.assert_array_equal(seen[-1], [8, 10, 12])
+
+
+def test_routed_index_checks_routed_files_only(tmp_path):
+    clear_cache()
+    for i in range(2):
+        tifffile.imwrite(tmp_path / f"s{i}_w1DAPI.tif", np.full((8, 8), i, np.uint16))
+    tifffile.imwrite(tmp_path / "s0_w4BF.tif", np.zeros((16, 16), np.uint8))
+    (tmp_path / "s0_w5bad.tif").write_bytes(b"not a tiff")
+    index = index_sequence(str(tmp_path))
+    with pytest.raises(ValueError):
+        index.check_homogeneous()
+
+    routed, file_routes, unrouted = routed_index(index, [("w1DAPI", "dapi")])
+    routed.check_homogeneous()
+    assert [os.path.basename(p) for p in routed.paths] == ["s0_w1DAPI.tif", "s1_w1DAPI.tif"]
+    assert sorted(file_routes) == routed.paths and set(file_routes.values()) == {"dapi"}
+    assert [os.path.basename(p) for p in unrouted] == ["s0_w4BF.tif"]
+    # an unreadable file that is routed still fails the check
+    with pytest.raises(ValueError, match="could not be read"):
+        routed_index(index, [("w1DAPI", "dapi"), ("w5bad", "bad")])[0].check_homogeneous()
+
+
+def test_channel_routes_single_pass(tmp_path, monkeypatch):
+    clear_cache()
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    for i in range(3):
+        tifffile.imwrite(src / f"s{i}_w1DAPI.tif", np.full((8, 8), 10 + i, np.uint16))
+        tifffile.imwrite(src / f"s{i}_w2GFP.tif", np.full((2, 8, 8), 20 + i, np.uint16))
+    tifffile.imwrite(src / "s0_w3RFP.tif", np.zeros((8, 8), np.uint16))
+    index = index_sequence(str(src))
+
+    routes = parse_routes("w1DAPI=dapi; *_w2*.tif=gfp")
+    assert routes == [("w1DAPI", "dapi"), ("*_w2*.tif", "gfp")]
+    with pytest.raises(ValueError, match="pattern=model"):
+        parse_routes("w1DAPI")
+    file_routes = route_files(index, routes)
+    assert sorted(os.path.basename(p) for p, m in file_routes.items() if m == "gfp") == [
+        f"s{i}_w2GFP.tif" for i in range(3)
+    ]
+    assert file_routes[str(src / "s0_w3RFP.tif")] is None
+
+    opened = []
+    import napari_basicpy._sequence as seq
+
+    class Reader(seq.FrameReader):
+        def _open(self, path):
+            if path != self._path:
+                opened.append(os.path.basename(path))
+            return super()._open(path)
+
+    monkeypatch.setattr(seq, "FrameReader", Reader)
+    batches = []
+
+    def model(name, gain):
+        def correct(stack):
+            batches.append((name, len(stack)))
+            return stack.astype(np.float32) * gain
+
+        return correct
+
+    correctors = {"dapi": model("dapi", 2.0), "gfp": model("gfp", 0.5)}
+    for _ in correct_sequence(
+        index, lambda p: str(out / os.path.basename(p)), correctors, 4, "float32", routes=file_routes
+    ):
+        pass
+
+    # one ordered read over the folder, batches never mix models
+    assert opened == [os.path.basename(p) for p in index.paths if file_routes[p] is not None]
+    assert sorted(batches) == [("dapi", 3), ("gfp", 2), ("gfp", 4)]
+    for i in range(3):
+        np.testing.assert_array_equal(tifffile.imread(out / f"s{i}_w1DAPI.tif"), np.full((8, 8), 2.0 * (10 + i)))
+        np.testing.assert_array_equal(tifffile.imread(out / f"s{i}_w2GFP.tif"), np.full((2, 8, 8), 0.5 * (20 + i)))
+    assert not (out / "s0_w3RFP.tif").exists()
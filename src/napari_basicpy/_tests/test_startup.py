@@ -0,0 +1,40 @@
+"""Startup guard: importing the plugin and opening the widget must not load the heavy dependencies."""
+
+import json
+import os
+import subprocess
+import sys
+
+HEAVY = ["torch", "basicpy", "tifffile", "matplotlib.backends.backend_qt5agg"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import napari_basicpy
+t1 = time.perf_counter()
+after_import = [m for m in {heavy} if m in sys.modules]
+import napari
+viewer = napari.Viewer(show=False)
+t2 = time.perf_counter()
+widget = napari_basicpy.BasicWidget(viewer)
+t3 = time.perf_counter()
+after_widget = [m for m in {heavy} if m in sys.modules]
+result = {{"import_s": t1 - t0, "widget_s": t3 - t2, "after_import": after_import, "after_widget": after_widget}}
+print(json.dumps(result))
+"""
+
+
+def _probe():
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    proc = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(heavy=HEAVY)], capture_output=True, text=True, env=env, timeout=300
+    )
+    assert proc.returncode == 0, proc.stderr
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def test_startup_is_lazy():
+    result = _probe()
+    print(f"import napari_basicpy: {result['import_s'] * 1e3:.1f} ms, widget: {result['widget_s'] * 1e3:.1f} ms")
+    assert result["after_import"] == []
+    assert result["after_widget"] == []
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from napari_basicpy._fit_cache import FitCache
+from napari_basicpy._sweep import parse_grid, smoothness_sweep
+from napari_basicpy._synthetic import make_synthetic
+
+
+def test_parse_grid():
+    assert parse_grid("2, 0.5,1, 1") == [0.5, 1.0, 2.0]
+    assert parse_grid("0.1:10:3") == [0.1, 1.0, 10.0]
+    assert parse_grid(" ") == []
+    with pytest.raises(ValueError):
+        parse_grid("0:1:3")
+    with pytest.raises(ValueError):
+        parse_grid("1:2")
+
+
+def test_sweep_shares_preprocessing():
+    data = make_synthetic(n_frames=12, shape=(64, 64), dtype="float32", seed=1).images
+    cache = FitCache()
+    gen = smoothness_sweep({"get_darkfield": True}, data, [0.5, 2.0], [0.1, 1.0], fit_cache=cache, max_workers=2)
+    progress = []
+    while True:
+        try:
+            progress.append(next(gen))
+        except StopIteration as stop:
+            result = stop.value
+            break
+
+    assert progress[0] == (0, 4) and progress[-1] == (4, 4)
+    assert result.flatfields.shape == result.darkfields.shape == (4, 64, 64)
+    assert [(r["smoothness_flatfield"], r["smoothness_darkfield"]) for r in result.rows] == [
+        (0.5, 0.1),
+        (0.5, 1.0),
+        (2.0, 0.1),
+        (2.0, 1.0),
+    ]
+    assert all(np.isfinite(r["entropy"]) for r in result.rows)
+    assert 0 <= result.best < 4
+
+    # a Run with one of the swept settings reuses the candidate
+    hits = cache.hits
+    basic = cache.fit({"get_darkfield": True, **result.settings(2)}, data)
+    assert cache.hits == hits + 1
+    np.testing.assert_array_equal(basic.flatfield, result.flatfields[2])
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+import tifffile
+
+from napari_basicpy._apply import ApplyEngine
+from napari_basicpy._synthetic import SyntheticSpec, make_synthetic, write_synthetic_folder, write_synthetic_zarr
+
+
+def test_lazy_matches_eager():
+    spec = SyntheticSpec(n_frames=5, shape=(48, 40), dtype="uint16", seed=3)
+    eager = make_synthetic(spec)
+    lazy = make_synthetic(spec, lazy=True)
+    assert lazy.images.shape == eager.images.shape == (5, 48, 40)
+    assert lazy.images.dtype == np.uint16
+    np.testing.assert_array_equal(np.asarray(lazy.images[3]), eager.images[3])
+    np.testing.assert_array_equal(np.asarray(lazy.images), eager.images)
+
+
+def test_ground_truth_recovers_signal():
+    spec = SyntheticSpec(n_frames=4, shape=(64, 64), dtype="float32", noise=0.0, baseline_drift=0.3)
+    data = make_synthetic(spec)
+    assert data.flatfield.mean() == pytest.approx(1.0, abs=1e-5)
+    assert data.baseline[0] == pytest.approx(1.0)
+    assert data.baseline[-1] < data.baseline[0]
+
+    with ApplyEngine(data.flatfield, data.darkfield) as engine:
+        corrected = engine(data.images)
+    # with the true fields the shading is gone: what is left is baseline plus objects
+    background = np.percentile(corrected, 5, axis=(1, 2))
+    level = spec.level
+    np.testing.assert_allclose(background / level, data.baseline, rtol=0.1)
+
+
+def test_integer_frames_do_not_clip():
+    data = make_synthetic(n_frames=3, shape=(32, 32), dtype="uint8", density=0.0)
+    assert data.images.dtype == np.uint8
+    assert 0 < data.images.min() and data.images.max() < 255
+
+
+def test_write_folder(tmp_path):
+    truth = tmp_path / "truth.npz"
+    data = write_synthetic_folder(str(tmp_path / "tiles"), n_frames=3, shape=(16, 24), truth_path=str(truth))
+    files = sorted((tmp_path / "tiles").iterdir())
+    assert [f.name for f in files] == ["frame_00000.tif", "frame_00001.tif", "frame_00002.tif"]
+    np.testing.assert_array_equal(tifffile.imread(files[1]), make_synthetic(data.spec).images[1])
+    with np.load(truth) as z:
+        np.testing.assert_array_equal(z["flatfield"], data.flatfield)
+
+
+def test_write_zarr(tmp_path):
+    zarr = pytest.importorskip("zarr")
+    data = write_synthetic_zarr(str(tmp_path / "synthetic.zarr"), n_frames=5, shape=(16, 24), chunk_frames=2)
+    group = zarr.open_group(str(tmp_path / "synthetic.zarr"), mode="r")
+    assert group["images"].shape == (5, 16, 24) and group["images"].chunks == (2, 16, 24)
+    np.testing.assert_array_equal(group["images"][:], make_synthetic(data.spec).images)
+    np.testing.assert_array_equal(group["flatfield"][:], data.flatfield)
+    assert group.attrs["synthetic_spec"]["n_frames"] == 5
+
+
+def test_spec_validation():
+    with pytest.raises(ValueError):
+        SyntheticSpec(dtype="int64")
+    with pytest.raises(TypeError):
+        make_synthetic(SyntheticSpec(), n_frames=3)
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from napari_basicpy._tiles import TileGrid, allocate_mosaic, apply_tiles, tile_stack
+
+
+def test_regular_grid_covers_plane_once():
+    grid = TileGrid.regular((100, 130), 32, overlap=8)
+    assert all(y + 32 <= 100 and x + 32 <= 130 for y, x in grid.positions)
+
+    owners = np.zeros((100, 130), int)
+    for i in range(len(grid)):
+        mask = grid.ownership(i)
+        owners[grid.slices(i)] += np.ones((32, 32), int) if mask is None else mask
+    np.testing.assert_array_equal(owners, 1)
+
+
+def test_positions_outside_image_rejected():
+    with pytest.raises(ValueError, match="outside"):
+        TileGrid.from_positions((64, 64), 32, [(0, 0), (40, 0)])
+
+
+def test_apply_tiles_matches_direct_correction():
+    rng = np.random.default_rng(0)
+    plane = rng.uniform(50, 100, (96, 128)).astype(np.float32)
+    flat = rng.uniform(0.5, 1.5, (32, 32)).astype(np.float32)
+    grid = TileGrid.regular(plane.shape, 32)
+    assert tile_stack(plane, grid).shape == (12, 32, 32)
+
+    out = allocate_mosaic(plane.shape)
+    assert list(apply_tiles(plane, grid, lambda t: t / flat, out=out, max_workers=3))[-1] == len(grid)
+    np.testing.assert_allclose(out, plane / np.tile(flat, (3, 4)))
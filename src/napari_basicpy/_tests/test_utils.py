@@ -0,0 +1,25 @@
+import numpy as np
+
+from napari_basicpy.utils import SCALING_MODES, _cast_to_range, _cast_with_scaling, _StreamingRange
+
+
+def test_streaming_range_matches_whole_array():
+    rng = np.random.default_rng(0)
+    data = rng.normal(1000, 300, (12, 16, 16)).astype(np.float32)
+
+    for mode in SCALING_MODES[:2]:
+        acc = _StreamingRange(n_batches=4)
+        for batch in np.array_split(data, 4):
+            acc.update(batch)
+        value_range = acc.value_range("uint16", mode)
+        batched = np.concatenate([_cast_to_range(b, "uint16", value_range) for b in np.array_split(data, 4)])
+        np.testing.assert_array_equal(batched, _cast_with_scaling(data, "uint16", mode))
+
+
+def test_robust_scaling_clips_outliers():
+    data = np.linspace(0, 1, 10000, dtype=np.float32)
+    data[0], data[-1] = -1e6, 1e6
+    out = _cast_with_scaling(data, "uint8", SCALING_MODES[2])
+    assert out.dtype == np.uint8
+    assert out[0] == 0 and out[-1] == 255
+    assert 100 < out[5000] < 155
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import tifffile
+
+from napari_basicpy._metrics import MetricsRecorder
+from napari_basicpy._watch import INDEX_NAME, FolderWatcher, ProcessedIndex
+
+
+def _watcher(src, out, **kwargs):
+    def correct(stack):
+        return stack.astype(np.float32) * 2
+
+    kwargs.setdefault("settle_time", 1.0)
+    kwargs.setdefault("max_latency", 0.0)
+    return FolderWatcher(str(src), str(out), correct, (8, 8), pattern="*.tif", **kwargs)
+
+
+def test_waits_for_stable_files_and_resumes(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    tifffile.imwrite(src / "a.tif", np.ones((8, 8), np.uint16))
+    tifffile.imwrite(src / "b.tif", np.full((3, 8, 8), 2, np.uint16), photometric="minisblack")
+    (src / "notes.txt").write_text("ignored")
+
+    w = _watcher(src, out)
+    assert w.poll(now=0.0) == []  # just seen
+    assert w.poll(now=0.5) == []  # not settled yet
+    ready = w.poll(now=1.5)
+    assert ready == ["a.tif", "b.tif"]
+    assert w.process(ready) == 4
+    np.testing.assert_array_equal(tifffile.imread(out / "b.tif"), np.full((3, 8, 8), 4, np.float32))
+    assert w.status.files_done == 2
+    assert w.poll(now=3.0) == []
+
+    # a restarted watch skips what is done, but picks up rewritten and new files
+    tifffile.imwrite(src / "a.tif", np.full((8, 8), 5, np.uint16))
+    os.utime(src / "a.tif", ns=(1, 1))
+    tifffile.imwrite(src / "c.tif", np.ones((8, 8), np.uint16))
+    w2 = _watcher(src, out)
+    w2.poll(now=10.0)
+    assert w2.poll(now=12.0) == ["a.tif", "c.tif"]
+    w2.process(["a.tif", "c.tif"])
+    assert len(ProcessedIndex(str(out / INDEX_NAME))) == 3
+    np.testing.assert_array_equal(tifffile.imread(out / "a.tif"), np.full((8, 8), 10, np.float32))
+
+
+def test_growing_file_is_not_read(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    path = src / "a.tif"
+    w = _watcher(src, out)
+    path.write_bytes(b"II*\0")
+    w.poll(now=0.0)
+    tifffile.imwrite(path, np.ones((8, 8), np.uint16))
+    assert w.poll(now=1.5) == []  # changed since the last poll: the settle time starts over
+    assert w.poll(now=3.0) == ["a.tif"]
+
+
+def test_mismatched_files_fail_once(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    tifffile.imwrite(src / "big.tif", np.ones((16, 16), np.uint16))
+    w = _watcher(src, out)
+    w.poll(now=0.0)
+    ready = w.poll(now=2.0)
+    assert w.process(ready) == 0
+    assert w.status.failed == ["big.tif"]
+    assert w.poll(now=4.0) == []
+
+
+def test_run_until_stopped(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    for i in range(5):
+        tifffile.imwrite(src / f"f{i}.tif", np.full((8, 8), 100, np.uint16))
+
+    w = _watcher(src, out, settle_time=0.0, poll_interval=0.01, batch_frames=2, save_dtype="uint8")
+    cycles = 0
+    for status in w.run(should_stop=lambda: w.status.files_done == 5):
+        cycles += 1
+        assert cycles < 100
+    assert sorted(p.name for p in out.glob("*.tif")) == [f"f{i}.tif" for i in range(5)]
+    # "preserve" output clips to the dtype range instead of wrapping around
+    assert tifffile.imread(out / "f0.tif").max() == 200
+
+
+def test_corrupt_file_is_skipped(tmp_path):
+    src, out = tmp_path / "src", tmp_path / "out"
+    src.mkdir()
+    # the header probes fine, the compressed strip does not decode
+    tifffile.imwrite(src / "a.tif", np.arange(64, dtype=np.uint16).reshape(8, 8), compression="zlib")
+    with tifffile.TiffFile(src / "a.tif") as tif:
+        offset = tif.pages[0].dataoffsets[0]
+    with open(src / "a.tif", "r+b") as f:
+        f.seek(offset)
+        f.write(b"\xff" * 8)
+    tifffile.imwrite(src / "b.tif", np.ones((8, 8), np.uint16))
+
+    metrics = MetricsRecorder(str(tmp_path / "metrics.csv"))
+    w = _watcher(src, out, settle_time=0.0, poll_interval=0.01, metrics=metrics)
+    cycles = 0
+    for status in w.run(should_stop=lambda: w.status.files_done + len(w.status.failed) == 2):
+        cycles += 1
+        assert cycles < 100
+    assert w.status.failed == ["a.tif"] and w.status.files_done == 1
+    np.testing.assert_array_equal(tifffile.imread(out / "b.tif"), np.full((8, 8), 2, np.float32))
+    assert not (out / "a.tif").exists()
+    assert w.poll() == []  # not retried until it changes
+    assert metrics.n_frames == 1  # the failed batch attempt added no rows
+    metrics.close()
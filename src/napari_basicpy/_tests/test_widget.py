@@ -1,6 +1,15 @@
+import pytest
+
 from napari_basicpy._widget import BasicWidget
 
 
+@pytest.fixture(autouse=True)
+def config_dir(tmp_path, monkeypatch):
+    # run reports, the job queue and backend settings go here instead of the user's config folder
+    monkeypatch.setenv("NAPARI_BASICPY_CONFIG_DIR", str(tmp_path))
+    return tmp_path
+
+
 def test_q_widget(make_napari_viewer, qtbot):
     viewer = make_napari_viewer()
 
@@ -21,4 +30,387 @@ def test_q_widget(make_napari_viewer, qtbot):
 
     layer_names = [layer.name for layer in viewer.layers]
     assert "corrected" in layer_names
-    assert "flatfield" in layer_names
\ No newline at end of file
+    assert "flatfield" in layer_names
+
+
+def test_incremental_fit(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers[0]
+    widget.checkbox_incremental.setChecked(True)
+
+    for expected in (8, 16):
+        worker = widget._run_fit()
+        with qtbot.waitSignal(worker.finished, timeout=60000):
+            pass
+        assert widget.incremental.n_seen == expected
+
+    layer_names = [layer.name for layer in viewer.layers]
+    assert "corrected" not in layer_names
+    assert layer_names.count("flatfield") == 1
+    assert viewer.layers["flatfield"].data.shape == viewer.layers[0].data.shape[-2:]
+
+    widget._reset_incremental()
+    assert widget.incremental is None
+
+
+def test_incremental_fit_lazy(make_napari_viewer, qtbot, monkeypatch):
+    import dask.array as da
+    import numpy as np
+
+    from napari_basicpy import _widget
+    from napari_basicpy._incremental import IncrementalFit
+
+    monkeypatch.setattr(_widget, "TRANSFORM_CHUNK", 4)
+    batches = []
+    add = IncrementalFit.add
+
+    def spy(self, frames):
+        batches.append((type(frames), len(frames)))
+        return add(self, frames)
+
+    monkeypatch.setattr(IncrementalFit, "add", spy)
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    rng = np.random.default_rng(0)
+    images = rng.uniform(100, 200, (10, 32, 32)).astype(np.float32)
+    viewer.add_image(da.from_array(images, chunks=(1, 32, 32)), name="lazy")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers["lazy"]
+    widget.checkbox_incremental.setChecked(True)
+
+    worker = widget._run_fit()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    assert widget.incremental.n_seen == 10
+    # the dask stack reaches the reservoir in slices of at most TRANSFORM_CHUNK frames, never whole
+    assert [n for _, n in batches] == [4, 4, 2]
+    assert all(issubclass(t, da.Array) for t, _ in batches)
+
+
+def test_job_queue(make_napari_viewer, qtbot, tmp_path):
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    panel = widget.job_panel
+    assert panel.running and len(panel.queue) == 0
+
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    widget.reset_choices()
+    panel.run_btn.setChecked(False)
+    widget.fit_image_select.value = viewer.layers[0]
+    fit_job = widget._queue_fit()
+    assert fit_job.status == "queued"  # paused
+
+    panel.run_btn.setChecked(True)
+    qtbot.waitUntil(lambda: fit_job.status == "done", timeout=60000)
+    assert f"{fit_job.label} flatfield" in viewer.layers
+
+    widget.reset_choices()
+    widget.transform_image_select.value = viewer.layers[0]
+    widget.flatfield_select.value = viewer.layers[f"{fit_job.label} flatfield"]
+    transform_job = widget._queue_transform()
+    qtbot.waitUntil(lambda: transform_job.status == "done", timeout=60000)
+    assert viewer.layers[f"{transform_job.label} corrected"].data.shape == viewer.layers[0].data.shape
+
+    # the queue survives a restart of the widget
+    restarted = BasicWidget(viewer).job_panel
+    assert [job.status for job in restarted.queue] == ["done", "done"]
+
+
+def test_queue_routed_sequence(make_napari_viewer, qtbot, tmp_path):
+    import numpy as np
+    import tifffile
+
+    src = tmp_path / "in"
+    src.mkdir()
+    for i in range(2):
+        tifffile.imwrite(src / f"s{i}_w1DAPI.tif", np.full((8, 8), 10.0, np.float32))
+        tifffile.imwrite(src / f"s{i}_w2GFP.tif", np.full((8, 8), 10.0, np.float32))
+    tifffile.imwrite(src / "s0_w3BF.tif", np.zeros((4, 4), np.float32))
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.add_image(np.full((8, 8), 2.0, np.float32), name="dapi ff")
+    viewer.add_image(np.full((8, 8), 0.5, np.float32), name="gfp ff")
+    widget.transform_sequence_folder = str(src)
+    widget.transform_sequence_out_folder = str(tmp_path / "out")
+    widget.transform_sequence_routes = [("w1DAPI", "dapi ff"), ("w2GFP", "gfp ff")]
+
+    job = widget._queue_transform()
+    assert job.params["route_models"] == ["dapi ff", "gfp ff"]
+    qtbot.waitUntil(lambda: job.status == "done", timeout=60000)
+    np.testing.assert_allclose(tifffile.imread(tmp_path / "out" / "s0_w1DAPI.tif"), 5.0)
+    np.testing.assert_allclose(tifffile.imread(tmp_path / "out" / "s0_w2GFP.tif"), 20.0)
+    assert not (tmp_path / "out" / "s0_w3BF.tif").exists()
+
+
+def test_smoothness_sweep(make_napari_viewer, qtbot):
+    import numpy as np
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers[0]
+    widget.lineedit_sweep_flatfield.setText("0.5, 2")
+
+    worker = widget._run_sweep()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    assert viewer.layers["flatfield sweep"].data.shape == (2, *viewer.layers[0].data.shape[-2:])
+
+    # a layer with more dimensions shifts the sweep layer's candidate axis to the right
+    viewer.add_image(np.zeros((3, 2, 8, 8), dtype=np.float32), name="4d")
+    widget.sweep_dialog.table.selectRow(1)
+    assert viewer.dims.current_step[viewer.dims.ndim - 3] == 1
+    widget.sweep_dialog._use_selected()
+    assert float(widget.lineedit_smoothness_flatfield.text()) == 2.0
+    widget.sweep_dialog.close()
+
+    # Run with the selected candidate reuses its swept fit
+    hits = widget.fit_cache.hits
+    widget._run_fit()
+    qtbot.waitUntil(lambda: "corrected" in viewer.layers, timeout=60000)
+    assert widget.fit_cache.hits == hits + 1
+
+
+def test_preview_fit(make_napari_viewer, qtbot):
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers[0]
+
+    worker = widget._run_preview()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    assert viewer.layers["flatfield preview"].data.shape == viewer.layers[0].data.shape[-2:]
+    assert widget.preview_fit.cached
+
+    # with a preview on screen, a smoothness edit previews again, in place
+    widget.lineedit_smoothness_flatfield.setText("5")
+    widget.lineedit_smoothness_flatfield.editingFinished.emit()
+    assert widget._preview_worker is not None
+    qtbot.waitUntil(lambda: widget._preview_worker is None, timeout=60000)
+    assert [layer.name for layer in viewer.layers].count("flatfield preview") == 1
+
+
+def test_transform_metrics(make_napari_viewer, qtbot, tmp_path):
+    import os
+
+    import numpy as np
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    viewer.add_image(np.ones(viewer.layers[0].data.shape[-2:], dtype=np.float32), name="flatfield")
+    widget.reset_choices()
+    widget.transform_image_select.value = viewer.layers[0]
+    widget.flatfield_select.value = viewer.layers["flatfield"]
+    widget.checkbox_metrics.setChecked(True)
+
+    widget._run_transform()
+    qtbot.waitUntil(lambda: "corrected" in viewer.layers, timeout=60000)
+    path = viewer.layers["corrected"].metadata["basicpy_metrics"]
+    assert os.path.dirname(path) == os.path.join(str(tmp_path), "reports") and path.endswith(".csv")
+    with open(path) as f:
+        assert len(f.readlines()) == 1 + len(viewer.layers[0].data)
+    assert widget.last_report.outputs["metrics"]["raw_mean"]["mean"] > 0
+
+
+def test_transform_metrics_without_pyarrow(make_napari_viewer, monkeypatch):
+    import sys
+    import threading
+
+    import numpy as np
+    from qtpy.QtWidgets import QMessageBox
+
+    from napari_basicpy._instrument import _MemorySampler
+
+    warned = []
+    monkeypatch.setattr(QMessageBox, "warning", lambda *args: warned.append(args[-1]))
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    viewer.add_image(np.ones(viewer.layers[0].data.shape[-2:], dtype=np.float32), name="flatfield")
+    widget.reset_choices()
+    widget.transform_image_select.value = viewer.layers[0]
+    widget.flatfield_select.value = viewer.layers["flatfield"]
+    widget.checkbox_metrics.setChecked(True)
+    widget.metrics_format_cb.setCurrentText("parquet")
+
+    assert widget._run_transform() is None
+    assert warned and "pyarrow" in warned[0]
+    assert widget.run_transform_btn.isEnabled()
+    # the abandoned run report stopped its memory sampler
+    assert all(t._stop_event.is_set() for t in threading.enumerate() if isinstance(t, _MemorySampler))
+
+
+def test_fit_memory_fallbacks(make_napari_viewer, qtbot, monkeypatch):
+    import numpy as np
+    from qtpy.QtWidgets import QMessageBox
+
+    asked = []
+    monkeypatch.setattr(QMessageBox, "question", lambda *args: asked.append(args) or QMessageBox.Yes)
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers[0]
+    widget.backend_settings.memory_sb.setValue(0.1)
+
+    worker = widget._run_fit()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    assert asked  # still over budget after the fallbacks: the user was asked
+    plan = widget.last_report.settings["memory_plan"]
+    assert plan["out_of_core"]
+    corrected = viewer.layers["corrected"].data
+    assert isinstance(corrected, np.memmap) and corrected.shape == viewer.layers[0].data.shape
+
+
+def test_transform_output_is_weakly_held(make_napari_viewer, qtbot):
+    import gc
+
+    import numpy as np
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    viewer.open_sample("napari-basicpy", "sample_data_random")
+    viewer.add_image(np.ones(viewer.layers[0].data.shape[-2:], dtype=np.float32), name="flatfield")
+    widget.reset_choices()
+    widget.transform_image_select.value = viewer.layers[0]
+    widget.flatfield_select.value = viewer.layers["flatfield"]
+    widget.output_cb.setCurrentText("memmap")
+
+    widget._run_transform()
+    # a transform this small can finish before a signal wait would be set up
+    qtbot.waitUntil(lambda: "corrected" in viewer.layers, timeout=60000)
+    corrected = viewer.layers["corrected"].data
+    assert isinstance(corrected, np.memmap) and widget.corrected is corrected
+    np.testing.assert_allclose(corrected, viewer.layers[0].data, rtol=1e-6)
+    assert widget.last_report.settings["output"] == "memmap"
+
+    del corrected
+    viewer.layers.remove("corrected")
+    gc.collect()
+    assert widget.corrected is None
+
+
+def test_fit_screens_frames(make_napari_viewer, qtbot):
+    import numpy as np
+
+    from napari_basicpy._synthetic import make_synthetic
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    images = make_synthetic(n_frames=20, shape=(64, 64), noise=0.01).images.copy()
+    images[7] //= 100
+    viewer.add_image(images, name="stack")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers["stack"]
+    widget.checkbox_screen.setChecked(True)
+
+    worker = widget._run_fit()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    screening = widget.last_report.outputs["screening"]
+    assert screening["rejected"] == {"7": ["blank"]} and screening["n_kept"] == 19
+    assert viewer.layers["corrected"].data.shape == images.shape
+
+
+def test_fit_subsample_from_fit_cache(make_napari_viewer, qtbot, monkeypatch):
+    import dataclasses
+
+    import numpy as np
+
+    from napari_basicpy import _fit_cache, _widget
+    from napari_basicpy._synthetic import make_synthetic
+
+    plan_fit = _widget.plan_fit
+    monkeypatch.setattr(_widget, "plan_fit", lambda *a, **kw: dataclasses.replace(plan_fit(*a, **kw), fit_frames=8))
+    fitted = []
+    fit_working_stack = _fit_cache.fit_working_stack
+
+    def spy(settings, images, weight=None):
+        fitted.append(len(images))
+        return fit_working_stack(settings, images, weight)
+
+    monkeypatch.setattr(_fit_cache, "fit_working_stack", spy)
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    images = make_synthetic(n_frames=20, shape=(64, 64), noise=0.01).images.copy()
+    images[6] //= 100
+    viewer.add_image(images, name="stack")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers["stack"]
+    widget.checkbox_screen.setChecked(True)
+
+    worker = widget._run_fit()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    # only the subsample (every 3rd frame: 7 of 20) is preprocessed, as the memory plan assumes, and
+    # the fit leaves out its frame that failed screening
+    assert widget.last_report.outputs["screening"]["rejected"] == {"6": ["blank"]}
+    assert widget.fit_cache._images.shape[0] == 7
+    assert fitted == [6]
+    assert viewer.layers["corrected"].data.shape == images.shape
+
+
+def test_fit_on_shapes_roi(make_napari_viewer, qtbot):
+    import numpy as np
+
+    from napari_basicpy._synthetic import make_synthetic
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    images = make_synthetic(n_frames=10, shape=(64, 80), dtype="float32").images
+    viewer.add_image(images, name="stack")
+    viewer.add_shapes([np.array([[8, 10], [8, 60], [50, 60], [50, 10]])], shape_type="polygon", name="roi")
+    widget.reset_choices()
+    widget.fit_image_select.value = viewer.layers["stack"]
+    widget.roi_select.value = viewer.layers["roi"]
+    widget.roi_fill_cb.setCurrentText("nan")
+
+    worker = widget._run_fit()
+    with qtbot.waitSignal(worker.finished, timeout=60000):
+        pass
+    assert widget.last_report.settings["roi"] == {"y": [8, 51], "x": [10, 61]}
+    flatfield = viewer.layers["flatfield"].data
+    assert flatfield.shape == (64, 80)
+    assert np.isfinite(flatfield[8:51, 10:61]).all() and np.isnan(flatfield[:8]).all()
+    corrected = viewer.layers["corrected"].data
+    assert np.isfinite(corrected[:, 8:51, 10:61]).all() and np.isnan(corrected[:, :, :10]).all()
+
+    # a rerun crops the layer again and still reuses the cached fit
+    hits = widget.fit_cache.hits
+    widget._run_fit()
+    qtbot.waitUntil(lambda: sum(layer.name.startswith("corrected") for layer in viewer.layers) == 2, timeout=60000)
+    assert widget.fit_cache.hits == hits + 1
+
+
+def test_roi_follows_layer_transforms(make_napari_viewer):
+    import numpy as np
+
+    viewer = make_napari_viewer()
+    widget = BasicWidget(viewer)
+    scaled = viewer.add_image(np.zeros((3, 64, 80), np.float32), scale=(1, 2, 2), translate=(0, 10, 0))
+    rotated = viewer.add_image(np.zeros((3, 64, 80), np.float32), rotate=90)
+    # world (y, x) of a rotated layer is (-x, y) of its data
+    rois = {
+        "scaled": [[30, 20], [30, 120], [110, 120], [110, 20]],
+        "rotated": [[-60, 20], [-60, 40], [-10, 40], [-10, 20]],
+    }
+    for name, vertices in rois.items():
+        viewer.add_shapes([np.array(vertices)], shape_type="polygon", name=name)
+    widget.reset_choices()
+
+    widget.roi_select.value = viewer.layers["scaled"]
+    assert widget._roi_bounds(scaled, (3, 64, 80)) == (slice(10, 51), slice(10, 61))
+    widget.roi_select.value = viewer.layers["rotated"]
+    assert widget._roi_bounds(rotated, (3, 64, 80)) == (slice(20, 41), slice(10, 61))
@@ -0,0 +1,188 @@
+"""Tile (mosaic) mode: cut one large 2D plane into field-of-view tiles for fitting and correction.
+
+BaSiC needs a stack of fields of view to estimate shading. For whole-slide or stitched images the
+stack is made of tiles taken from the plane on a regular grid (tile size + overlap) or at known stage
+positions. Tiles are sliced lazily for the fit, and the correction is applied tile by tile in a thread
+pool and written into a disk-backed output mosaic, so memory scales with the tiles in flight rather
+than with the slide.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _pair(v) -> Tuple[int, int]:
+    if np.isscalar(v):
+        return int(v), int(v)
+    v = tuple(int(x) for x in v)
+    if len(v) != 2:
+        raise ValueError(f"Expected one or two values, got {v}")
+    return v  # type: ignore[return-value]
+
+
+def _axis_starts(length: int, tile: int, overlap: int) -> list[int]:
+    if tile > length:
+        raise ValueError(f"Tile size {tile} is larger than the image ({length})")
+    step = tile - overlap
+    if step <= 0:
+        raise ValueError("Overlap must be smaller than the tile size")
+    starts = list(range(0, length - tile + 1, step))
+    if starts[-1] + tile < length:
+        # last tile is shifted inward so that every tile has the full size
+        starts.append(length - tile)
+    return starts
+
+
+@dataclass(frozen=True)
+class TileGrid:
+    """Tile layout over a 2D plane.
+
+    Attributes
+    ----------
+    image_shape : tuple of int
+        ``(Y, X)`` of the plane.
+    tile_shape : tuple of int
+        ``(ty, tx)`` of every tile.
+    positions : tuple of (int, int)
+        Top-left corner of each tile.
+    """
+
+    image_shape: Tuple[int, int]
+    tile_shape: Tuple[int, int]
+    positions: Tuple[Tuple[int, int], ...]
+
+    @classmethod
+    def regular(cls, image_shape, tile_size, overlap=0) -> "TileGrid":
+        """Cover the plane with a row-major grid of tiles of `tile_size` overlapping by `overlap` pixels."""
+        (H, W), (ty, tx), (oy, ox) = _pair(image_shape[-2:]), _pair(tile_size), _pair(overlap)
+        positions = tuple((y, x) for y in _axis_starts(H, ty, oy) for x in _axis_starts(W, tx, ox))
+        return cls((H, W), (ty, tx), positions)
+
+    @classmethod
+    def from_positions(cls, image_shape, tile_size, positions: Sequence[Sequence[float]]) -> "TileGrid":
+        """Tiles with top-left corners at stage `positions` given in ``(y, x)`` pixel coordinates."""
+        (H, W), (ty, tx) = _pair(image_shape[-2:]), _pair(tile_size)
+        pos = np.rint(np.asarray(positions, dtype=float).reshape(-1, 2)).astype(int)
+        if not len(pos):
+            raise ValueError("No tile positions given")
+        bad = (pos[:, 0] < 0) | (pos[:, 1] < 0) | (pos[:, 0] + ty > H) | (pos[:, 1] + tx > W)
+        if bad.any():
+            raise ValueError(f"{int(bad.sum())} tile position(s) fall outside the {H}x{W} image")
+        return cls((H, W), (ty, tx), tuple((int(y), int(x)) for y, x in pos))
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def slices(self, i: int) -> Tuple[slice, slice]:
+        y, x = self.positions[i]
+        ty, tx = self.tile_shape
+        return slice(y, y + ty), slice(x, x + tx)
+
+    def ownership(self, i: int) -> Optional[np.ndarray]:
+        """Pixels of tile `i` it writes to the mosaic, or None if it owns the whole tile.
+
+        In overlaps each pixel goes to the tile whose center is nearest (distance scaled by the tile
+        size, lowest index on ties), which splits a regular grid at the middle of each overlap.
+        """
+        ty, tx = self.tile_shape
+        pos = np.asarray(self.positions)
+        y0, x0 = pos[i]
+        near = np.flatnonzero((np.abs(pos[:, 0] - y0) < ty) & (np.abs(pos[:, 1] - x0) < tx))
+        near = near[near != i]
+        if not len(near):
+            return None
+        yy = (np.arange(ty) + y0 + 0.5)[:, None]
+        xx = (np.arange(tx) + x0 + 0.5)[None, :]
+
+        def dist(j):
+            cy, cx = pos[j, 0] + ty / 2, pos[j, 1] + tx / 2
+            return np.maximum(np.abs(yy - cy) / ty, np.abs(xx - cx) / tx)
+
+        own = dist(i)
+        mask = np.ones((ty, tx), dtype=bool)
+        for j in near:
+            d = dist(j)
+            mask &= (own < d) | ((own == d) & (i < j))
+        return mask
+
+
+def tile_stack(image, grid: TileGrid):
+    """Lazy ``(n_tiles, ty, tx)`` dask stack of the tiles; no pixel is read until BaSiC resizes a tile."""
+    import dask.array as da
+
+    arr = image if isinstance(image, da.Array) else da.from_array(image, chunks=grid.tile_shape)
+    return da.stack([arr[grid.slices(i)] for i in range(len(grid))], axis=0)
+
+
+def allocate_mosaic(shape, dtype=np.float32, directory: Optional[str] = None) -> np.ndarray:
+    """Disk-backed output array (``.npy`` memory map) that the OS pages out as tiles are written."""
+    fd, path = tempfile.mkstemp(prefix="basicpy_mosaic_", suffix=".npy", dir=directory)
+    os.close(fd)
+    arr = np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=tuple(shape))
+    weakref.finalize(arr, _remove_quietly, path)
+    return arr
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:  # still mapped (Windows) or already gone
+        logger.debug("Could not remove %s", path)
+
+
+def apply_tiles(
+    image,
+    grid: TileGrid,
+    correct: Callable[[np.ndarray], np.ndarray],
+    out=None,
+    max_workers: Optional[int] = None,
+) -> Iterator[int]:
+    """Correct `image` tile by tile into `out`; yield the number of tiles finished so far.
+
+    Each task reads one tile, calls ``correct(tile)`` with a ``(ty, tx)`` array and writes the pixels it
+    owns (see `TileGrid.ownership`), so concurrent writes never touch the same pixel. Pixels not covered
+    by any tile are left untouched in `out`.
+    """
+    if out is None:
+        raise ValueError("apply_tiles needs an output array, e.g. from allocate_mosaic()")
+    max_workers = max_workers or min(8, os.cpu_count() or 1)
+
+    def _task(i):
+        sl = grid.slices(i)
+        corrected = np.asarray(correct(np.asarray(image[sl])))
+        mask = grid.ownership(i)
+        if mask is None:
+            out[sl] = corrected
+        else:
+            region = out[sl]
+            region[mask] = corrected[mask]
+        return i
+
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        pending = set()
+        for i in range(len(grid)):
+            pending.add(ex.submit(_task, i))
+            if len(pending) >= 2 * max_workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    fut.result()
+                    done += 1
+                    yield done
+        while pending:
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                fut.result()
+                done += 1
+                yield done
@@ -0,0 +1,376 @@
+"""Watch a folder and correct new files as they land.
+
+Sequence transform works on a snapshot of a folder. During long acquisitions `FolderWatcher` polls the
+input folder instead, waits until each new file is completely written (its size and mtime have not
+changed for `settle_time` seconds and its TIFF header parses), groups ready files into micro-batches
+and pushes them through the same read → correct → cast → write pipeline as sequence mode.
+
+Processed files are recorded in ``.basicpy_watch_index.jsonl`` in the output folder, one JSON line per
+file with its size and mtime, so a restarted watch continues where it stopped; a file that is
+rewritten later is processed again.
+
+Polling (a ``scandir`` per interval) is used rather than filesystem notifications: it works the same on
+local disks and on the network shares microscopes usually write to, where notifications are often not
+delivered.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import time
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from ._sequence import (
+    FileInfo,
+    SequenceIndex,
+    SequenceWriter,
+    _name_matches,
+    _walk,
+    iter_frame_batches,
+    natural_key,
+    probe_tiff,
+    ref_labels,
+)
+from .utils import SCALING_MODES, _cast_to_range, _dtype_limits, _StreamingRange
+
+logger = logging.getLogger(__name__)
+
+INDEX_NAME = ".basicpy_watch_index.jsonl"
+
+# a stable file whose header still does not parse after this many settle periods is given up on
+_MAX_PROBE_ATTEMPTS = 5
+
+
+class ProcessedIndex:
+    """Append-only record of processed files, keyed by path relative to the watched folder."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut short by a crash; everything before it is valid
+                        continue
+                    self._entries[entry["path"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def done(self, rel: str, size: int, mtime_ns: int) -> bool:
+        entry = self._entries.get(rel)
+        return entry is not None and entry["size"] == size and entry["mtime_ns"] == mtime_ns
+
+    def add(self, rel: str, size: int, mtime_ns: int, **extra):
+        entry = {"path": rel, "size": size, "mtime_ns": mtime_ns, "time": time.time(), **extra}
+        self._entries[rel] = entry
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+@dataclass
+class _Pending:
+    size: int
+    mtime_ns: int
+    stable_since: float
+    ready_since: Optional[float] = None
+    info: Optional[FileInfo] = None
+    attempts: int = 0
+
+
+@dataclass
+class WatchStatus:
+    """Progress of a watch, yielded after every poll and every micro-batch."""
+
+    files_done: int = 0
+    frames_done: int = 0
+    files_pending: int = 0
+    failed: List[str] = field(default_factory=list)
+    last_latency: Optional[float] = None
+
+    def text(self) -> str:
+        parts = [f"BaSiCPy watch: {self.files_done} files ({self.frames_done} frames) corrected"]
+        if self.files_pending:
+            parts.append(f"{self.files_pending} waiting")
+        if self.last_latency is not None:
+            parts.append(f"latency {self.last_latency:.1f} s")
+        if self.failed:
+            parts.append(f"{len(self.failed)} failed")
+        return " · ".join(parts)
+
+
+class FolderWatcher:
+    """Poll `folder` for new files and correct them into `out_folder`.
+
+    Parameters
+    ----------
+    folder, out_folder : str
+        Watched input folder and output folder (must differ). Outputs keep the relative path and name.
+    correct : callable
+        Maps a ``(B, Y, X)`` stack to the corrected float32 stack.
+    frame_shape : tuple of int
+        Frame shape the model applies to; files with other frames are skipped and reported.
+    tokens, pattern, use_regex, recursive
+        File filters, as for sequence mode.
+    save_dtype, save_mode : str
+        Output dtype and scaling. A stream has no global value range: "preserve" clips to the dtype range,
+        the rescale modes fix their range from the first micro-batch.
+    poll_interval : float
+        Seconds between folder scans.
+    settle_time : float
+        Seconds a file's size and mtime must stay unchanged before it is read.
+    batch_frames : int
+        Frames per micro-batch; a batch starts as soon as it is full.
+    max_latency : float
+        Seconds a ready file may wait for its batch to fill before it is processed anyway.
+    report : RunReport, optional
+        Receives read/correct/cast/write stages.
+    metrics : MetricsRecorder, optional
+        Receives every frame before and after correction.
+    """
+
+    def __init__(
+        self,
+        folder: str,
+        out_folder: str,
+        correct: Callable[[np.ndarray], np.ndarray],
+        frame_shape: Tuple[int, int],
+        tokens: Optional[List[str]] = None,
+        pattern: Optional[str] = None,
+        use_regex: bool = False,
+        recursive: bool = False,
+        save_dtype: str = "float32",
+        save_mode: str = SCALING_MODES[0],
+        poll_interval: float = 1.0,
+        settle_time: float = 2.0,
+        batch_frames: int = 32,
+        max_latency: float = 2.0,
+        report=None,
+        metrics=None,
+    ):
+        self.folder = os.path.abspath(folder)
+        self.out_folder = os.path.abspath(out_folder)
+        if self.folder == self.out_folder:
+            raise ValueError("Output folder must be different from the watched folder")
+        self.correct = correct
+        self.frame_shape = tuple(frame_shape)
+        self.tokens = tokens
+        self.pattern = pattern or None
+        self.regex = re.compile(pattern) if (use_regex and pattern) else None
+        self.recursive = recursive
+        self.save_dtype = save_dtype
+        self.save_mode = save_mode
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.batch_frames = batch_frames
+        self.max_latency = max_latency
+        self.report = report
+        self.metrics = metrics
+
+        os.makedirs(self.out_folder, exist_ok=True)
+        self.index = ProcessedIndex(os.path.join(self.out_folder, INDEX_NAME))
+        self.status = WatchStatus()
+        self._pending: Dict[str, _Pending] = {}
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        self._value_range = None
+        self._range_fixed = False
+
+    # -----------------------------------------------------------------------------------------------------
+    # discovery
+    # -----------------------------------------------------------------------------------------------------
+
+    def _candidates(self) -> Iterator[Tuple[str, os.stat_result]]:
+        for rel in _walk(self.folder, self.recursive):
+            if not _name_matches(rel, self.tokens, self.pattern, self.regex):
+                continue
+            if os.path.join(self.folder, rel).startswith(self.out_folder + os.sep):
+                # our own outputs, when the output folder is inside a recursively watched folder
+                continue
+            try:
+                st = os.stat(os.path.join(self.folder, rel))
+            except OSError:  # removed between listing and stat
+                continue
+            yield rel, st
+
+    def poll(self, now: Optional[float] = None) -> List[str]:
+        """Scan the folder once; return the relative paths that are complete and not yet processed."""
+        now = time.monotonic() if now is None else now
+        seen = set()
+        for rel, st in self._candidates():
+            seen.add(rel)
+            if self.index.done(rel, st.st_size, st.st_mtime_ns) or self._failed.get(rel) == (
+                st.st_size,
+                st.st_mtime_ns,
+            ):
+                continue
+            p = self._pending.get(rel)
+            if p is None or (p.size, p.mtime_ns) != (st.st_size, st.st_mtime_ns):
+                # new, or still being written
+                self._pending[rel] = _Pending(st.st_size, st.st_mtime_ns, now)
+                continue
+            if p.info is None and now - p.stable_since >= self.settle_time * (p.attempts + 1):
+                try:
+                    p.info = probe_tiff(os.path.join(self.folder, rel))
+                    p.ready_since = now
+                except Exception as e:  # header incomplete, or not a TIFF
+                    p.attempts += 1
+                    if p.attempts >= _MAX_PROBE_ATTEMPTS:
+                        self._fail(rel, p, f"{type(e).__name__}: {e}")
+        for rel in list(self._pending):
+            if rel not in seen:
+                del self._pending[rel]
+        ready = [rel for rel, p in self._pending.items() if p.info is not None]
+        self.status.files_pending = len(self._pending)
+        return sorted(ready, key=natural_key)
+
+    def _fail(self, rel: str, p: _Pending, reason: str):
+        logger.warning(f"Watch: skipping {rel}: {reason}")
+        self._failed[rel] = (p.size, p.mtime_ns)
+        self.status.failed.append(rel)
+        self._pending.pop(rel, None)
+
+    def _due(self, ready: List[str], now: float) -> bool:
+        if not ready:
+            return False
+        frames = sum(self._pending[rel].info.n_frames for rel in ready)
+        oldest = min(self._pending[rel].ready_since for rel in ready)
+        return frames >= self.batch_frames or now - oldest >= self.max_latency
+
+    # -----------------------------------------------------------------------------------------------------
+    # processing
+    # -----------------------------------------------------------------------------------------------------
+
+    def _cast(self, corrected: np.ndarray) -> np.ndarray:
+        if self.save_dtype == "float32":
+            return corrected.astype(np.float32, copy=False)
+        if not self._range_fixed:
+            if self.save_mode == SCALING_MODES[0]:
+                # identity mapping, clipped to what the dtype can hold
+                self._value_range = _dtype_limits(self.save_dtype)
+            else:
+                acc = _StreamingRange()
+                acc.update(corrected)
+                self._value_range = acc.value_range(self.save_dtype, self.save_mode)
+                logger.info(f"Watch: output range fixed from the first batch: {self._value_range}")
+            self._range_fixed = True
+        return _cast_to_range(corrected, self.save_dtype, self._value_range)
+
+    def _out_path(self, path: str) -> str:
+        return os.path.join(self.out_folder, os.path.relpath(path, self.folder))
+
+    def process(self, rels: List[str], now: Optional[float] = None) -> int:
+        """Correct the given ready files; returns the number of frames written."""
+        infos = []
+        for rel in rels:
+            p = self._pending[rel]
+            if tuple(p.info.frame_shape) != self.frame_shape or any(
+                tuple(si.shape[-2:]) != self.frame_shape for si in p.info.series
+            ):
+                self._fail(rel, p, f"frames {p.info.frame_shape} do not match the model {self.frame_shape}")
+                continue
+            infos.append(p.info)
+        if not infos:
+            return 0
+
+        index = SequenceIndex(folder=self.folder, files=infos)
+        report = self.report
+        stage = report.stage if report is not None else (lambda *args, **kwargs: nullcontext())
+        batches = iter_frame_batches(index, self.batch_frames)
+        if report is not None:
+            batches = report.timed_iter(
+                batches, "read", nbytes=lambda item: item[1].nbytes, frames=lambda item: len(item[0])
+            )
+        n = 0
+        # metric rows are added once all outputs are closed, so a failed (and retried) call adds none
+        rows = []
+        with SequenceWriter(index, self._out_path) as writer:
+            for refs, stack in batches:
+                with stage("correct", frames=len(refs)):
+                    corrected = self.correct(stack)
+                if self.metrics is not None:
+                    with stage("metrics", frames=len(refs)):
+                        rows.extend(self.metrics.measure(ref_labels(self.folder, refs), corrected, raw=stack))
+                with stage("cast", frames=len(refs)):
+                    corrected = self._cast(corrected)
+                with stage("write", written=corrected.nbytes, frames=len(refs)):
+                    writer.write_batch(refs, corrected)
+                n += len(refs)
+
+        if rows:
+            self.metrics.add_rows(rows)
+        now = time.monotonic() if now is None else now
+        for info in infos:
+            rel = os.path.relpath(info.path, self.folder)
+            p = self._pending.pop(rel)
+            self.index.add(rel, p.size, p.mtime_ns, frames=info.n_frames, output=self._out_path(info.path))
+            # from the last change of the file to its output being closed
+            self.status.last_latency = now - p.stable_since
+        self.status.files_done += len(infos)
+        self.status.frames_done += n
+        if self.report is not None:
+            self.report.count_frames(n)
+        return n
+
+    def _process_or_skip(self, rels: List[str]) -> int:
+        """`process`, retried file by file if the batch fails; files that still fail are skipped.
+
+        A file can probe fine and still fail to decode (e.g. a corrupt compressed strip); one such file
+        must neither end the watch nor hold back the other files of its batch.
+        """
+        try:
+            return self.process(rels)
+        except Exception as e:
+            if len(rels) == 1:
+                self._skip_unreadable(rels[0], e)
+                return 0
+            logger.warning(f"Watch: a batch of {len(rels)} files failed ({type(e).__name__}: {e}); retrying per file")
+        n = 0
+        for rel in rels:
+            if rel not in self._pending:  # already failed the frame-shape check
+                continue
+            try:
+                n += self.process([rel])
+            except Exception as e:
+                self._skip_unreadable(rel, e)
+        return n
+
+    def _skip_unreadable(self, rel: str, error: Exception):
+        self._fail(rel, self._pending[rel], f"{type(error).__name__}: {error}")
+        try:  # a partly written output
+            os.remove(self._out_path(os.path.join(self.folder, rel)))
+        except OSError:
+            pass
+
+    def run(self, should_stop: Callable[[], bool] = lambda: False) -> Iterator[WatchStatus]:
+        """Poll and process until `should_stop` returns True; yields the status after every cycle.
+
+        Meant to be driven by a worker thread; stopping between yields (e.g. ``worker.quit()``) is safe,
+        since files are only recorded as processed after their outputs are closed.
+        """
+        logger.info(f"Watching {self.folder} -> {self.out_folder} ({len(self.index)} files already processed)")
+        while not should_stop():
+            now = time.monotonic()
+            ready = self.poll(now)
+            while self._due(ready, now):
+                batch, frames = [], 0
+                for rel in ready:
+                    batch.append(rel)
+                    frames += self._pending[rel].info.n_frames
+                    if frames >= self.batch_frames:
+                        break
+                self._process_or_skip(batch)
+                ready = [rel for rel in ready if rel in self._pending]
+                yield self.status
+            yield self.status
+            time.sleep(self.poll_interval)
+
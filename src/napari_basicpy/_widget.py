@@ -6,26 +6,27 @@ TODO
 
 SEQ_SENTINEL = "__SEQ_SENTINEL__"
 
-import tqdm
 from napari.utils.notifications import show_info, show_warning
 import enum
 import re
 import logging
-from functools import partial
+import weakref
+from contextlib import ExitStack, nullcontext
+from functools import lru_cache, partial
 from pathlib import Path
 from typing import TYPE_CHECKING, Optional
 import importlib.metadata
-import tifffile
 import numpy as np
-from basicpy import BaSiC
 from magicgui.widgets import create_widget
 from napari.qt import thread_worker
 from qtpy.QtCore import QEvent, Qt
 from qtpy.QtGui import QDoubleValidator, QPixmap
 from qtpy.QtWidgets import (
+    QAbstractItemView,
     QComboBox,
     QCheckBox,
     QDoubleSpinBox,
+    QSpinBox,
     QFormLayout,
     QGroupBox,
     QLabel,
@@ -39,17 +40,43 @@ from qtpy.QtWidgets import (
     QLineEdit,
     QDialog,
     QMessageBox,
+    QProgressBar,
+    QTableWidget,
+    QTableWidgetItem,
+)
+from .utils import SAVE_DTYPES, SCALING_MODES, _cast_with_scaling
+from ._apply import OUTPUTS, ApplyEngine, allocate_output, as_frames
+from ._backend import DEVICES, BackendConfig
+from ._dct_model import DCTModel
+from ._fit_cache import FitCache
+from ._incremental import IncrementalFit
+from ._jobs import JobQueue, run_job
+from ._live import FrameRing, Throttle
+from ._preview import PreviewFit
+from ._roi import FILLS as ROI_FILLS, bounds_to_dict, crop_frames, embed_profile, roi_bounds
+from ._screen import screen_frames
+from ._instrument import RunReport, fingerprint_array, fingerprint_files, reports_dir
+from ._planner import TRANSFORM_CHUNK, correct_chunked, fit_frame_indices, memory_budget, plan_fit, plan_transform
+from ._metrics import FORMATS as METRICS_FORMATS, MetricsRecorder, metrics_path, record_stack, report_outputs
+from ._watch import FolderWatcher
+from ._tiles import TileGrid, allocate_mosaic, apply_tiles, tile_stack
+from ._sweep import parse_grid, smoothness_sweep
+from ._sequence import (
+    correct_sequence,
+    estimate_batch_size,
+    frame_corrector,
+    index_sequence,
+    parse_filter_text,
+    parse_routes,
+    routed_index,
 )
-from matplotlib.backends.backend_qt5agg import FigureCanvas
-from .utils import _cast_with_scaling
 
 if TYPE_CHECKING:
     import napari  # pragma: no cover
 
 from magicgui.widgets import ComboBox
-from napari.layers import Image
+from napari.layers import Image, Points, Shapes
 import numpy as np
-import tifffile
 from qtpy.QtWidgets import QFileDialog
 
 SHOW_LOGO = True  # Show or hide the BaSiC logo in the widget
@@ -99,11 +126,51 @@ def write_tiff(path: str, data: np.ndarray):
     data : np.ndarray
         Data to save
     """
+    import tifffile
+
     tifffile.imwrite(path, data)
 
 
+def _n_frames(data) -> int:
+    return int(np.prod(np.shape(data)[:-2]))
+
+
+def _fill_outside(out, roi, value):
+    """Set every pixel of ``(..., Y, X)`` `out` outside the ``(y, x)`` slices `roi` to `value`, in place."""
+    ys, xs = roi
+    out[..., : ys.start, :] = value
+    out[..., ys.stop :, :] = value
+    out[..., ys, : xs.start] = value
+    out[..., ys, xs.stop :] = value
+
+
+@lru_cache(maxsize=None)
+def _basic_model_fields() -> dict:
+    """``BaSiC.model_fields``; BaSiCPy (and torch) are imported on the first call only."""
+    from basicpy import BaSiC
+
+    return dict(BaSiC.model_fields)
+
+
 class GeneralSetting(QGroupBox):
     # (15.11.2024) Function 1
+    # fitted arrays and settings that have their own controls elsewhere in the widget
+    skip = [
+        "flatfield",
+        "darkfield",
+        "baseline",
+        "resize_mode",
+        "resize_params",
+        "working_size",
+        "fitting_mode",
+        "get_darkfield",
+        "smoothness_flatfield",
+        "smoothness_darkfield",
+        "sparse_cost_darkfield",
+        "sort_intensity",
+        "device",
+    ]
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setVisible(False)
@@ -114,34 +181,30 @@ class GeneralSetting(QGroupBox):
         self.name = ""  # layer.name
 
         # layout and parameters for intensity normalization
-        vbox = QGridLayout()
-        self.setLayout(vbox)
+        self.setLayout(QGridLayout())
+        # built on first show or first run, so opening the plugin does not import BaSiCPy
+        self._widgets = None
 
-        skip = [
-            "resize_mode",
-            "resize_params",
-            "working_size",
-            "fitting_mode",
-            "fitting_mode",
-            "get_darkfield",
-            "smoothness_flatfield",
-            "smoothness_darkfield",
-            "sparse_cost_darkfield",
-            "sort_intensity",
-            "device",
-        ]
-        self._settings = {k: self.build_widget(k) for k in BaSiC().settings.keys() if k not in skip}
+    @property
+    def _settings(self):
+        if self._widgets is None:
+            fields = _basic_model_fields()
+            self._widgets = {k: self.build_widget(k) for k in fields if k not in self.skip}
+
+            # sort settings into either simple or advanced settings containers
+            # _settings = {**{"device": ComboBox(choices=["cpu", "cuda"])}, **_settings}
+            vbox = self.layout()
+            for i, (k, v) in enumerate(self._widgets.items()):
+                vbox.addWidget(QLabel(k), i, 0, 1, 1)
+                vbox.addWidget(v.native, i, 1, 1, 1)
+        return self._widgets
 
-        # sort settings into either simple or advanced settings containers
-        # _settings = {**{"device": ComboBox(choices=["cpu", "cuda"])}, **_settings}
-        i = 0
-        for k, v in self._settings.items():
-            vbox.addWidget(QLabel(k), i, 0, 1, 1)
-            vbox.addWidget(v.native, i, 1, 1, 1)
-            i += 1
+    def showEvent(self, event: QEvent) -> None:  # noqa: D102
+        self._settings
+        super().showEvent(event)
 
     def build_widget(self, k):
-        field = BaSiC.model_fields[k]
+        field = _basic_model_fields()[k]
         description = field.description
         default = field.default
         annotation = field.annotation
@@ -244,6 +307,381 @@ class AutotuneSetting(QGroupBox):
         return widget
 
 
+class BackendSetting(QGroupBox):
+    """Compute backend: BaSiC device and thread limits, persisted between sessions."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setVisible(False)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        self.setStyleSheet("QGroupBox { " "border-radius: 10px}")
+        self.parent = parent
+
+        config = BackendConfig.load()
+
+        self.device_cb = QComboBox()
+        self.device_cb.addItems(DEVICES)
+        self.device_cb.setCurrentText(config.device)
+        self.device_cb.setToolTip("Device for BaSiC fits; 'auto' uses CUDA when available")
+
+        def thread_box(value, tooltip):
+            box = QSpinBox()
+            box.setRange(0, os.cpu_count() or 1024)
+            box.setSpecialValueText("default")
+            box.setValue(value)
+            box.setToolTip(tooltip)
+            return box
+
+        self.intra_op_sb = thread_box(config.intra_op_threads, "Threads torch uses within one operation")
+        self.inter_op_sb = thread_box(
+            config.inter_op_threads, "Threads torch uses across operations (fixed after the first run)"
+        )
+        self.blas_sb = thread_box(config.blas_threads, "Thread limit for NumPy/BLAS")
+
+        self.memory_sb = QDoubleSpinBox()
+        self.memory_sb.setRange(0, 65536)
+        self.memory_sb.setDecimals(1)
+        self.memory_sb.setSuffix(" GB")
+        self.memory_sb.setSpecialValueText("auto")
+        self.memory_sb.setValue(config.memory_budget_gb)
+        self.memory_sb.setToolTip(
+            "Memory a fit or transform may use; larger runs switch to out-of-core output, chunked transforms "
+            "or frame subsampling. 'auto' uses 75% of the memory available when the run starts"
+        )
+
+        self.save_btn = QPushButton("Save as default")
+        self.save_btn.clicked.connect(self._save)
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel("device"), 0, 0)
+        layout.addWidget(self.device_cb, 0, 1)
+        layout.addWidget(QLabel("intra-op threads"), 1, 0)
+        layout.addWidget(self.intra_op_sb, 1, 1)
+        layout.addWidget(QLabel("inter-op threads"), 2, 0)
+        layout.addWidget(self.inter_op_sb, 2, 1)
+        layout.addWidget(QLabel("BLAS threads"), 3, 0)
+        layout.addWidget(self.blas_sb, 3, 1)
+        layout.addWidget(QLabel("memory budget"), 4, 0)
+        layout.addWidget(self.memory_sb, 4, 1)
+        layout.addWidget(self.save_btn, 5, 0, 1, 2)
+        self.setLayout(layout)
+
+    def config(self) -> BackendConfig:
+        return BackendConfig(
+            device=self.device_cb.currentText(),
+            intra_op_threads=self.intra_op_sb.value(),
+            inter_op_threads=self.inter_op_sb.value(),
+            blas_threads=self.blas_sb.value(),
+            memory_budget_gb=self.memory_sb.value(),
+        )
+
+    def _save(self):
+        try:
+            path = self.config().save()
+        except OSError as e:
+            QMessageBox.critical(self, "Save failed", str(e))
+            return
+        show_info(f"Backend settings saved to {path}")
+
+    def memory_budget(self):
+        """Bytes a run may use, see `napari_basicpy._planner.memory_budget`."""
+        return memory_budget(self.memory_sb.value())
+
+    def apply(self, uses_basic: bool = True) -> dict:
+        """Apply the current settings and return the ``BaSiC`` keyword arguments they imply."""
+        config = self.config()
+        effective = config.apply(torch_backend=uses_basic)
+        logger.info("Compute backend: " + ", ".join(f"{k}={v}" for k, v in effective.items()))
+        return config.basic_settings() if uses_basic else {}
+
+
+class TileSetting(QGroupBox):
+    """Tile (mosaic) mode for whole-slide and stitched 2D images."""
+
+    def __init__(self, parent=None):
+        super().__init__("Tile mode (whole-slide / stitched 2D image)", parent)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        self.viewer = parent.viewer
+        self.parent = parent
+
+        layout = QGridLayout()
+        self.setLayout(layout)
+
+        self.checkbox_enabled = QCheckBox("Split image into tiles")
+        self.checkbox_enabled.setChecked(False)
+        self.lineedit_tile_size = QLineEdit("512")
+        self.lineedit_tile_size.setToolTip("Tile size in pixels, e.g. 512 or 512,640 (Y,X)")
+        self.lineedit_overlap = QLineEdit("0")
+        self.lineedit_overlap.setToolTip("Overlap between neighbouring tiles in pixels, e.g. 51 or 51,64 (Y,X)")
+        self.positions_select = ComboBox(choices=self.layers_points)
+        self.positions_select.native.setToolTip("Points layer with the top-left (y, x) corner of every tile")
+
+        label_tile_size = QLabel("tile size:")
+        label_tile_size.setFixedWidth(150)
+        label_overlap = QLabel("overlap:")
+        label_overlap.setFixedWidth(150)
+        label_positions = QLabel("stage positions:")
+        label_positions.setFixedWidth(150)
+
+        layout.addWidget(self.checkbox_enabled, 0, 0, 1, 2)
+        layout.addWidget(label_tile_size, 1, 0)
+        layout.addWidget(self.lineedit_tile_size, 1, 1)
+        layout.addWidget(label_overlap, 2, 0)
+        layout.addWidget(self.lineedit_overlap, 2, 1)
+        layout.addWidget(label_positions, 3, 0)
+        layout.addWidget(self.positions_select.native, 3, 1)
+
+        self.checkbox_enabled.toggled.connect(self._toggle)
+        self._toggle(False)
+
+    def _toggle(self, checked: bool):
+        for w in (self.lineedit_tile_size, self.lineedit_overlap, self.positions_select.native):
+            w.setEnabled(checked)
+
+    def layers_points(self, wdg) -> list:
+        return ["regular grid"] + [layer for layer in self.viewer.layers if isinstance(layer, Points)]
+
+    @property
+    def enabled(self) -> bool:
+        return self.checkbox_enabled.isChecked()
+
+    def grid(self, image_shape) -> Optional[TileGrid]:
+        """Tile grid for a plane of `image_shape`, or None when tile mode is off."""
+        if not self.enabled:
+            return None
+        tile_size = [int(v) for v in parse_filter_text(self.lineedit_tile_size.text())]
+        overlap = [int(v) for v in parse_filter_text(self.lineedit_overlap.text())] or [0]
+        tile_size = tile_size[0] if len(tile_size) == 1 else tile_size
+        overlap = overlap[0] if len(overlap) == 1 else overlap
+        if self.positions_select.value == "regular grid":
+            return TileGrid.regular(image_shape, tile_size, overlap)
+        positions = np.asarray(self.positions_select.value.data)[:, -2:]
+        return TileGrid.from_positions(image_shape, tile_size, positions)
+
+    def reset_choices(self, event=None):
+        self.positions_select.reset_choices(event)
+
+
+class JobPanel(QGroupBox):
+    """Queued fits, transforms and sequence runs with their progress, persisted between sessions."""
+
+    def __init__(self, parent=None, queue: Optional[JobQueue] = None):
+        super().__init__(parent)
+        self.setVisible(False)
+        self.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Maximum)
+        self.setStyleSheet("QGroupBox { " "border-radius: 10px}")
+        self.viewer = parent.viewer
+        self.parent = parent
+        self.queue = queue if queue is not None else JobQueue()
+        # job id -> running worker / progress bar of its row
+        self.workers = {}
+        self._bars = {}
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["job", "input", "progress"])
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.horizontalHeader().setStretchLastSection(True)
+        self.table.verticalHeader().setVisible(False)
+
+        self.concurrency_sb = QSpinBox()
+        self.concurrency_sb.setRange(1, max(1, os.cpu_count() or 1))
+        self.concurrency_sb.setValue(self.queue.max_concurrent)
+        self.concurrency_sb.setToolTip("Jobs that run at the same time; each one holds its input in memory")
+        self.concurrency_sb.valueChanged.connect(self._set_concurrency)
+
+        self.run_btn = QPushButton()
+        self.run_btn.setCheckable(True)
+        # jobs left from an earlier session wait for Start, so that their layers can be opened first
+        self.run_btn.setChecked(not any(job.status == "queued" for job in self.queue))
+        self.run_btn.toggled.connect(self._toggle_running)
+        self.cancel_btn = QPushButton("Cancel job")
+        self.cancel_btn.clicked.connect(self._cancel_selected)
+        self.retry_btn = QPushButton("Retry")
+        self.retry_btn.clicked.connect(self._retry_selected)
+        self.remove_btn = QPushButton("Remove")
+        self.remove_btn.clicked.connect(self._remove_selected)
+        self.clear_btn = QPushButton("Clear finished")
+        self.clear_btn.clicked.connect(self._clear_finished)
+
+        layout = QGridLayout()
+        layout.addWidget(QLabel("concurrent jobs"), 0, 0)
+        layout.addWidget(self.concurrency_sb, 0, 1)
+        layout.addWidget(self.table, 1, 0, 1, 2)
+        layout.addWidget(self.run_btn, 2, 0)
+        layout.addWidget(self.cancel_btn, 2, 1)
+        layout.addWidget(self.retry_btn, 3, 0)
+        layout.addWidget(self.remove_btn, 3, 1)
+        layout.addWidget(self.clear_btn, 4, 0, 1, 2)
+        self.setLayout(layout)
+
+        self._toggle_running(self.run_btn.isChecked())
+
+    @property
+    def running(self) -> bool:
+        return self.run_btn.isChecked()
+
+    def add(self, kind, label, params, arrays=None):
+        """Queue a job (see `JobQueue.add`) and start it if there is a free slot."""
+        job = self.queue.add(kind, label, params, arrays)
+        logger.info(f"Queued {kind} job {job.id}: {label}")
+        self.pump()
+        return job
+
+    def pump(self):
+        """Start queued jobs while the queue runs and fewer than the configured number are running."""
+        while self.running:
+            job = self.queue.next_ready()
+            if job is None:
+                break
+            self._start(job)
+        self._refresh()
+
+    def _input_data(self, job):
+        # layer inputs are read from the viewer when the job starts; None lets the job read the layer's file
+        data = weight = None
+        name = job.params.get("layer")
+        if name and name in self.viewer.layers:
+            data = self.viewer.layers[name].data
+        weight_name = job.params.get("weight")
+        if weight_name:
+            if weight_name not in self.viewer.layers:
+                raise ValueError(f"Segmentation mask layer {weight_name!r} is not open")
+            weight = np.asarray(self.viewer.layers[weight_name].data)
+            if job.params.get("inverse_weight"):
+                weight = 1 - (weight > 0)
+        return data, weight
+
+    def _start(self, job):
+        self.queue.mark_running(job)
+        try:
+            data, weight = self._input_data(job)
+        except ValueError as e:
+            self.queue.mark_finished(job, "failed", error=str(e))
+            return None
+
+        directory = job.params.get("out_folder") or None
+        report = RunReport(
+            job.kind,
+            settings={"job": job.id, **{k: v for k, v in job.params.items() if k != "arrays"}},
+            inputs={"images": fingerprint_array(data)} if data is not None else {},
+        )
+
+        def on_progress(state):
+            self.queue.set_progress(job, *state)
+            self._show_progress(job)
+
+        def on_done(result):
+            for name, arr in result.layers.items():
+                self.viewer.add_image(arr, name=f"{job.label} {name}")
+            report_path = self.parent._finish_report(report, directory=directory, **result.outputs)
+            self.queue.mark_finished(job, "done", report=report_path, **result.outputs)
+
+        def on_error(e):
+            report_path = self.parent._finish_report(report, "failed", directory, error=repr(e))
+            self.queue.mark_finished(job, "failed", error=str(e), report=report_path)
+
+        def on_aborted():
+            report_path = self.parent._finish_report(report, "cancelled", directory)
+            self.queue.mark_finished(job, "cancelled", report=report_path)
+
+        def on_finished():
+            self.workers.pop(job.id, None)
+            self.pump()
+
+        @thread_worker(
+            start_thread=False,
+            connect={
+                "yielded": on_progress,
+                "returned": on_done,
+                "errored": on_error,
+                "aborted": on_aborted,
+                "finished": on_finished,
+            },
+        )
+        def call_job():
+            return (yield from run_job(job, self.queue, data, weight, report))
+
+        worker = call_job()
+        self.workers[job.id] = worker
+        worker.start()
+        return worker
+
+    def _selected(self) -> list:
+        jobs = list(self.queue)
+        rows = sorted({index.row() for index in self.table.selectedIndexes()})
+        return [jobs[r] for r in rows if r < len(jobs)]
+
+    def _cancel_selected(self):
+        for job in self._selected():
+            if job.id in self.workers:
+                # stops between batches; a layer fit or transform finishes its current step first
+                self.workers[job.id].quit()
+            elif job.status == "queued":
+                self.queue.mark_finished(job, "cancelled")
+        self._refresh()
+
+    def _retry_selected(self):
+        for job in self._selected():
+            if job.status in ("failed", "cancelled"):
+                self.queue.retry(job.id)
+        self.pump()
+
+    def _remove_selected(self):
+        for job in self._selected():
+            if job.status == "running":
+                QMessageBox.warning(self, "Job queue", f"{job.label} is running; cancel it first.")
+                continue
+            self.queue.remove(job.id)
+        self._refresh()
+
+    def _clear_finished(self):
+        self.queue.clear_finished()
+        self._refresh()
+
+    def _set_concurrency(self, value: int):
+        self.queue.set_max_concurrent(value)
+        self.pump()
+
+    def _toggle_running(self, checked: bool):
+        self.run_btn.setText("Pause queue" if checked else "Start queue")
+        if checked:
+            self.pump()
+        else:
+            # running jobs finish; nothing new starts
+            self._refresh()
+
+    def _show_progress(self, job):
+        bar = self._bars.get(job.id)
+        if bar is None:
+            return
+        if job.status == "running" and not job.total:
+            bar.setRange(0, 0)  # busy
+        else:
+            bar.setRange(0, max(1, job.total))
+            bar.setValue(job.total if job.status == "done" else job.done)
+        bar.setFormat(job.status_text())
+        bar.setToolTip(job.error or job.outputs.get("report") or "")
+
+    def _refresh(self):
+        jobs = list(self.queue)
+        self.table.setRowCount(len(jobs))
+        self._bars = {}
+        for row, job in enumerate(jobs):
+            source = job.params.get("folder") or job.params.get("layer") or ""
+            self.table.setItem(row, 0, QTableWidgetItem(f"{job.kind}: {job.label}"))
+            self.table.setItem(row, 1, QTableWidgetItem(source))
+            bar = QProgressBar()
+            bar.setTextVisible(True)
+            self.table.setCellWidget(row, 2, bar)
+            self._bars[job.id] = bar
+            self._show_progress(job)
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        self.setTitle(", ".join(f"{n} {status}" for status, n in counts.items()) or "No jobs")
+
+
 class SequenceDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -252,8 +690,33 @@ class SequenceDialog(QDialog):
 
         self.folder_le = QLineEdit(self)
         self.filter_le = QLineEdit(self)
+        self.pattern_le = QLineEdit(self)
+        self.pattern_le.setPlaceholderText("e.g. *.tif")
+        self.regex_cb = QCheckBox("Regex", self)
+        self.recursive_cb = QCheckBox("Include subfolders", self)
+        self.watch_cb = QCheckBox("Watch for new files (runs until Cancel)", self)
+        self.watch_cb.setToolTip(
+            "Keep polling the folder and correct files as soon as they are completely written.\n"
+            "Processed files are remembered in the output folder, so a restarted watch resumes."
+        )
+        self.routes_le = QLineEdit(self)
+        self.routes_le.setPlaceholderText("e.g. w1DAPI=dapi.npz, w2GFP=gfp.npz")
+        self.routes_le.setToolTip(
+            "Correct interleaved channels in one pass: each file goes to the model of the first matching\n"
+            "pattern (substring, or glob with wildcards). Models are loaded DCT models or flatfield layers,\n"
+            "by name. Files matching no pattern are skipped. Leave empty to use the selected profiles."
+        )
         self.out_folder_le = QLineEdit(self)
 
+        self.dtype_cb = QComboBox(self)
+        self.dtype_cb.addItems(SAVE_DTYPES)
+        self.mode_cb = QComboBox(self)
+        self.mode_cb.addItems(SCALING_MODES)
+        if hasattr(parent, "_last_save_dtype"):
+            self.dtype_cb.setCurrentText(parent._last_save_dtype)
+        if hasattr(parent, "_last_save_mode"):
+            self.mode_cb.setCurrentText(parent._last_save_mode)
+
         browse_btn = QPushButton("Browse", self)  # input folder
         browse_out_btn = QPushButton("Browse", self)  # output folder
         ok_btn = QPushButton("OK", self)
@@ -267,12 +730,27 @@ class SequenceDialog(QDialog):
         layout.addWidget(QLabel("Filter (comma-separated):"), 1, 0)
         layout.addWidget(self.filter_le, 1, 1, 1, 2)
 
-        layout.addWidget(QLabel("Output folder:"), 2, 0)
-        layout.addWidget(self.out_folder_le, 2, 1)
-        layout.addWidget(browse_out_btn, 2, 2)
+        layout.addWidget(QLabel("Pattern (glob/regex):"), 2, 0)
+        layout.addWidget(self.pattern_le, 2, 1)
+        layout.addWidget(self.regex_cb, 2, 2)
+        layout.addWidget(self.recursive_cb, 3, 1, 1, 2)
+
+        layout.addWidget(QLabel("Channel routes:"), 4, 0)
+        layout.addWidget(self.routes_le, 4, 1, 1, 2)
+
+        layout.addWidget(QLabel("Output folder:"), 5, 0)
+        layout.addWidget(self.out_folder_le, 5, 1)
+        layout.addWidget(browse_out_btn, 5, 2)
 
-        layout.addWidget(ok_btn, 3, 1)
-        layout.addWidget(cancel_btn, 3, 2)
+        layout.addWidget(QLabel("Save dtype:"), 6, 0)
+        layout.addWidget(self.dtype_cb, 6, 1, 1, 2)
+        layout.addWidget(QLabel("Scaling:"), 7, 0)
+        layout.addWidget(self.mode_cb, 7, 1, 1, 2)
+
+        layout.addWidget(self.watch_cb, 8, 1, 1, 2)
+
+        layout.addWidget(ok_btn, 9, 1)
+        layout.addWidget(cancel_btn, 9, 2)
 
         browse_btn.clicked.connect(self._browse)
         browse_out_btn.clicked.connect(self._browse_out)
@@ -301,17 +779,37 @@ class SequenceDialog(QDialog):
     def filters_tokens(self) -> list[str]:
         return parse_filter_text(self.filter_le.text())
 
+    @property
+    def pattern(self) -> str:
+        return self.pattern_le.text().strip()
+
+    @property
+    def use_regex(self) -> bool:
+        return self.regex_cb.isChecked()
+
+    @property
+    def recursive(self) -> bool:
+        return self.recursive_cb.isChecked()
+
+    @property
+    def watch(self) -> bool:
+        return self.watch_cb.isChecked()
+
+    @property
+    def routes(self) -> list[tuple[str, str]]:
+        return parse_routes(self.routes_le.text())
+
     @property
     def out_folder(self) -> str:
         return self.out_folder_le.text().strip()
 
+    @property
+    def dtype(self) -> str:
+        return self.dtype_cb.currentText()
 
-def parse_filter_text(s: str) -> list[str]:
-    if s is None:
-        return []
-    s = s.replace(", ", ",")
-    tokens = [t.strip() for t in s.split(",") if t.strip()]
-    return tokens
+    @property
+    def mode(self) -> str:
+        return self.mode_cb.currentText()
 
 
 class SaveOptionsDialog(QDialog):
@@ -322,15 +820,10 @@ class SaveOptionsDialog(QDialog):
         layout = QGridLayout(self)
 
         self.dtype_cb = QComboBox(self)
-        self.dtype_cb.addItems(["float32", "uint16", "uint8"])
+        self.dtype_cb.addItems(SAVE_DTYPES)
 
         self.mode_cb = QComboBox(self)
-        self.mode_cb.addItems(
-            [
-                "preserve (no clip, auto-rescale if out-of-range)",
-                "rescale to full range",
-            ]
-        )
+        self.mode_cb.addItems(SCALING_MODES)
 
         layout.addWidget(QLabel("Save dtype:"), 0, 0)
         layout.addWidget(self.dtype_cb, 0, 1)
@@ -358,6 +851,72 @@ class SaveOptionsDialog(QDialog):
         return self.mode_cb.currentText()
 
 
+class SweepResultsDialog(QDialog):
+    """Scores of a smoothness sweep; selecting a row shows its profile, "Use selected" copies its values."""
+
+    COLUMNS = ["smoothness_flatfield", "smoothness_darkfield", "cost", "entropy", "fourier_l0", "converged", "seconds"]
+
+    def __init__(self, result, parent=None, layer=None):
+        super().__init__(parent)
+        self.setWindowTitle("Smoothness sweep")
+        self.setModal(False)
+        self.result = result
+        self.parent = parent
+        self.layer = layer
+
+        self.table = QTableWidget(len(result), len(self.COLUMNS), self)
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        for i, row in enumerate(result.rows):
+            for j, key in enumerate(self.COLUMNS):
+                value = row[key]
+                text = "" if value is None else (f"{value:.5g}" if isinstance(value, float) else str(value))
+                self.table.setItem(i, j, QTableWidgetItem(text))
+        self.table.resizeColumnsToContents()
+        self.table.itemSelectionChanged.connect(self._show_selected)
+
+        self.use_btn = QPushButton("Use selected", self)
+        self.use_btn.clicked.connect(self._use_selected)
+        self.save_btn = QPushButton("Save table", self)
+        self.save_btn.clicked.connect(self._save)
+
+        layout = QGridLayout(self)
+        layout.addWidget(QLabel("Lower cost is better (autotune's entropy + flatfield roughness)."), 0, 0, 1, 2)
+        layout.addWidget(self.table, 1, 0, 1, 2)
+        layout.addWidget(self.use_btn, 2, 0)
+        layout.addWidget(self.save_btn, 2, 1)
+        self.resize(720, 320)
+        self.table.selectRow(result.best)
+
+    def selected(self) -> int:
+        rows = {index.row() for index in self.table.selectedIndexes()}
+        return min(rows) if rows else self.result.best
+
+    def _show_selected(self):
+        if self.layer is None or self.layer not in self.parent.viewer.layers:
+            return
+        # the candidates are the first axis of the stacked profile layer; layers are right-aligned in the viewer's dims
+        viewer = self.parent.viewer
+        step = list(viewer.dims.current_step)
+        step[viewer.dims.ndim - self.layer.ndim] = self.selected()
+        viewer.dims.current_step = tuple(step)
+
+    def _use_selected(self):
+        row = self.result.rows[self.selected()]
+        self.parent.lineedit_smoothness_flatfield.setText(str(row["smoothness_flatfield"]))
+        if row["smoothness_darkfield"] is not None and self.parent.lineedit_smoothness_darkfield.isEnabled():
+            self.parent.lineedit_smoothness_darkfield.setText(str(row["smoothness_darkfield"]))
+        show_info("Smoothness set from the sweep; Run reuses the swept fit")
+
+    def _save(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save sweep table", "smoothness_sweep.csv", "CSV (*.csv)")
+        if path:
+            self.result.to_csv(path)
+            show_info(f"Saved {path}")
+
+
 class BasicWidget(QWidget):
     """Example widget class."""
 
@@ -366,6 +925,13 @@ class BasicWidget(QWidget):
         super().__init__()
 
         self.viewer = viewer
+        # running model for incremental fits, see _run_incremental_fit
+        self.incremental = None
+        # working-size stack and results of the last fit input, for quick refits
+        self.fit_cache = FitCache()
+        # reduced copy of the fit input for preview fits; dropped when another layer is selected
+        self.preview_fit = PreviewFit()
+        self._preview_worker = None
 
         # Define builder functions
         widget = QWidget()
@@ -427,12 +993,21 @@ class BasicWidget(QWidget):
         self.btn_transform.setStyleSheet("""QPushButton{background:green;border-radius:5px;}""")
         self.btn_transform.setFixedWidth(400)
 
+        self.job_panel = JobPanel(self)
+        self.btn_jobs = QPushButton("Job queue")
+        self.btn_jobs.setCheckable(True)
+        self.btn_jobs.clicked.connect(self.toggle_jobs)
+        self.btn_jobs.setStyleSheet("""QPushButton{background:green;border-radius:5px;}""")
+        self.btn_jobs.setFixedWidth(400)
+
         main_layout.addWidget(header_container, 0, 0, 1, 2)
         main_layout.addWidget(self.btn_fit, 1, 0)
         main_layout.addWidget(self.fit_widget, 2, 0)
         main_layout.addWidget(self.btn_transform, 3, 0)
         main_layout.addWidget(self.transform_widget, 4, 0)
-        main_layout.addWidget(doc_reference_lbl, 6, 0)
+        main_layout.addWidget(self.btn_jobs, 5, 0)
+        main_layout.addWidget(self.job_panel, 6, 0)
+        main_layout.addWidget(doc_reference_lbl, 7, 0)
 
         main_layout.setAlignment(Qt.AlignTop)
 
@@ -448,6 +1023,8 @@ class BasicWidget(QWidget):
         self.run_transform_btn.clicked.connect(self._run_transform)
         self.save_fit_btn.clicked.connect(self._save_fit)
         self.save_transform_btn.clicked.connect(self._save_transform)
+        self.queue_fit_btn.clicked.connect(self._queue_fit)
+        self.queue_transform_btn.clicked.connect(self._queue_transform)
 
     def build_transform_widget_container(self):
         settings_container = QGroupBox("Parameters")  # make groupbox
@@ -457,24 +1034,73 @@ class BasicWidget(QWidget):
         self.checkbox_is_timelapse_transform = QCheckBox()
         self.checkbox_is_timelapse_transform.setChecked(False)
 
+        label_metrics = QLabel("QC metrics:")
+        label_metrics.setFixedWidth(150)
+        self.checkbox_metrics = QCheckBox()
+        self.checkbox_metrics.setChecked(False)
+        self.checkbox_metrics.setToolTip(
+            "Record per-frame mean, CV, vignetting and low-frequency energy before and after correction. "
+            "Sequence runs write the table into the output folder, layers into the reports folder."
+        )
+        self.metrics_format_cb = QComboBox()
+        self.metrics_format_cb.addItems(METRICS_FORMATS)
+        self.metrics_format_cb.setToolTip("Table format; parquet needs the 'pyarrow' package")
+
         settings_layout.addWidget(label_timelapse, 0, 0)
         settings_layout.addWidget(self.checkbox_is_timelapse_transform, 0, 1)
+        settings_layout.addWidget(label_metrics, 1, 0)
+        settings_layout.addWidget(self.checkbox_metrics, 1, 1)
+        settings_layout.addWidget(self.metrics_format_cb, 1, 2)
+
+        label_output = QLabel("Output:")
+        label_output.setFixedWidth(150)
+        self.output_cb = QComboBox()
+        self.output_cb.addItems(OUTPUTS)
+        self.output_cb.setToolTip(
+            "Where the corrected layer's data lives: a new array in memory, a temporary memory-mapped file "
+            "or a temporary Zarr store (needs the 'zarr' package). Disk-backed outputs keep memory use at "
+            "the input plus one frame"
+        )
+        settings_layout.addWidget(label_output, 2, 0)
+        settings_layout.addWidget(self.output_cb, 2, 1, 1, 2)
+
+        label_live = QLabel("Live preview:")
+        label_live.setFixedWidth(150)
+        self.checkbox_live_preview = QCheckBox()
+        self.checkbox_live_preview.setChecked(True)
+        self.checkbox_live_preview.setToolTip(
+            "During sequence runs, show the most recently corrected frames in a 'corrected_live' layer, "
+            "taken from memory as they are corrected and refreshed at most twice a second"
+        )
+        self.live_frames_sb = QSpinBox()
+        self.live_frames_sb.setRange(1, 256)
+        self.live_frames_sb.setValue(16)
+        self.live_frames_sb.setSuffix(" frames")
+        self.live_frames_sb.setToolTip("Number of recent frames kept for the live preview")
+        settings_layout.addWidget(label_live, 3, 0)
+        settings_layout.addWidget(self.checkbox_live_preview, 3, 1)
+        settings_layout.addWidget(self.live_frames_sb, 3, 2)
 
         settings_layout.setAlignment(Qt.AlignTop)
         settings_container.setLayout(settings_layout)
 
         inputs_container = self.build_transform_inputs_containers()
+        self.tile_settings_transform = TileSetting(self)
 
         self.run_transform_btn = QPushButton("Run")
         self.cancel_transform_btn = QPushButton("Cancel")
         self.save_transform_btn = QPushButton("Save")
+        self.queue_transform_btn = QPushButton("Add to queue")
+        self.queue_transform_btn.setToolTip("Run later from the job queue, with the current profiles and settings")
 
         transform_layout = QGridLayout()
         transform_layout.addWidget(inputs_container, 0, 0, 1, 2)
         transform_layout.addWidget(settings_container, 1, 0, 1, 2)
-        transform_layout.addWidget(self.run_transform_btn, 2, 0, 1, 1)
-        transform_layout.addWidget(self.cancel_transform_btn, 2, 1, 1, 1)
-        transform_layout.addWidget(self.save_transform_btn, 3, 0, 1, 2)
+        transform_layout.addWidget(self.tile_settings_transform, 2, 0, 1, 2)
+        transform_layout.addWidget(self.run_transform_btn, 3, 0, 1, 1)
+        transform_layout.addWidget(self.cancel_transform_btn, 3, 1, 1, 1)
+        transform_layout.addWidget(self.save_transform_btn, 4, 0, 1, 2)
+        transform_layout.addWidget(self.queue_transform_btn, 5, 0, 1, 2)
         transform_layout.setAlignment(Qt.AlignTop)
 
         transform_widget = QWidget()
@@ -487,6 +1113,7 @@ class BasicWidget(QWidget):
 
         settings_container = self.build_settings_containers()
         inputs_container = self.build_inputs_containers()
+        self.tile_settings_fit = TileSetting(self)
 
         advanced_parameters = QGroupBox("Advanced parameters")
         advanced_parameters_layout = QGridLayout()
@@ -510,17 +1137,40 @@ class BasicWidget(QWidget):
         advanced_parameters_layout.addWidget(self.btn_autotune_settings)
         advanced_parameters_layout.addWidget(self.autotune_settings)
 
+        # compute backend (also used by "Apply BaSiCPy")
+        self.backend_settings = BackendSetting(self)
+        self.btn_backend_settings = QPushButton("Compute backend")
+        self.btn_backend_settings.setCheckable(True)
+        self.btn_backend_settings.clicked.connect(self.toggle_backend_settings)
+        advanced_parameters_layout.addWidget(self.btn_backend_settings)
+        advanced_parameters_layout.addWidget(self.backend_settings)
+
+        self.preview_fit_btn = QPushButton("Preview (fast, low resolution)")
+        self.preview_fit_btn.setToolTip(
+            "Fit on a few frames at low resolution and show the flatfield at once;\n"
+            "while the preview is shown, editing a smoothness value previews again"
+        )
+        self.preview_fit_btn.clicked.connect(self._run_preview)
         self.run_fit_btn = QPushButton("Run")
         self.cancel_fit_btn = QPushButton("Cancel")
         self.save_fit_btn = QPushButton("Save")
+        self.save_model_btn = QPushButton("Save model (DCT coefficients)")
+        self.save_model_btn.setToolTip("Save flatfield/darkfield as a few kB of low-frequency DCT coefficients")
+        self.save_model_btn.clicked.connect(self._save_model)
+        self.queue_fit_btn = QPushButton("Add to queue")
+        self.queue_fit_btn.setToolTip("Run later from the job queue, with the current settings")
 
         fit_layout = QGridLayout()
         fit_layout.addWidget(inputs_container, 0, 0, 1, 2)
         fit_layout.addWidget(settings_container, 1, 0, 1, 2)
-        fit_layout.addWidget(advanced_parameters, 2, 0, 1, 2)
-        fit_layout.addWidget(self.run_fit_btn, 3, 0, 1, 1)
-        fit_layout.addWidget(self.cancel_fit_btn, 3, 1, 1, 1)
-        fit_layout.addWidget(self.save_fit_btn, 4, 0, 1, 2)
+        fit_layout.addWidget(self.tile_settings_fit, 2, 0, 1, 2)
+        fit_layout.addWidget(advanced_parameters, 3, 0, 1, 2)
+        fit_layout.addWidget(self.preview_fit_btn, 4, 0, 1, 2)
+        fit_layout.addWidget(self.run_fit_btn, 5, 0, 1, 1)
+        fit_layout.addWidget(self.cancel_fit_btn, 5, 1, 1, 1)
+        fit_layout.addWidget(self.save_fit_btn, 6, 0, 1, 2)
+        fit_layout.addWidget(self.save_model_btn, 7, 0, 1, 2)
+        fit_layout.addWidget(self.queue_fit_btn, 8, 0, 1, 2)
         fit_layout.setAlignment(Qt.AlignTop)
         fit_widget = QWidget()
         fit_widget.setLayout(fit_layout)
@@ -540,6 +1190,11 @@ class BasicWidget(QWidget):
         label_weight = QLabel("Segmentation mask:")
         label_weight.setFixedWidth(150)
 
+        self.dct_models = {}
+        self.load_model_btn = QPushButton("Load DCT model…")
+        self.load_model_btn.setToolTip("Use a saved BaSiCPy DCT model (.npz) as flatfield/darkfield at any image size")
+        self.load_model_btn.clicked.connect(self._load_model)
+
         self.transform_image_select = ComboBox(choices=self.layers_image_transform)
         self.transform_image_select.changed.connect(self._on_transform_image_changed)
 
@@ -565,33 +1220,20 @@ class BasicWidget(QWidget):
         gb_layout.addWidget(self.fit_weight_select.native, 3, 1, 1, 1)
         gb_layout.addWidget(self.inverse_cb_transform, 3, 2, 1, 1)
         gb_layout.addWidget(note, 4, 1, 1, 2)
+        gb_layout.addWidget(self.load_model_btn, 5, 1, 1, 2)
 
         gb_layout.setAlignment(Qt.AlignTop)
         input_gb.setLayout(gb_layout)
 
         return input_gb
 
-    def _fast_count_files(self, folder: str, tokens: list[str], hard_limit: int = 1_000_000):
-        """尽量快地统计匹配个数；用 scandir 并可提前停止。"""
-        cnt = 0
-        try:
-            with os.scandir(folder) as it:
-                for e in it:
-                    if not e.is_file():
-                        continue
-                    name = e.name
-                    ok = True
-                    for t in tokens or []:
-                        if t and t not in name:
-                            ok = False
-                            break
-                    if ok:
-                        cnt += 1
-                        if cnt >= hard_limit:  # 防止极端目录把统计时间拖太久
-                            break
-        except Exception:
-            logger.exception("fast count failed")
-        return cnt
+    def _sequence_index_kwargs(self) -> dict:
+        return dict(
+            tokens=getattr(self, "transform_sequence_filters", []) or [],
+            pattern=getattr(self, "transform_sequence_pattern", "") or None,
+            use_regex=getattr(self, "transform_sequence_regex", False),
+            recursive=getattr(self, "transform_sequence_recursive", False),
+        )
 
     def _on_transform_image_changed(self, value):
         if value == SEQ_SENTINEL:
@@ -599,7 +1241,20 @@ class BasicWidget(QWidget):
             if dlg.exec_() == QDialog.Accepted:
                 self.transform_sequence_folder = dlg.folder
                 self.transform_sequence_filters = dlg.filters_tokens
+                self.transform_sequence_pattern = dlg.pattern
+                self.transform_sequence_regex = dlg.use_regex
+                self.transform_sequence_recursive = dlg.recursive
+                self.transform_sequence_watch = dlg.watch
                 self.transform_sequence_out_folder = dlg.out_folder
+                self.transform_sequence_dtype = dlg.dtype
+                self.transform_sequence_mode = dlg.mode
+                try:
+                    self.transform_sequence_routes = dlg.routes
+                except ValueError as e:
+                    QMessageBox.warning(self, "Invalid channel routes", str(e))
+                    self.transform_sequence_routes = []
+                self._last_save_dtype = dlg.dtype
+                self._last_save_mode = dlg.mode
 
                 if not self.transform_sequence_folder:
                     QMessageBox.warning(self, "No folder", "Please choose a source folder.")
@@ -630,18 +1285,23 @@ class BasicWidget(QWidget):
 
                         @thread_worker(start_thread=True)  # 关键：自动启动
                         def _count_worker():
-                            return self._fast_count_files(
+                            # list + probe headers once; the result is cached for _run_transform
+                            return index_sequence(
                                 self.transform_sequence_folder,
-                                self.transform_sequence_filters,
+                                **self._sequence_index_kwargs(),
                             )
 
-                        def _on_done(n):
+                        def _on_done(index):
                             self._count_worker_running = False
-                            show_info(
-                                f"Matched files: {n}\n"
+                            msg = (
+                                f"Matched files: {len(index)} ({index.summary()})\n"
                                 f"Source: {self.transform_sequence_folder}\n"
                                 f"Output: {self.transform_sequence_out_folder}"
                             )
+                            if index.is_homogeneous:
+                                show_info(msg)
+                            else:
+                                show_warning(msg + "\nFiles differ in shape/dtype; the transform will refuse to run.")
 
                         def _on_err(e=None):
                             self._count_worker_running = False
@@ -658,16 +1318,6 @@ class BasicWidget(QWidget):
             except Exception:
                 pass
 
-    def _natural_key(self, s: str):
-        return [int(t) if t.isdigit() else t.lower() for t in re.split(r"(\d+)", s)]
-
-    def _list_sequence_files(self, folder: str, tokens: list[str]) -> list[str]:
-        names = [f for f in os.listdir(folder) if os.path.isfile(os.path.join(folder, f))]
-        for t in tokens or []:
-            names = [n for n in names if t in n]
-        names.sort(key=self._natural_key)
-        return [os.path.join(folder, n) for n in names]
-
     def _iter_chunks(self, seq: list, size: int):
         for i in range(0, len(seq), size):
             yield seq[i : i + size]
@@ -690,6 +1340,20 @@ class BasicWidget(QWidget):
 
         self.fit_image_select = ComboBox(choices=self.layers_image_fit)
         self.weight_select = ComboBox(choices=self.layers_weight)
+        self.fit_image_select.changed.connect(lambda value: self.preview_fit.invalidate())
+
+        label_roi = QLabel("ROI:")
+        label_roi.setFixedWidth(150)
+        self.roi_select = ComboBox(choices=self.layers_roi)
+        self.roi_select.native.setToolTip(
+            "Fit only the bounding box of the shapes in this layer (only that region is read);\n"
+            "the profiles are extended to the full frame as chosen on the right"
+        )
+        self.roi_fill_cb = QComboBox()
+        self.roi_fill_cb.addItems(ROI_FILLS)
+        self.roi_fill_cb.setToolTip(
+            "Outside the ROI: edge = extend the border values, neutral = no correction, nan = undefined"
+        )
 
         gb_layout.addWidget(label_image, 0, 0, 1, 1)
         gb_layout.addWidget(self.fit_image_select.native, 0, 1, 1, 2)
@@ -697,6 +1361,9 @@ class BasicWidget(QWidget):
         gb_layout.addWidget(self.weight_select.native, 1, 1, 1, 1)  # 之前是 (1,1,1,2)
         gb_layout.addWidget(self.inverse_cb, 1, 2, 1, 1)
         gb_layout.addWidget(note, 2, 1, 1, 2)
+        gb_layout.addWidget(label_roi, 3, 0, 1, 1)
+        gb_layout.addWidget(self.roi_select.native, 3, 1, 1, 1)
+        gb_layout.addWidget(self.roi_fill_cb, 3, 2, 1, 1)
 
         gb_layout.setAlignment(Qt.AlignTop)
         input_gb.setLayout(gb_layout)
@@ -712,18 +1379,24 @@ class BasicWidget(QWidget):
         label_sorting = QLabel("sort_intensity:")
         label_smoothness_flatfield = QLabel("smoothness_flatfield:")
         label_smoothness_darkfield = QLabel("smoothness_darkfield:")
+        label_incremental = QLabel("incremental:")
+        label_screen = QLabel("screen frames:")
+        label_screen.setFixedWidth(150)
 
         label_get_darkfield.setFixedWidth(150)
         label_timelapse.setFixedWidth(150)
         label_sorting.setFixedWidth(150)
         label_smoothness_flatfield.setFixedWidth(150)
         label_smoothness_darkfield.setFixedWidth(150)
+        label_incremental.setFixedWidth(150)
 
         self.lineedit_smoothness_flatfield = QLineEdit()
         self.lineedit_smoothness_darkfield = QLineEdit()
         self.lineedit_smoothness_darkfield.setEnabled(False)
         self.lineedit_smoothness_darkfield.setText("Not available")
         self.lineedit_smoothness_flatfield.setText("")
+        self.lineedit_smoothness_flatfield.editingFinished.connect(self._auto_preview)
+        self.lineedit_smoothness_darkfield.editingFinished.connect(self._auto_preview)
 
         self.autotune_btn = QPushButton("autotune")
         self.autotune_btn.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Expanding)
@@ -734,6 +1407,45 @@ class BasicWidget(QWidget):
         self.checkbox_is_timelapse.setChecked(False)
         self.checkbox_sorting = QCheckBox()
         self.checkbox_sorting.setChecked(False)
+        self.checkbox_incremental = QCheckBox()
+        self.checkbox_incremental.setChecked(False)
+        self.checkbox_incremental.setToolTip(
+            "Add the selected images to the running model and refresh flatfield/darkfield,\n"
+            "instead of fitting from scratch. Cost per update stays constant."
+        )
+        self.reset_incremental_btn = QPushButton("Reset model")
+        self.reset_incremental_btn.setToolTip("Forget all frames added to the incremental model")
+        self.reset_incremental_btn.clicked.connect(self._reset_incremental)
+        self.checkbox_screen = QCheckBox()
+        self.checkbox_screen.setChecked(False)
+        self.checkbox_screen.setToolTip(
+            "Before fitting, leave out blank, overly bright, saturated and out-of-focus frames.\n"
+            "Frames are skipped by index (nothing is copied) and listed in the run report."
+        )
+        self.screen_z_sb = QDoubleSpinBox()
+        self.screen_z_sb.setRange(2.0, 20.0)
+        self.screen_z_sb.setSingleStep(0.5)
+        self.screen_z_sb.setValue(4.0)
+        self.screen_z_sb.setPrefix("z > ")
+        self.screen_z_sb.setToolTip("Robust z-score of a frame's mean or focus beyond which it is an outlier")
+
+        label_sweep_flatfield = QLabel("sweep flatfield:")
+        label_sweep_darkfield = QLabel("sweep darkfield:")
+        label_sweep_flatfield.setFixedWidth(150)
+        label_sweep_darkfield.setFixedWidth(150)
+        self.lineedit_sweep_flatfield = QLineEdit()
+        self.lineedit_sweep_flatfield.setPlaceholderText("e.g. 0.5, 1, 2  or  0.1:10:7 (log-spaced)")
+        self.lineedit_sweep_flatfield.setToolTip(
+            "smoothness_flatfield values to fit side by side; the stack is resized to working size once"
+        )
+        self.lineedit_sweep_darkfield = QLineEdit()
+        self.lineedit_sweep_darkfield.setPlaceholderText("optional, with get_darkfield")
+        self.lineedit_sweep_darkfield.setToolTip(
+            "smoothness_darkfield values, combined with every flatfield value; empty uses smoothness_darkfield"
+        )
+        self.sweep_btn = QPushButton("sweep")
+        self.sweep_btn.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Expanding)
+        self.sweep_btn.clicked.connect(self._run_sweep)
 
         gb_layout.addWidget(label_get_darkfield, 0, 0)
         gb_layout.addWidget(self.checkbox_get_darkfield, 0, 1)
@@ -746,6 +1458,17 @@ class BasicWidget(QWidget):
         gb_layout.addWidget(label_smoothness_darkfield, 4, 0, 1, 1)
         gb_layout.addWidget(self.lineedit_smoothness_darkfield, 4, 1, 1, 1)
         gb_layout.addWidget(self.autotune_btn, 3, 2, 2, 1)
+        gb_layout.addWidget(label_incremental, 5, 0)
+        gb_layout.addWidget(self.checkbox_incremental, 5, 1)
+        gb_layout.addWidget(self.reset_incremental_btn, 5, 2)
+        gb_layout.addWidget(label_sweep_flatfield, 6, 0)
+        gb_layout.addWidget(self.lineedit_sweep_flatfield, 6, 1)
+        gb_layout.addWidget(label_sweep_darkfield, 7, 0)
+        gb_layout.addWidget(self.lineedit_sweep_darkfield, 7, 1)
+        gb_layout.addWidget(self.sweep_btn, 6, 2, 2, 1)
+        gb_layout.addWidget(label_screen, 8, 0)
+        gb_layout.addWidget(self.checkbox_screen, 8, 1)
+        gb_layout.addWidget(self.screen_z_sb, 8, 2)
 
         gb_layout.setAlignment(Qt.AlignTop)
         simple_settings_gb.setLayout(gb_layout)
@@ -776,6 +1499,10 @@ class BasicWidget(QWidget):
             self.fit_widget.setVisible(True)
             self.transform_widget.setVisible(False)
 
+    def toggle_jobs(self, checked: bool):
+        # Switching the visibility of the job queue
+        self.job_panel.setVisible(not self.job_panel.isVisible())
+
     def toggle_weight_in_transform(self, checked: bool):
         # Switching the visibility of the fit_widget
         if self.checkbox_is_timelapse_transform.isChecked():
@@ -801,6 +1528,15 @@ class BasicWidget(QWidget):
             self.autotune_settings.setVisible(True)
             self.btn_autotune_settings.setText("Hide autotune settings")
 
+    def toggle_backend_settings(self, checked: bool):
+        # Switching the visibility of the compute backend settings
+        if self.backend_settings.isVisible():
+            self.backend_settings.setVisible(False)
+            self.btn_backend_settings.setText("Compute backend")
+        else:
+            self.backend_settings.setVisible(True)
+            self.btn_backend_settings.setText("Hide compute backend")
+
     def layers_image_fit(
         self,
         wdg: ComboBox,
@@ -827,11 +1563,11 @@ class BasicWidget(QWidget):
     ) -> list[Image]:
         return ["none"] + [layer for layer in self.viewer.layers]
 
-    def layers_image_flatfield(
-        self,
-        wdg: ComboBox,
-    ) -> list[Image]:
-        return ["--select input images--"] + [layer for layer in self.viewer.layers]
+    def layers_image_flatfield(self, wdg) -> list:
+        special = [("--select input images--", "--select input images--")]
+        layer_items = [(layer.name, layer) for layer in self.viewer.layers]
+        model_items = [(f"DCT model: {name}", model) for name, model in self.dct_models.items()]
+        return special + layer_items + model_items
 
     def layers_weight(
         self,
@@ -839,6 +1575,26 @@ class BasicWidget(QWidget):
     ) -> list[Image]:
         return ["none"] + [layer for layer in self.viewer.layers]
 
+    def layers_roi(
+        self,
+        wdg: ComboBox,
+    ) -> list[Shapes]:
+        return ["none"] + [layer for layer in self.viewer.layers if isinstance(layer, Shapes)]
+
+    def _roi_bounds(self, image_layer, frame_shape):
+        """ROI of the selected Shapes layer in `image_layer`'s pixel coordinates; None without a ROI layer."""
+        shapes = self.roi_select.value
+        if shapes == "none" or shapes is None:
+            return None
+        # vertices -> world -> image pixels through both layers' full transforms (scale, translate, rotate,
+        # shear, affine); the ROI is the bounding box of the mapped vertices in the last two (y, x) axes.
+        # Rounded, so that the round-off of a rotation (19.99999...) does not widen the box by a pixel.
+        vertices = [
+            np.round([image_layer.world_to_data(shapes.data_to_world(point))[-2:] for point in np.asarray(v)], 6)
+            for v in shapes.data
+        ]
+        return roi_bounds(vertices, frame_shape)
+
     @property
     def settings(self):
         """Get settings for BaSiC."""
@@ -861,6 +1617,9 @@ class BasicWidget(QWidget):
         # define function to update napari viewer
         def update_layer(update):
             smoothness_flatfield, smoothness_darkfield = update
+            self._finish_report(
+                report, smoothness_flatfield=smoothness_flatfield, smoothness_darkfield=smoothness_darkfield
+            )
             self.lineedit_smoothness_flatfield.setText(str(smoothness_flatfield))
             if _settings["get_darkfield"]:
                 self.lineedit_smoothness_darkfield.setText(str(smoothness_darkfield))
@@ -871,13 +1630,16 @@ class BasicWidget(QWidget):
             connect={"returned": update_layer},
         )
         def call_autotune(data, fitting_weight, _settings, _settings_autotune):
+            from basicpy import BaSiC
+
             basic = BaSiC(**_settings)
-            basic.autotune(
-                data,
-                is_timelapse=self.checkbox_is_timelapse.isChecked(),
-                fitting_weight=fitting_weight,
-                **_settings_autotune,
-            )
+            with report.stage("autotune", frames=_n_frames(data)):
+                basic.autotune(
+                    data,
+                    is_timelapse=self.checkbox_is_timelapse.isChecked(),
+                    fitting_weight=fitting_weight,
+                    **_settings_autotune,
+                )
             smoothness_flatfield = basic.smoothness_flatfield
             smoothness_darkfield = basic.smoothness_darkfield
             return smoothness_flatfield, smoothness_darkfield
@@ -891,6 +1653,7 @@ class BasicWidget(QWidget):
             {
                 "get_darkfield": self.checkbox_get_darkfield.isChecked(),
                 "sort_intensity": self.checkbox_sorting.isChecked(),
+                **self.backend_settings.apply(),
             }
         )
 
@@ -902,26 +1665,219 @@ class BasicWidget(QWidget):
             else:
                 _settings_autotune[key] = int(item.value)
 
+        report = RunReport(
+            "autotune",
+            settings={**_settings, **_settings_autotune, "is_timelapse": self.checkbox_is_timelapse.isChecked()},
+            inputs={"images": fingerprint_array(data)},
+        )
         worker = call_autotune(data, fitting_weight, _settings, _settings_autotune)
+        self._track_report(worker, report)
         worker.finished.connect(lambda: self.autotune_btn.setDisabled(False))
         worker.errored.connect(lambda: self.autotune_btn.setDisabled(False))
         worker.start()
         logger.info("Autotune worker started")
         return worker
 
-    def _estimate_batch_size(self, first_file, target_gb=0.5, hard_cap=64):
-        arr = tifffile.imread(first_file)
-        bytes_per = arr.nbytes if hasattr(arr, "nbytes") else np.asarray(arr).nbytes
-        if bytes_per <= 0:
-            return 16
-        bs = max(1, int((target_gb * (1024**3)) // bytes_per))
-        return min(bs, hard_cap)
+    def _run_sweep(self):
+        """Fit every value of the sweep grid on the selected layer and show the profiles side by side."""
+        try:
+            flatfield_values = parse_grid(self.lineedit_sweep_flatfield.text())
+            darkfield_values = parse_grid(self.lineedit_sweep_darkfield.text())
+        except ValueError as e:
+            QMessageBox.warning(self, "Sweep", str(e))
+            return None
+        if not flatfield_values:
+            QMessageBox.warning(self, "Sweep", "Enter smoothness_flatfield values to sweep.")
+            return None
+        try:
+            data, meta, _ = self.fit_image_select.value.as_layer_data_tuple()
+            if self.weight_select.value == "none":
+                fitting_weight = None
+            else:
+                fitting_weight, _, _ = self.weight_select.value.as_layer_data_tuple()
+                if self.inverse_cb.isChecked():
+                    fitting_weight = 1 - (fitting_weight > 0)
+        except:
+            logger.error("Error inputs.")
+            return None
+        if not FitCache.supports(data):
+            QMessageBox.warning(self, "Sweep", f"Sweeps need a (T, Y, X) stack, got shape {np.shape(data)}.")
+            return None
+
+        self.sweep_btn.setDisabled(True)
+        _settings = self._fit_settings()
+        is_timelapse = self.checkbox_is_timelapse.isChecked()
+        cost = {}
+        for key, item in self.autotune_settings._settings.items():
+            cost[key] = int(item.value) if key == "histogram_bins" else item.value
+        report = RunReport(
+            "sweep",
+            settings={
+                **_settings,
+                "sweep_flatfield": flatfield_values,
+                "sweep_darkfield": darkfield_values,
+                "is_timelapse": is_timelapse,
+                **cost,
+            },
+            inputs={"images": fingerprint_array(data)},
+        )
+
+        def on_progress(state):
+            done, total = state
+            self.viewer.status = f"BaSiCPy sweep: {done}/{total} candidates fitted"
+
+        def on_done(result):
+            report_path = self._finish_report(report, best=result.rows[result.best], candidates=len(result))
+            layer = self.viewer.add_image(result.flatfields, name="flatfield sweep")
+            layer.metadata["basicpy_sweep"] = result.rows
+            layer.metadata["basicpy_report"] = report_path
+            if result.darkfields is not None:
+                self.viewer.add_image(result.darkfields, name="darkfield sweep").metadata["basicpy_sweep"] = result.rows
+            self.sweep_dialog = SweepResultsDialog(result, parent=self, layer=layer)
+            self.sweep_dialog.show()
+
+        @thread_worker(start_thread=False, connect={"yielded": on_progress, "returned": on_done})
+        def call_sweep(data, fitting_weight):
+            result = yield from smoothness_sweep(
+                _settings,
+                data,
+                flatfield_values,
+                darkfield_values,
+                fitting_weight=fitting_weight,
+                is_timelapse=is_timelapse,
+                cost=cost,
+                fit_cache=self.fit_cache,
+                report=report,
+            )
+            report.count_frames(_n_frames(data) * len(result))
+            return result
+
+        worker = call_sweep(data, fitting_weight)
+        self._track_report(worker, report)
+        worker.finished.connect(lambda: self.sweep_btn.setDisabled(False))
+        self.cancel_fit_btn.clicked.connect(partial(self._cancel_fit, worker=worker))
+        worker.finished.connect(self.cancel_fit_btn.clicked.disconnect)
+        worker.start()
+        logger.info("Sweep worker started")
+        return worker
+
+    def _estimate_batch_size(self, file_info, target_gb=0.5, hard_cap=64):
+        return estimate_batch_size(file_info, target_gb, hard_cap)
+
+    def _track_report(self, worker, report, directory=None):
+        """Close `report` as failed or cancelled when `worker` does not return normally."""
+        worker.errored.connect(lambda e: self._finish_report(report, "failed", directory, error=repr(e)))
+        if hasattr(worker, "aborted"):
+            worker.aborted.connect(lambda: self._finish_report(report, "cancelled", directory))
+
+    def _show_live_preview(self, ring: FrameRing):
+        """Show the frames kept in `ring` in the 'corrected_live' layer, newest frame selected."""
+        frames = ring.snapshot()
+        if frames is None:
+            return
+        if "corrected_live" in self.viewer.layers:
+            layer = self.viewer.layers["corrected_live"]
+            layer.data = frames
+        else:
+            layer = self.viewer.add_image(frames, name="corrected_live")
+        self.viewer.dims.set_point(self.viewer.dims.ndim - 3, len(frames) - 1)
+
+    @property
+    def corrected(self):
+        """Last corrected stack, while its layer (or anything else) still holds it; the widget keeps no reference."""
+        ref = getattr(self, "_corrected_ref", None)
+        return None if ref is None else ref()
+
+    @corrected.setter
+    def corrected(self, data):
+        self._corrected_ref = None if data is None else weakref.ref(data)
+
+    def _finish_report(self, report, status="done", directory=None, **outputs):
+        """Close `report`, write it (into `directory`, else the reports folder) and show its summary."""
+        if report.status_text != "running":
+            return None
+        report.finish(status, **outputs)
+        self.last_report = report
+        try:
+            path = report.write(directory)
+        except OSError as e:
+            logger.warning(f"Could not write the run report: {e}")
+            path = None
+        logger.info(f"{report.summary()} (report: {path})")
+        self.viewer.status = f"BaSiCPy {report.summary()}"
+        return path
+
+    def _metrics_recorder(self, folder, report):
+        """`MetricsRecorder` writing next to `report` into `folder`, or None when QC metrics are off.
+
+        If the recorder cannot be made (Parquet without pyarrow), `report` is finished as failed, which
+        stops its memory sampler, before the error is raised.
+        """
+        if not self.checkbox_metrics.isChecked():
+            return None
+        try:
+            return MetricsRecorder(metrics_path(folder, self.metrics_format_cb.currentText(), report.started))
+        except Exception as e:
+            report.finish("failed", error=repr(e))
+            raise
+
+    def _profile_source(self):
+        source = self.flatfield_select.value
+        if isinstance(source, DCTModel):
+            return {"flatfield": repr(source), "darkfield": getattr(self.darkfield_select.value, "name", "none")}
+        return {
+            "flatfield": getattr(source, "name", str(source)),
+            "darkfield": getattr(self.darkfield_select.value, "name", "none"),
+        }
+
+    def _transform_basic_settings(self, uses_basic):
+        """``BaSiC`` settings for a transform; empty (BaSiCPy stays unimported) when the model is applied directly."""
+        backend = self.backend_settings.apply(uses_basic=uses_basic)
+        if not uses_basic:
+            return {}
+        _basic_settings = {key: item.value for key, item in self.general_settings._settings.items()}
+        _basic_settings.update(
+            {
+                "get_darkfield": self.checkbox_get_darkfield.isChecked(),
+                "sort_intensity": self.checkbox_sorting.isChecked(),
+                **backend,
+            }
+        )
+        return _basic_settings
+
+    def _transform_profiles(self, shape):
+        """Flatfield and darkfield (None if there is none) for frames of ``shape[-2:]``.
+
+        Profiles come from the selected layers or from a loaded DCT model.
+        """
+        source = self.flatfield_select.value
+        if isinstance(source, DCTModel):
+            flatfield = source.flatfield(shape)
+            if self.darkfield_select.value == "none":
+                return flatfield, (source.darkfield(shape) if source.has_darkfield else None)
+        else:
+            flatfield, _, _ = source.as_layer_data_tuple()
+        if self.darkfield_select.value == "none":
+            darkfield = None
+        else:
+            darkfield, _, _ = self.darkfield_select.value.as_layer_data_tuple()
+        return flatfield, darkfield
+
+    def _route_profiles(self, name, shape):
+        """Flatfield and darkfield (or None) of the model a channel route names: a loaded DCT model or a layer."""
+        model = self.dct_models.get(name)
+        if model is not None:
+            return model.flatfield(shape), (model.darkfield(shape) if model.has_darkfield else None)
+        if name in self.viewer.layers:
+            return np.asarray(self.viewer.layers[name].data), None
+        raise ValueError(f"Channel route model {name!r} is neither a loaded DCT model nor a layer.")
 
     def _run_transform(self):
         self.run_transform_btn.setDisabled(True)
 
         # ====== SEQUENCE 模式 ======
         if getattr(self, "transform_sequence_folder", None):
+            report = None
             try:
                 src_dir = self.transform_sequence_folder
                 out_dir = getattr(self, "transform_sequence_out_folder", "")
@@ -930,37 +1886,43 @@ class BasicWidget(QWidget):
                     self.run_transform_btn.setDisabled(False)
                     return
                 os.makedirs(out_dir, exist_ok=True)
-
-                # 只构造文件名列表（不排序就不会阻塞太久；若一定要自然排序再排序）
-                names = [f for f in os.scandir(src_dir) if f.is_file()]
-                # 过滤
-                tokens = getattr(self, "transform_sequence_filters", []) or []
-                if tokens:
-                    keep = []
-                    for e in names:
-                        name = e.name
-                        ok = True
-                        for t in tokens:
-                            if t and t not in name:
-                                ok = False
-                                break
-                        if ok:
-                            keep.append(e)
-                    names = keep
-                if not names:
+                routes = getattr(self, "transform_sequence_routes", None) or []
+                if getattr(self, "transform_sequence_watch", False):
+                    if routes:
+                        show_warning("Channel routes are not used when watching a folder; using the selected profiles")
+                    return self._run_watch(src_dir, out_dir)
+
+                # listing + header probes are cached by the dialog's count worker; an unchanged folder is cheap here
+                index = index_sequence(src_dir, **self._sequence_index_kwargs())
+                if not len(index):
                     QMessageBox.warning(self, "No files", "No files matched your filters.")
                     self.run_transform_btn.setDisabled(False)
                     return
 
-                # 可选：自然排序（慢一些，放在需要时）
-                names = sorted((e.name for e in names), key=self._natural_key)
-                files = [os.path.join(src_dir, n) for n in names]
-
-                flatfield, _, _ = self.flatfield_select.value.as_layer_data_tuple()
-                if self.darkfield_select.value == "none":
-                    darkfield = np.zeros_like(flatfield)
+                file_routes = None
+                if routes:
+                    # only the routed files are corrected, so only they have to agree in shape and dtype
+                    index, file_routes, unrouted = routed_index(index, routes)
+                    if not len(index):
+                        raise ValueError("No file matches any channel route.")
+                    if unrouted:
+                        show_warning(
+                            f"{len(unrouted)} file(s) match no channel route and are skipped, "
+                            f"e.g. {os.path.basename(unrouted[0])}"
+                        )
+                # fail fast: refuse mixed shapes/dtypes before reading any pixels
+                index.check_homogeneous()
+                files = index.paths
+
+                if routes:
+                    models = {
+                        model: self._route_profiles(model, index.frame_shape)
+                        for model in dict.fromkeys(file_routes.values())
+                    }
+                    flatfield, darkfield = next(iter(models.values()))
                 else:
-                    darkfield, _, _ = self.darkfield_select.value.as_layer_data_tuple()
+                    flatfield, darkfield = self._transform_profiles(index.frame_shape)
+                    models = {None: (flatfield, darkfield)}
 
                 # 序列模式禁用 mask
                 if self.fit_weight_select.value != "none":
@@ -971,22 +1933,49 @@ class BasicWidget(QWidget):
                     )
                 fitting_weight = None
 
+                for model, (ff, _) in models.items():
+                    if tuple(np.shape(ff)[-2:]) != index.frame_shape:
+                        raise ValueError(
+                            f"Flatfield{'' if model is None else ' of ' + model} shape {np.shape(ff)} "
+                            f"does not match frame shape {index.frame_shape}."
+                        )
+
                 # 估算 batch 大小
-                batch_size = self._estimate_batch_size(files[0], target_gb=0.5, hard_cap=64)
+                batch_size = self._estimate_batch_size(index.files[0], target_gb=0.5, hard_cap=50)
+
+                live = None
+                if self.checkbox_live_preview.isChecked():
+                    live = FrameRing(self.live_frames_sb.value(), index.frame_shape)
+                throttle = Throttle(0.5)
 
                 def on_progress(state):
                     done, total = state
-                    # 更新状态栏而不是弹无数提示
-                    self.viewer.status = f"BaSiCPy: {done}/{total} ({done/total:.1%})"
+                    # 更新状态栏而不是弹无数提示: progress, frames/s, MB/s and ETA
+                    self.viewer.status = report.status(done, total)
+                    if live is not None and throttle():
+                        self._show_live_preview(live)
+
+                def _out_path(fp, _out_dir):
+                    return os.path.join(_out_dir, os.path.relpath(fp, src_dir))
 
                 def on_done(_out_dir):
-                    QMessageBox.information(self, "Done", f"Saved corrected frames to:\n{_out_dir}")
-                    try:
-                        first_out = os.path.join(_out_dir, os.path.basename(files[0]))
-                        preview = tifffile.imread(first_out)
-                        self.viewer.add_image(preview, name="corrected_preview")
-                    except Exception:
-                        pass
+                    report_path = self._finish_report(
+                        report, directory=_out_dir, output_folder=_out_dir, **report_outputs(metrics)
+                    )
+                    QMessageBox.information(
+                        self, "Done", f"Saved corrected frames to:\n{_out_dir}\n\n{report.summary()}\n{report_path}"
+                    )
+                    if live is not None:
+                        self._show_live_preview(live)
+                    else:
+                        try:
+                            import tifffile
+
+                            first_out = _out_path(files[0], _out_dir)
+                            preview = tifffile.imread(first_out)
+                            self.viewer.add_image(preview, name="corrected_preview")
+                        except Exception:
+                            pass
                     self.run_transform_btn.setDisabled(False)
 
                 """
@@ -1024,86 +2013,71 @@ class BasicWidget(QWidget):
                 """
 
                 @thread_worker(start_thread=False, connect={"yielded": on_progress, "returned": on_done})
-                def call_basic_sequence(files, out_dir, _settings):
-                    basic = BaSiC(**_settings)
-                    basic.darkfield = np.asarray(darkfield)
-                    basic.flatfield = np.asarray(flatfield)
-
-                    total = len(files)
-                    done = 0
-                    batch_size = 50  # 固定一次 50 张
-
-                    im_max = tifffile.imread(files[0])
-                    target_dtype = im_max.dtype
-
-                    if np.issubdtype(target_dtype, np.floating):
-                        pass
-                    else:
-                        print("estimate dynamic range...")
-                        for i in tqdm.tqdm(range(1, total, 20), leave=False):
-                            im_max = np.maximum(im_max, tifffile.imread(files[i]))
-                        im_max = im_max / basic.flatfield
-
-                        if target_dtype == np.uint8:
-                            if im_max.max() > 255:
-                                basic.flatfield = basic.flatfield / 255 * im_max.max()
-                        elif target_dtype == np.uint16:
-                            if im_max.max() > 65535:
-                                basic.flatfield = basic.flatfield / 65535 * im_max.max()
-                        else:
-                            raise ValueError(f"Unsupported numpy dtype: {target_dtype}")
-
-                    for i in tqdm.tqdm(range(0, total, batch_size), desc="transforming: "):
-                        batch = files[i : i + batch_size]
-
-                        # 一次性读取 50 张并堆叠
-                        imgs = [tifffile.imread(fp) for fp in batch]
-                        try:
-                            stack = np.stack(imgs, axis=0)  # 形状 ~ (B, Y, X) 或 (B, Z, Y, X)
-                        except Exception:
-                            # 如果形状不一致，明确报错，避免 silent fail
-                            shapes = {np.asarray(im).shape for im in imgs}
-                            raise ValueError(f"Images in this batch have different shapes: {shapes}")
-
-                        # 一次性做 transform
-                        corrected = basic.transform(
-                            stack,
-                            is_timelapse=self.checkbox_is_timelapse_transform.isChecked(),  # 批量按时间序列处理
-                            fitting_weight=None,  # 序列模式禁用 mask
+                def call_basic_sequence(index, out_dir, _settings, batch_size, save_dtype, save_mode):
+                    is_timelapse = self.checkbox_is_timelapse_transform.isChecked()
+                    # 批量按时间序列处理 when timelapse, else the model is applied directly;
+                    # one corrector per route
+                    with ExitStack() as stack:
+                        correctors = {
+                            model: stack.enter_context(frame_corrector(ff, df, is_timelapse, _settings))
+                            for model, (ff, df) in models.items()
+                        }
+                        if metrics is not None:
+                            stack.enter_context(metrics)
+                        yield from correct_sequence(
+                            index,
+                            partial(_out_path, _out_dir=out_dir),
+                            correctors if file_routes else correctors[None],
+                            batch_size,
+                            save_dtype,
+                            save_mode,
+                            report=report,
+                            metrics=metrics,
+                            preview=live,
+                            routes=file_routes,
                         )
-                        corr = np.asarray(corrected)
-
-                        # 逐张写回（文件名保持不变）
-                        if corr.ndim == 2:
-                            # 极端情况：只有 1 张
-                            out_fp = os.path.join(out_dir, os.path.basename(batch[0]))
-                            tifffile.imwrite(out_fp, corr)
-                        else:
-                            for j, src_fp in enumerate(batch):
-                                out_fp = os.path.join(out_dir, os.path.basename(src_fp))
-                                tifffile.imwrite(out_fp, corr[j])
-
-                        # 释放本批内存（可选）
-                        del imgs, stack, corr
-
-                        done += len(batch)
-                        yield (done, total)
-
                     return out_dir
 
-                _basic_settings_tmp = self.general_settings._settings
-                _basic_settings = {}
-                for key, item in _basic_settings_tmp.items():
-                    _basic_settings[key] = item.value
-
-                _basic_settings.update(
-                    {
-                        "get_darkfield": self.checkbox_get_darkfield.isChecked(),
-                        "sort_intensity": self.checkbox_sorting.isChecked(),
-                    }
+                _basic_settings = self._transform_basic_settings(self.checkbox_is_timelapse_transform.isChecked())
+                save_dtype = getattr(self, "transform_sequence_dtype", "float32")
+                save_mode = getattr(self, "transform_sequence_mode", SCALING_MODES[0])
+                report = RunReport(
+                    "sequence",
+                    settings={
+                        **_basic_settings,
+                        "is_timelapse": self.checkbox_is_timelapse_transform.isChecked(),
+                        "profiles": self._profile_source(),
+                        "batch_size": batch_size,
+                        "save_dtype": save_dtype,
+                        "scaling": save_mode,
+                        **({"routes": [f"{p}={m}" for p, m in routes]} if file_routes else {}),
+                    },
+                    inputs={
+                        "folder": src_dir,
+                        "filters": self._sequence_index_kwargs(),
+                        "files": fingerprint_files(files),
+                        "frames": index.n_frames,
+                        "frame_shape": index.frame_shape,
+                        "dtype": str(index.dtype),
+                        "flatfield": fingerprint_array(np.asarray(flatfield)),
+                        **(
+                            {"models": {m: fingerprint_array(np.asarray(ff)) for m, (ff, _) in models.items()}}
+                            if file_routes
+                            else {}
+                        ),
+                    },
                 )
-
-                worker = call_basic_sequence(files, out_dir, _basic_settings)
+                metrics = self._metrics_recorder(out_dir, report)
+
+                worker = call_basic_sequence(
+                    index,
+                    out_dir,
+                    _basic_settings,
+                    batch_size,
+                    save_dtype,
+                    save_mode,
+                )
+                self._track_report(worker, report, directory=out_dir)
                 worker.errored.connect(lambda e=None: self.run_transform_btn.setDisabled(False))
                 self.cancel_transform_btn.clicked.connect(partial(self._cancel_transform, worker=worker))
                 worker.finished.connect(self.cancel_transform_btn.clicked.disconnect)
@@ -1112,6 +2086,9 @@ class BasicWidget(QWidget):
 
             except Exception as e:
                 logger.exception("Sequence transform failed")
+                if report is not None:
+                    # stops the report's memory sampler
+                    report.finish("failed", error=repr(e))
                 QMessageBox.critical(self, "Error", str(e))
                 self.run_transform_btn.setDisabled(False)
                 return
@@ -1119,11 +2096,6 @@ class BasicWidget(QWidget):
         # ====== 否则：保持你原来的 layer → layer 流程（不变） ======
         try:
             data, meta, _ = self.transform_image_select.value.as_layer_data_tuple()
-            flatfield, _, _ = self.flatfield_select.value.as_layer_data_tuple()
-            if self.darkfield_select.value == "none":
-                darkfield = np.zeros_like(flatfield)
-            else:
-                darkfield, _, _ = self.darkfield_select.value.as_layer_data_tuple()
             if self.fit_weight_select.value == "none":
                 fitting_weight = None
             else:
@@ -1136,18 +2108,71 @@ class BasicWidget(QWidget):
             self.run_transform_btn.setDisabled(False)
             return
 
+        try:
+            tile_grid = self._tile_grid(self.tile_settings_transform, data)
+        except ValueError as e:
+            QMessageBox.warning(self, "Tile mode", str(e))
+            self.run_transform_btn.setDisabled(False)
+            return
+
+        try:
+            flatfield, darkfield = self._transform_profiles(
+                tile_grid.tile_shape if tile_grid is not None else data.shape[-2:]
+            )
+        except:
+            logger.error("Error inputs.")
+            self.run_transform_btn.setDisabled(False)
+            return
+        if tile_grid is not None and tuple(np.shape(flatfield)) != tile_grid.tile_shape:
+            QMessageBox.warning(
+                self,
+                "Tile mode",
+                f"Flatfield shape {np.shape(flatfield)} does not match the tile size {tile_grid.tile_shape}.",
+            )
+            self.run_transform_btn.setDisabled(False)
+            return
+
         def update_layer(update):
             data, meta = update
             self.corrected = data
-            self.viewer.add_image(data, name="corrected")
+            report_path = self._finish_report(report, **report_outputs(metrics))
+            layer = self.viewer.add_image(data, name="corrected")
+            layer.metadata["basicpy_report"] = report_path
+            if metrics is not None:
+                layer.metadata["basicpy_metrics"] = metrics.path
             print("Transform is done.")
 
         @thread_worker(start_thread=False, connect={"returned": update_layer})
         def call_basic(data, _settings, _basic_settings):
-            basic = BaSiC(**_basic_settings)
-            basic.darkfield = np.asarray(darkfield)
-            basic.flatfield = np.asarray(flatfield)
-            corrected = basic.transform(data, **_settings)
+            n_frames = len(tile_grid) if tile_grid is not None else _n_frames(data)
+            if tile_grid is not None:
+                # no timelapse baseline for tiles: they are fields of view of one plane, not time points
+                with report.stage("correct", frames=n_frames):
+                    plane = data.reshape(tile_grid.image_shape)
+                    corrected = allocate_mosaic(tile_grid.image_shape)
+                    with ApplyEngine(flatfield, darkfield) as engine:
+                        for _ in apply_tiles(plane, tile_grid, engine, out=corrected):
+                            pass
+            elif _settings["is_timelapse"]:
+                from basicpy import BaSiC
+
+                basic = BaSiC(**_basic_settings)
+                basic.darkfield = np.zeros_like(flatfield) if darkfield is None else np.asarray(darkfield)
+                basic.flatfield = np.asarray(flatfield)
+                with report.stage("correct", frames=n_frames):
+                    corrected = self._correct_planned(
+                        plan, basic, data, _settings["fitting_weight"], True, output=output
+                    )
+            else:
+                with report.stage("correct", frames=n_frames):
+                    corrected = self._correct_planned(
+                        plan, None, data, None, False, flatfield, darkfield, output=output
+                    )
+            report.count_frames(n_frames)
+            if metrics is not None:
+                # the tile mosaic counts as one frame
+                with report.stage("metrics", frames=n_frames), metrics:
+                    record_stack(metrics, corrected, raw=data)
             self.run_transform_btn.setDisabled(False)
             return corrected, meta
 
@@ -1156,19 +2181,42 @@ class BasicWidget(QWidget):
             "fitting_weight": fitting_weight,
         }
 
-        _basic_settings_tmp = self.general_settings._settings
-        _basic_settings = {}
-        for key, item in _basic_settings_tmp.items():
-            _basic_settings[key] = item.value
-
-        _basic_settings.update(
-            {
-                "get_darkfield": self.checkbox_get_darkfield.isChecked(),
-                "sort_intensity": self.checkbox_sorting.isChecked(),
-            }
+        _basic_settings = self._transform_basic_settings(_settings["is_timelapse"] and tile_grid is None)
+
+        plan = None
+        output = self.output_cb.currentText()
+        if tile_grid is None:
+            plan = plan_transform(
+                np.shape(data),
+                is_timelapse=_settings["is_timelapse"],
+                mask=fitting_weight is not None,
+                budget=self.backend_settings.memory_budget(),
+                out_of_core=output != "memory",
+            )
+            if not self._accept_plan(plan):
+                self.run_transform_btn.setDisabled(False)
+                return None
+
+        report = RunReport(
+            "transform",
+            settings={
+                **_basic_settings,
+                "is_timelapse": _settings["is_timelapse"],
+                "profiles": self._profile_source(),
+                "tiles": None if tile_grid is None else {"tile_shape": tile_grid.tile_shape, "n_tiles": len(tile_grid)},
+                "memory_plan": None if plan is None else plan.to_dict(),
+                "output": output,
+            },
+            inputs={"images": fingerprint_array(data), "flatfield": fingerprint_array(np.asarray(flatfield))},
         )
-
+        try:
+            metrics = self._metrics_recorder(reports_dir(), report)
+        except ImportError as e:
+            QMessageBox.warning(self, "QC metrics", str(e))
+            self.run_transform_btn.setDisabled(False)
+            return
         worker = call_basic(data, _settings, _basic_settings)
+        self._track_report(worker, report)
         self.cancel_transform_btn.clicked.connect(partial(self._cancel_transform, worker=worker))
         worker.finished.connect(self.cancel_transform_btn.clicked.disconnect)
         worker.finished.connect(lambda: self.run_transform_btn.setDisabled(False))
@@ -1177,6 +2225,237 @@ class BasicWidget(QWidget):
         logger.info("BaSiC worker for tranform only started")
         return worker
 
+    def _accept_plan(self, plan) -> bool:
+        """Log `plan`; warn about its fallbacks and ask before a run that is still over budget."""
+        logger.info(plan.text())
+        if plan.over_budget:
+            answer = QMessageBox.question(
+                self,
+                "Not enough memory",
+                plan.text() + "\n\nRun anyway?",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No,
+            )
+            return answer == QMessageBox.Yes
+        if plan.fallback:
+            show_warning(plan.text())
+        return True
+
+    @staticmethod
+    def _correct_planned(
+        plan, basic, data, fitting_weight, is_timelapse, flatfield=None, darkfield=None, output="memory"
+    ):
+        """Correct `data` with `basic` (timelapse) or the profiles into a new array or an `allocate_output` buffer.
+
+        ``"memory"`` becomes a memory map when `plan` needs out-of-core output.
+        """
+        if output == "memory" and plan.out_of_core:
+            output = "memmap"
+        out = None if output == "memory" else allocate_output(np.shape(data), output)
+        if not is_timelapse:
+            if basic is not None:
+                flatfield, darkfield = basic.flatfield, basic.darkfield
+            # the same (image - darkfield) / flatfield as BaSiC.transform, multithreaded
+            with ApplyEngine(flatfield, darkfield) as engine:
+                return engine(data, out=out)
+        if out is None and not plan.chunk_frames:
+            return basic.transform(data, fitting_weight, True, use_tqdm=False)
+        # BaSiC.transform returns a new array; a buffer is filled batch by batch
+        if out is None:
+            out = allocate_output(np.shape(data))
+
+        # stores that cannot be reshaped in place (Zarr) are read and written frame by frame
+        for _ in correct_chunked(
+            lambda batch, weight: basic.transform(batch, weight, True, use_tqdm=False),
+            as_frames(data),
+            as_frames(out),
+            plan.chunk_frames or TRANSFORM_CHUNK,
+            fitting_weight=None if fitting_weight is None else as_frames(np.asarray(fitting_weight)),
+        ):
+            pass
+        return out
+
+    def _sequence_frame_shape(self, src_dir):
+        """Frame shape of the files already in `src_dir`, else the one the selected model was made for."""
+        index = index_sequence(src_dir, **self._sequence_index_kwargs())
+        if index.frame_shape is not None:
+            return index.frame_shape
+        source = self.flatfield_select.value
+        return source.source_shape if isinstance(source, DCTModel) else np.shape(source.data)[-2:]
+
+    def _queue_fit(self):
+        """Queue a fit of the selected layer with the current settings; see `JobPanel`."""
+        layer = self.fit_image_select.value
+        if isinstance(layer, str):
+            QMessageBox.warning(self, "No input", "Please select an image layer to fit.")
+            return None
+        if self.tile_settings_fit.enabled or self.checkbox_incremental.isChecked():
+            QMessageBox.warning(self, "Job queue", "Tile mode and incremental fits are not queued; use Run.")
+            return None
+        weight = self.weight_select.value
+        params = {
+            "layer": layer.name,
+            "source": layer.source.path,
+            "settings": self._fit_settings(),
+            "weight": None if weight == "none" else weight.name,
+            "inverse_weight": self.inverse_cb.isChecked(),
+        }
+        job = self.job_panel.add("fit", layer.name, params)
+        show_info(f"Queued: fit of {layer.name}")
+        return job
+
+    def _queue_transform(self):
+        """Queue a transform of the selected layer or sequence folder with the current profiles."""
+        is_timelapse = self.checkbox_is_timelapse_transform.isChecked()
+        try:
+            src_dir = getattr(self, "transform_sequence_folder", None)
+            route_models = []
+            if src_dir:
+                out_dir = getattr(self, "transform_sequence_out_folder", "")
+                if not out_dir:
+                    QMessageBox.warning(self, "No output folder", "Please choose an output folder.")
+                    return None
+                kind, label = "sequence", os.path.basename(os.path.normpath(src_dir))
+                routes = getattr(self, "transform_sequence_routes", None) or []
+                if routes:
+                    index, file_routes, _ = routed_index(
+                        index_sequence(src_dir, **self._sequence_index_kwargs()), routes
+                    )
+                    if not len(index):
+                        raise ValueError("No file matches any channel route.")
+                    frame_shape = index.frame_shape
+                    route_models = list(dict.fromkeys(file_routes.values()))
+                else:
+                    frame_shape = self._sequence_frame_shape(src_dir)
+                params = {
+                    "folder": src_dir,
+                    "out_folder": out_dir,
+                    "filters": self._sequence_index_kwargs(),
+                    "save_dtype": getattr(self, "transform_sequence_dtype", "float32"),
+                    "save_mode": getattr(self, "transform_sequence_mode", SCALING_MODES[0]),
+                }
+            else:
+                layer = self.transform_image_select.value
+                if isinstance(layer, str):
+                    QMessageBox.warning(self, "No input", "Please select an image layer or a sequence folder.")
+                    return None
+                if self.tile_settings_transform.enabled:
+                    QMessageBox.warning(self, "Job queue", "Tile mode transforms are not queued; use Run.")
+                    return None
+                kind, label = "transform", layer.name
+                frame_shape = np.shape(layer.data)[-2:]
+                params = {"layer": layer.name, "source": layer.source.path}
+            params.update(
+                {
+                    "is_timelapse": is_timelapse,
+                    "basic_settings": self._transform_basic_settings(is_timelapse),
+                    "metrics": self.metrics_format_cb.currentText() if self.checkbox_metrics.isChecked() else None,
+                }
+            )
+            # the profiles are stored with the job: later changes to the selection do not affect it
+            if route_models:
+                # one profile pair per routed model, stored as flatfield_<i>/darkfield_<i>
+                params.update({"routes": [list(route) for route in routes], "route_models": route_models})
+                arrays = {}
+                for i, model in enumerate(route_models):
+                    flatfield, darkfield = self._route_profiles(model, frame_shape)
+                    arrays[f"flatfield_{i}"] = np.asarray(flatfield)
+                    arrays[f"darkfield_{i}"] = None if darkfield is None else np.asarray(darkfield)
+            else:
+                flatfield, darkfield = self._transform_profiles(frame_shape)
+                arrays = {
+                    "flatfield": np.asarray(flatfield),
+                    "darkfield": None if darkfield is None else np.asarray(darkfield),
+                }
+        except Exception as e:
+            logger.exception("Could not queue the transform")
+            QMessageBox.critical(self, "Error", str(e))
+            return None
+        job = self.job_panel.add(kind, label, params, arrays)
+        show_info(f"Queued: {kind} of {label}")
+        return job
+
+    def _run_watch(self, src_dir, out_dir):
+        """Correct files in `src_dir` as they are written, until Cancel."""
+        if self.checkbox_is_timelapse_transform.isChecked():
+            QMessageBox.warning(
+                self,
+                "Timelapse ignored",
+                "Watch mode corrects files as they arrive; timelapse baselines are not estimated.",
+            )
+        frame_shape = self._sequence_frame_shape(src_dir)
+        flatfield, darkfield = self._transform_profiles(frame_shape)
+
+        save_dtype = getattr(self, "transform_sequence_dtype", "float32")
+        save_mode = getattr(self, "transform_sequence_mode", SCALING_MODES[0])
+        self.backend_settings.apply(uses_basic=False)
+        report = RunReport(
+            "watch",
+            settings={"profiles": self._profile_source(), "save_dtype": save_dtype, "scaling": save_mode},
+            inputs={
+                "folder": src_dir,
+                "filters": self._sequence_index_kwargs(),
+                "frame_shape": tuple(frame_shape),
+                "flatfield": fingerprint_array(np.asarray(flatfield)),
+            },
+        )
+
+        def on_status(status):
+            self.viewer.status = status.text()
+
+        def on_stopped():
+            report_path = self._finish_report(
+                report,
+                "stopped",
+                directory=out_dir,
+                files=watcher.status.files_done,
+                failed=watcher.status.failed,
+                **report_outputs(metrics),
+            )
+            show_info(f"Stopped watching {src_dir}.\n{watcher.status.text()}\n{report_path}")
+            self.run_transform_btn.setDisabled(False)
+
+        engine = ApplyEngine(flatfield, darkfield)
+        metrics = self._metrics_recorder(out_dir, report)
+        try:
+            watcher = FolderWatcher(
+                src_dir,
+                out_dir,
+                engine,
+                frame_shape,
+                save_dtype=save_dtype,
+                save_mode=save_mode,
+                report=report,
+                metrics=metrics,
+                **self._sequence_index_kwargs(),
+            )
+        except Exception as e:
+            report.finish("failed", error=repr(e))
+            raise
+
+        @thread_worker(start_thread=False, connect={"yielded": on_status})
+        def call_watch():
+            with engine, metrics if metrics is not None else nullcontext():
+                yield from watcher.run()
+
+        worker = call_watch()
+        # Cancel is the normal way to stop a watch: only errors mark the report as failed
+        worker.errored.connect(lambda e: self._finish_report(report, "failed", out_dir, error=repr(e)))
+        worker.finished.connect(on_stopped)
+        self.cancel_transform_btn.clicked.connect(partial(self._cancel_transform, worker=worker))
+        worker.finished.connect(self.cancel_transform_btn.clicked.disconnect)
+        worker.start()
+        show_info(f"Watching {src_dir} for new files; press Cancel to stop.")
+        return worker
+
+    def _tile_grid(self, tile_settings, data):
+        """Tile grid for `data` from `tile_settings`, or None; tile mode needs a single 2D plane."""
+        if not tile_settings.enabled:
+            return None
+        if int(np.prod(data.shape[:-2])) != 1:
+            raise ValueError(f"Tile mode needs a single 2D image, got shape {data.shape}.")
+        return tile_settings.grid(data.shape[-2:])
+
     def _run_fit(self):
         # disable run button
         self.run_fit_btn.setDisabled(True)
@@ -1196,27 +2475,52 @@ class BasicWidget(QWidget):
             self.run_fit_btn.setDisabled(False)
             return
 
+        try:
+            tile_grid = self._tile_grid(self.tile_settings_fit, data)
+        except ValueError as e:
+            QMessageBox.warning(self, "Tile mode", str(e))
+            self.run_fit_btn.setDisabled(False)
+            return
+
+        try:
+            roi = self._roi_bounds(self.fit_image_select.value, np.shape(data))
+        except ValueError as e:
+            QMessageBox.warning(self, "ROI", str(e))
+            self.run_fit_btn.setDisabled(False)
+            return
+        if roi is not None and (tile_grid is not None or self.checkbox_incremental.isChecked()):
+            show_warning("The ROI is not used in tile mode or for incremental fits")
+            roi = None
+        roi_fill = self.roi_fill_cb.currentText()
+        # only the ROI of every frame is read and fitted (a view, or a lazy slice of dask/Zarr input)
+        fit_input = crop_frames(data, roi)
+        fit_input_weight = crop_frames(fitting_weight, roi)
+
         # define function to update napari viewer
         def update_layer(update):
-            uncorrected, data, flatfield, darkfield, _settings, meta = update
-            self.viewer.add_image(data, name="corrected")
+            baselines, data, flatfield, darkfield, _settings, meta = update
+            outputs = {}
+            if screening:
+                outputs["screening"] = screening[0].to_dict()
+                if screening[0].rejected:
+                    show_info(screening[0].text())
+            report_path = self._finish_report(report, **outputs)
+            corrected_layer = self.viewer.add_image(data, name="corrected")
+            corrected_layer.metadata["basicpy_report"] = report_path
             self.viewer.add_image(flatfield, name="flatfield")
             self.corrected = data
             self.flatfield = flatfield
             if _settings["get_darkfield"]:
                 self.viewer.add_image(darkfield, name="darkfield")
                 self.darkfield = darkfield
-            if self.checkbox_is_timelapse.isChecked():
+            if baselines is not None:
                 import matplotlib.pyplot as plt
                 import matplotlib.image as mpimg
 
-                m, n = data.shape[-2:]
-
                 fig, (ax1, ax2) = plt.subplots(1, 2)
                 # fig.tight_layout()
                 # fig.set_size_inches(n / 300, m / 300)
-                baseline_before = np.squeeze(np.asarray(uncorrected.mean((-2, -1))))
-                baseline_after = np.squeeze(np.asarray(data.mean((-2, -1))))
+                baseline_before, baseline_after = baselines
                 baseline_max = 1.01 * max(baseline_after.max(), baseline_before.max())
                 baseline_min = 0.99 * min(baseline_after.min(), baseline_before.min())
                 ax1.plot(baseline_before)
@@ -1244,17 +2548,134 @@ class BasicWidget(QWidget):
             connect={"returned": update_layer},
         )
         def call_basic(data, fitting_weight, _settings):
-            basic = BaSiC(**_settings)
-            corrected = basic(
-                data,
-                is_timelapse=self.checkbox_is_timelapse.isChecked(),
-                fitting_weight=fitting_weight,
-            )
+            from basicpy import BaSiC
+
+            if tile_grid is None:
+                n_frames = _n_frames(data)
+                fit_data, fit_weight = fit_input, fit_input_weight
+                subset = slice(None)
+                if plan.fit_frames:
+                    # an even subsample, as a strided view; only these frames are preprocessed, as planned
+                    subset = fit_frame_indices(n_frames, plan.fit_frames)
+                    fit_data = fit_input[subset]
+                    fit_weight = None if fit_input_weight is None else fit_input_weight[subset]
+                frames = None
+                if screen:
+                    screening.append(screen_frames(fit_input, z=self.screen_z_sb.value(), report=report))
+                    if screening[0].rejected:
+                        # positions in the (subsampled) fit input of the frames that passed screening
+                        frames = np.flatnonzero(np.isin(np.arange(n_frames)[subset], screening[0].keep))
+                if FitCache.supports(fit_data):
+                    # reruns on the same layer reuse the working-size stack (and unchanged settings the fit);
+                    # screened frames are picked by index from it instead of copying the input. A ROI crop or
+                    # a subsample is a new view on every run, so it is keyed on the layer data, ROI and
+                    # subsample; the whole layer keeps the plain key the sweep uses, so a Run reuses its fits
+                    key = None if roi is None and not plan.fit_frames else (id(data), roi, subset)
+                    basic = self.fit_cache.fit(_settings, fit_data, fit_weight, report=report, frames=frames, key=key)
+                else:
+                    if frames is not None:
+                        fit_data = fit_data[frames]
+                        fit_weight = None if fit_weight is None else fit_weight[frames]
+                    basic = BaSiC(**_settings)
+                    with report.stage("fit", frames=_n_frames(fit_data)):
+                        basic.fit(fit_data, fitting_weight=fit_weight)
+                if roi is not None:
+                    basic, profiles = self._embed_roi_fit(basic, roi, np.shape(data), roi_fill)
+                with report.stage("correct", frames=n_frames):
+                    corrected = self._correct_planned(
+                        plan, basic, data, fitting_weight, self.checkbox_is_timelapse.isChecked()
+                    )
+                if roi is not None and roi_fill == "nan":
+                    _fill_outside(corrected, roi, np.nan)
+                    basic = profiles
+            else:
+                basic = BaSiC(**_settings)
+                # tiles are sliced lazily; BaSiC only ever holds the working-size stack
+                plane = data.reshape(tile_grid.image_shape)
+                weight_tiles = None
+                if fitting_weight is not None:
+                    weight_tiles = tile_stack(np.reshape(fitting_weight, tile_grid.image_shape), tile_grid)
+                with report.stage("fit", frames=len(tile_grid)):
+                    basic.fit(tile_stack(plane, tile_grid), fitting_weight=weight_tiles)
+                with report.stage("correct", frames=len(tile_grid)):
+                    corrected = allocate_mosaic(tile_grid.image_shape)
+                    with ApplyEngine(basic.flatfield, basic.darkfield) as engine:
+                        for _ in apply_tiles(plane, tile_grid, engine, out=corrected):
+                            pass
+            report.count_frames(len(tile_grid) if tile_grid is not None else _n_frames(data))
+            baselines = None
+            if self.checkbox_is_timelapse.isChecked() and tile_grid is None:
+                # only the per-frame means are handed to the plot, not the input stack
+                baselines = tuple(np.squeeze(np.asarray(crop_frames(a, roi).mean((-2, -1)))) for a in (data, corrected))
             flatfield = basic.flatfield
             darkfield = basic.darkfield
             self.run_fit_btn.setDisabled(False)  # reenable run button
-            return data, corrected, flatfield, darkfield, _settings, meta
+            return baselines, corrected, flatfield, darkfield, _settings, meta
+
+        _settings = self._fit_settings()
+        if self.checkbox_incremental.isChecked():
+            return self._run_incremental_fit(data, tile_grid, _settings)
+        # screening needs whole (T, Y, X) frames; tiles of one plane are not screened
+        screen = self.checkbox_screen.isChecked() and tile_grid is None and FitCache.supports(fit_input)
+        screening = []
+        # tile mode already streams tiles and writes a disk-backed mosaic
+        plan = None
+        if tile_grid is None:
+            plan = plan_fit(
+                np.shape(data),
+                _settings,
+                is_timelapse=self.checkbox_is_timelapse.isChecked(),
+                mask=fitting_weight is not None,
+                budget=self.backend_settings.memory_budget(),
+                fit_shape=np.shape(fit_input),
+            )
+            if not self._accept_plan(plan):
+                self.run_fit_btn.setDisabled(False)
+                return None
+        report = RunReport(
+            "fit",
+            settings={
+                **_settings,
+                "is_timelapse": self.checkbox_is_timelapse.isChecked(),
+                "tiles": None if tile_grid is None else {"tile_shape": tile_grid.tile_shape, "n_tiles": len(tile_grid)},
+                "memory_plan": None if plan is None else plan.to_dict(),
+                "roi": bounds_to_dict(roi),
+                **({"roi_fill": roi_fill} if roi is not None else {}),
+            },
+            inputs={"images": fingerprint_array(data)},
+        )
+        worker = call_basic(data, fitting_weight, _settings)
+        self._track_report(worker, report)
+        self.cancel_fit_btn.clicked.connect(partial(self._cancel_fit, worker=worker))
+        worker.finished.connect(self.cancel_fit_btn.clicked.disconnect)
+        worker.finished.connect(lambda: self.run_fit_btn.setDisabled(False))
+        worker.errored.connect(lambda: self.run_fit_btn.setDisabled(False))
+        worker.start()
+        logger.info("BaSiC worker started")
+        return worker
 
+    @staticmethod
+    def _embed_roi_fit(basic, roi, frame_shape, fill):
+        """Full-frame copies of a model fitted on `roi`: one to correct with and one with the `fill` profiles.
+
+        The NaN fill is shown in the profiles only; correcting with it would make timelapse baselines NaN,
+        so the model used for correction is extended with neutral values instead.
+        """
+        import copy
+
+        flatfield, darkfield = basic.flatfield, basic.darkfield
+        profiles = copy.copy(basic)  # the fit cache keeps `basic`; its ROI-sized profiles stay as they are
+        profiles.flatfield = embed_profile(flatfield, roi, frame_shape, fill, neutral=1.0)
+        profiles.darkfield = embed_profile(darkfield, roi, frame_shape, fill, neutral=0.0)
+        if fill != "nan":
+            return profiles, profiles
+        model = copy.copy(basic)
+        model.flatfield = embed_profile(flatfield, roi, frame_shape, "neutral", neutral=1.0)
+        model.darkfield = embed_profile(darkfield, roi, frame_shape, "neutral", neutral=0.0)
+        return model, profiles
+
+    def _fit_settings(self) -> dict:
+        """``BaSiC`` keyword arguments from the fit panel (general settings, smoothness, backend)."""
         _settings_tmp = self.general_settings._settings
         _settings = {}
         for key, item in _settings_tmp.items():
@@ -1277,17 +2698,135 @@ class BasicWidget(QWidget):
             {
                 "get_darkfield": self.checkbox_get_darkfield.isChecked(),
                 "sort_intensity": self.checkbox_sorting.isChecked(),
+                **self.backend_settings.apply(),
             }
         )
-        worker = call_basic(data, fitting_weight, _settings)
+        return _settings
+
+    def _auto_preview(self):
+        # settings edits refresh a preview that is on screen; without one, nothing runs
+        if "flatfield preview" in self.viewer.layers and self._preview_worker is None:
+            self._run_preview()
+
+    def _run_preview(self):
+        """Fit on a reduced copy of the selected stack and show "flatfield preview" (and darkfield)."""
+        try:
+            data, meta, _ = self.fit_image_select.value.as_layer_data_tuple()
+            if self.weight_select.value == "none":
+                fitting_weight = None
+            else:
+                fitting_weight, _, _ = self.weight_select.value.as_layer_data_tuple()
+                if self.inverse_cb.isChecked():
+                    fitting_weight = 1 - (fitting_weight > 0)
+        except:
+            logger.error("Error inputs.")
+            return None
+        if not FitCache.supports(data):
+            QMessageBox.warning(self, "Preview", f"Preview needs a (T, Y, X) stack, got shape {np.shape(data)}.")
+            return None
+
+        _settings = self._fit_settings()
+        report = RunReport(
+            "preview",
+            settings={
+                **_settings,
+                "preview_size": self.preview_fit.size,
+                "preview_frames": self.preview_fit.max_frames,
+            },
+            inputs={"images": fingerprint_array(data)},
+        )
+
+        def update_layer(profiles):
+            # previews are frequent: the report is kept in memory, not written
+            report.finish()
+            self.last_report = report
+            for name, profile in zip(("flatfield preview", "darkfield preview"), profiles):
+                if profile is None:
+                    continue
+                if name in self.viewer.layers:
+                    self.viewer.layers[name].data = profile
+                else:
+                    self.viewer.add_image(profile, name=name)
+            self.viewer.status = f"BaSiCPy preview: {report.summary()}; Run fits at full resolution"
+
+        @thread_worker(start_thread=False, connect={"returned": update_layer})
+        def call_preview(data, fitting_weight):
+            return self.preview_fit.fit(_settings, data, fitting_weight, report=report)
+
+        def on_finished():
+            self._preview_worker = None
+            self.preview_fit_btn.setDisabled(False)
+
+        self.preview_fit_btn.setDisabled(True)
+        worker = call_preview(data, fitting_weight)
+        self._preview_worker = worker
+        worker.errored.connect(lambda e: report.finish("failed", error=repr(e)))
+        worker.finished.connect(on_finished)
+        worker.start()
+        return worker
+
+    def _run_incremental_fit(self, data, tile_grid, _settings):
+        """Add the selected frames to the running model and refresh the flatfield/darkfield layers."""
+        if self.incremental is None or self.incremental.settings != _settings:
+            if self.incremental is not None:
+                logger.info("Fit settings changed; starting a new incremental model")
+            self.incremental = IncrementalFit(_settings)
+        inc = self.incremental
+        report = RunReport(
+            "fit",
+            settings={**_settings, "incremental": {"capacity": inc.capacity, "blend": inc.blend}},
+            inputs={"images": fingerprint_array(data)},
+        )
+
+        def update_layer(profiles):
+            flatfield, darkfield = profiles
+            report_path = self._finish_report(report, frames_seen=inc.n_seen, updates=inc.n_updates)
+            for name, profile in (("flatfield", flatfield), ("darkfield", darkfield)):
+                if profile is None:
+                    continue
+                if name in self.viewer.layers:
+                    self.viewer.layers[name].data = profile
+                else:
+                    self.viewer.add_image(profile, name=name)
+                self.viewer.layers[name].metadata["basicpy_report"] = report_path
+            self.flatfield = flatfield
+            if darkfield is not None:
+                self.darkfield = darkfield
+            self.viewer.status = (
+                f"BaSiCPy incremental model: {inc.n_seen} frames seen, {inc.n_buffered} in the reservoir, "
+                f"update {inc.n_updates}"
+            )
+
+        @thread_worker(start_thread=False, connect={"returned": update_layer})
+        def call_incremental(data):
+            if tile_grid is None:
+                frames = data.reshape((-1, *data.shape[-2:]))
+            else:
+                frames = tile_stack(data.reshape(tile_grid.image_shape), tile_grid)
+            n_frames = len(frames)
+            with report.stage("reservoir", frames=n_frames):
+                # bounded batches, so a lazy stack is read a chunk at a time rather than loaded whole
+                for start in range(0, n_frames, TRANSFORM_CHUNK):
+                    inc.add(frames[start : start + TRANSFORM_CHUNK])
+            with report.stage("fit", frames=inc.n_buffered):
+                profiles = inc.update()
+            report.count_frames(n_frames)
+            return profiles
+
+        worker = call_incremental(data)
+        self._track_report(worker, report)
         self.cancel_fit_btn.clicked.connect(partial(self._cancel_fit, worker=worker))
         worker.finished.connect(self.cancel_fit_btn.clicked.disconnect)
         worker.finished.connect(lambda: self.run_fit_btn.setDisabled(False))
         worker.errored.connect(lambda: self.run_fit_btn.setDisabled(False))
         worker.start()
-        logger.info("BaSiC worker started")
+        logger.info("Incremental BaSiC worker started")
         return worker
 
+    def _reset_incremental(self):
+        self.incremental = None
+        show_info("Incremental model reset")
+
     def _cancel_fit(self, worker):
         logger.info("Cancel requested")
         worker.quit()
@@ -1327,7 +2866,7 @@ class BasicWidget(QWidget):
     def _save_fit(self):
         ok_any = False
         try:
-            if hasattr(self, "corrected"):
+            if self.corrected is not None:
                 opt = SaveOptionsDialog(parent=self)
                 if opt.exec_() == QDialog.Accepted:
                     self._last_save_dtype = opt.dtype
@@ -1335,8 +2874,7 @@ class BasicWidget(QWidget):
 
                     fp = save_dialog(self, "corrected_image")
                     if fp:
-                        arr = _cast_with_scaling(self.corrected, opt.dtype, opt.mode)
-                        write_tiff(fp, arr)
+                        self._save_corrected(fp, opt.dtype, opt.mode)
                         ok_any = True
             else:
                 logger.info("No 'corrected' result to save in _save_fit().")
@@ -1389,7 +2927,7 @@ class BasicWidget(QWidget):
 
     def _save_transform(self):
         try:
-            if hasattr(self, "corrected"):
+            if self.corrected is not None:
                 opt = SaveOptionsDialog(parent=self)
                 if opt.exec_() != QDialog.Accepted:
                     return
@@ -1398,15 +2936,80 @@ class BasicWidget(QWidget):
 
                 fp = save_dialog(self, "corrected_image")
                 if fp:
-                    arr = _cast_with_scaling(self.corrected, opt.dtype, opt.mode)
-                    write_tiff(fp, arr)
-                    QMessageBox.information(self, "Saved", f"Saved to:\n{fp}")
+                    report = self._save_corrected(fp, opt.dtype, opt.mode)
+                    QMessageBox.information(self, "Saved", f"Saved to:\n{fp}\n\n{report.summary()}")
             else:
                 QMessageBox.warning(self, "No data", "Corrected image is not found.")
         except Exception as e:
             logger.exception("Failed to save corrected image")
             QMessageBox.critical(self, "Save failed", str(e))
 
+    def _save_corrected(self, fp, dtype, mode):
+        """Cast and write ``self.corrected`` to `fp`, with a run report next to it."""
+        corrected = self.corrected
+        source = getattr(self, "last_report", None)
+        report = RunReport(
+            "save",
+            settings={"dtype": dtype, "scaling": mode},
+            inputs={
+                "corrected": fingerprint_array(corrected),
+                "source_run": None if source is None else {
+                    k: v for k, v in source.to_dict().items() if k in ("kind", "started", "settings", "inputs")
+                },
+            },
+        )
+        n_frames = _n_frames(corrected)
+        with report.stage("cast", frames=n_frames):
+            arr = _cast_with_scaling(corrected, dtype, mode)
+        with report.stage("write", written=arr.nbytes, frames=n_frames):
+            write_tiff(fp, arr)
+        report.count_frames(n_frames)
+        report.finish(output=fp)
+        try:
+            report.write(os.path.splitext(fp)[0] + ".basicpy_report.json")
+        except OSError as e:
+            logger.warning(f"Could not write the run report: {e}")
+        logger.info(report.summary())
+        return report
+
+    def _save_model(self):
+        if not hasattr(self, "flatfield"):
+            QMessageBox.warning(self, "No model", "Flatfield is not found. Run a fit first.")
+            return
+        darkfield = getattr(self, "darkfield", None) if self.checkbox_get_darkfield.isChecked() else None
+        try:
+            model = DCTModel.from_fields(self.flatfield, darkfield)
+            fp, _ = QFileDialog.getSaveFileName(
+                self,
+                "Select location for the DCT model to be saved",
+                "./basicpy_model.npz",
+                filter="BaSiCPy DCT model (*.npz)",
+            )
+            if not fp:
+                return
+            if not fp.endswith(".npz"):
+                fp += ".npz"
+            model.save(fp)
+            QMessageBox.information(self, "Saved", f"{model}\nSaved to:\n{fp} ({os.path.getsize(fp) / 1024:.1f} kB)")
+        except Exception as e:
+            logger.exception("Failed to save DCT model")
+            QMessageBox.critical(self, "Save failed", str(e))
+
+    def _load_model(self):
+        fp, _ = QFileDialog.getOpenFileName(self, "Select a BaSiCPy DCT model", filter="BaSiCPy DCT model (*.npz)")
+        if not fp:
+            return
+        try:
+            model = DCTModel.load(fp)
+        except Exception as e:
+            logger.exception("Failed to load DCT model")
+            QMessageBox.critical(self, "Load failed", str(e))
+            return
+        self.dct_models[os.path.basename(fp)] = model
+        self.flatfield_select.reset_choices()
+        self.flatfield_select.value = model
+        logger.info(f"Loaded {model} from {fp}")
+
     def showEvent(self, event: QEvent) -> None:  # noqa: D102
         super().showEvent(event)
         self.reset_choices()
@@ -1419,7 +3022,10 @@ class BasicWidget(QWidget):
         self.darkfield_select.reset_choices(event)
 
         self.weight_select.reset_choices(event)
+        self.roi_select.reset_choices(event)
         self.fit_weight_select.reset_choices(event)
+        self.tile_settings_fit.reset_choices(event)
+        self.tile_settings_transform.reset_choices(event)
 
         # # If no layers are present, disable the 'run' button
         # print(self.fit_image_select.value)
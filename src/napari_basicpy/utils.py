@@ -1,7 +1,43 @@
-import torch
-import tqdm
+import os
+import sys
+import threading
+
 import numpy as np
 
+SAVE_DTYPES = ["float32", "uint16", "uint8"]
+
+SCALING_MODES = [
+    "preserve (no clip, auto-rescale if out-of-range)",
+    "rescale to full range",
+    "rescale robust (0.1-99.9 percentile)",
+]
+
+ROBUST_QUANTILES = (0.001, 0.999)
+
+
+def config_dir() -> str:
+    """Per-user folder for persisted plugin settings; ``$NAPARI_BASICPY_CONFIG_DIR`` overrides it."""
+    path = os.environ.get("NAPARI_BASICPY_CONFIG_DIR")
+    if not path:
+        if sys.platform == "win32":
+            base = os.environ.get("APPDATA", os.path.expanduser("~"))
+        else:
+            base = os.environ.get("XDG_CONFIG_HOME", os.path.join(os.path.expanduser("~"), ".config"))
+        path = os.path.join(base, "napari-basicpy")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _upsample_profile(small: np.ndarray, shape) -> np.ndarray:
+    """Resize a working-size profile to `shape`: bilinear with aligned corners, as BaSiC does it."""
+    if tuple(small.shape) == tuple(shape):
+        return np.array(small, dtype=np.float32)
+    import torch
+    import torch.nn.functional as F
+
+    small = torch.from_numpy(np.ascontiguousarray(small, dtype=np.float32))[None, None]
+    return F.interpolate(small, tuple(shape), mode="bilinear", align_corners=True)[0, 0].numpy()
+
 
 def _dtype_limits(dtype):
     dt = np.dtype(dtype)
@@ -11,6 +47,39 @@ def _dtype_limits(dtype):
     return None, None
 
 
+def _scaling_range(a_min: float, a_max: float, target_dtype: str, mode: str, q_lo=None, q_hi=None):
+    """Source range to map onto `target_dtype`, or None when values are cast as they are."""
+    tmin, tmax = _dtype_limits(target_dtype)
+    if tmin is None:
+        return None
+    if mode == SCALING_MODES[0]:
+        if a_min >= tmin and a_max <= tmax:
+            return None
+        return a_min, a_max
+    if mode == SCALING_MODES[1]:
+        return a_min, a_max
+    if mode == SCALING_MODES[2]:
+        return (a_min if q_lo is None else q_lo), (a_max if q_hi is None else q_hi)
+    return None
+
+
+def _cast_to_range(arr: np.ndarray, target_dtype: str, value_range):
+    """Linearly map `value_range` onto the full range of integer `target_dtype`, clipping outliers."""
+    a = np.asarray(arr)
+    if target_dtype == "float32" or _dtype_limits(target_dtype)[0] is None:
+        return a.astype(np.float32, copy=False)
+    if value_range is None:
+        return a.astype(target_dtype, copy=False)
+    tmin, tmax = _dtype_limits(target_dtype)
+    a_min, a_max = value_range
+    if not np.isfinite(a_min) or not np.isfinite(a_max) or a_max <= a_min:
+        scaled = np.zeros_like(a, dtype=np.float32)
+    else:
+        scaled = (a - a_min) / (a_max - a_min)
+    out = (scaled * (tmax - tmin) + tmin).round()
+    return np.clip(out, tmin, tmax).astype(target_dtype, copy=False)
+
+
 def _cast_with_scaling(
     arr: np.ndarray,
     target_dtype: str,
@@ -25,29 +94,45 @@ def _cast_with_scaling(
     if tmin is None:
         return a.astype(np.float32, copy=False)
 
-    if mode == "preserve (no clip, auto-rescale if out-of-range)":
-        a_min = float(np.nanmin(a))
-        a_max = float(np.nanmax(a))
+    if mode not in SCALING_MODES:
+        # fallback
+        return a.astype(target_dtype, copy=False)
 
-        if a_min >= tmin and a_max <= tmax:
-            return a.astype(target_dtype, copy=False)
+    q_lo = q_hi = None
+    if mode == SCALING_MODES[2]:
+        q_lo, q_hi = (float(q) for q in np.nanquantile(a, ROBUST_QUANTILES))
+    value_range = _scaling_range(float(np.nanmin(a)), float(np.nanmax(a)), target_dtype, mode, q_lo, q_hi)
+    return _cast_to_range(a, target_dtype, value_range)
 
-        if not np.isfinite(a_min) or not np.isfinite(a_max) or a_max <= a_min:
-            scaled = np.zeros_like(a, dtype=np.float32)
-        else:
-            scaled = (a - a_min) / (a_max - a_min)
-        out = (scaled * (tmax - tmin) + tmin).round()
-        return np.clip(out, tmin, tmax).astype(target_dtype, copy=False)
-
-    if mode == "rescale to full range":
-        a_min = float(np.nanmin(a))
-        a_max = float(np.nanmax(a))
-        if not np.isfinite(a_min) or not np.isfinite(a_max) or a_max <= a_min:
-            scaled = np.zeros_like(a, dtype=np.float32)
-        else:
-            scaled = (a - a_min) / (a_max - a_min)
-        out = (scaled * (tmax - tmin) + tmin).round()
-        return np.clip(out, tmin, tmax).astype(target_dtype, copy=False)
 
-    # fallback
-    return a.astype(target_dtype, copy=False)
+class _StreamingRange:
+    """Accumulate the global min/max and a bounded value sample over batches, from several threads.
+
+    The sample (strided, about `max_samples` values in total spread over `n_batches`) is only used for
+    the robust scaling mode, where exact quantiles over a whole folder would need every value in memory.
+    """
+
+    def __init__(self, n_batches: int = 1, max_samples: int = 4_000_000):
+        self.min = np.inf
+        self.max = -np.inf
+        self.sample_per_batch = max(1024, max_samples // max(1, n_batches))
+        self._samples = []
+        self._lock = threading.Lock()
+
+    def update(self, arr: np.ndarray):
+        a = np.asarray(arr)
+        if a.size == 0:
+            return
+        lo, hi = float(np.nanmin(a)), float(np.nanmax(a))
+        flat = a.reshape(-1)
+        sample = flat[:: max(1, flat.size // self.sample_per_batch)].astype(np.float32)
+        with self._lock:
+            self.min = min(self.min, lo)
+            self.max = max(self.max, hi)
+            self._samples.append(sample)
+
+    def value_range(self, target_dtype: str, mode: str):
+        q_lo = q_hi = None
+        if mode == SCALING_MODES[2] and self._samples:
+            q_lo, q_hi = (float(q) for q in np.nanquantile(np.concatenate(self._samples), ROBUST_QUANTILES))
+        return _scaling_range(self.min, self.max, target_dtype, mode, q_lo, q_hi)